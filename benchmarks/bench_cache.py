@@ -0,0 +1,59 @@
+"""
+Benchmark: an iterative algorithm that revisits regions of a compressed
+image stack, one lazy5.load.load call (file open, read, close) per window,
+without and with the process-level cache of decoded chunks (lazy5.cache).
+Reports time, cache hit rate, and evictions for each cache size.
+
+Usage
+-----
+    python -m benchmarks.bench_cache --size-mb 64 --passes 5 --cache-mb 16 64 256
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import numpy as _np
+
+from lazy5.load import load as _load
+from lazy5.cache import ChunkCache as _ChunkCache
+
+from benchmarks.generators import make_large as _make_large
+
+def iterate(filename, n_frames, passes, window, cache):
+    """ Passes over overlapping windows of frames (half-window steps) """
+    for _ in range(passes):
+        for start in range(0, max(n_frames - window, 1), window // 2):
+            _load(filename, 'data', slc=_np.s_[start:start + window, 64:192], cache=cache)
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=32)
+    parser.add_argument('--passes', type=int, default=5)
+    parser.add_argument('--window', type=int, default=32)
+    parser.add_argument('--cache-mb', type=float, nargs='+', default=[8, 64])
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filename = _make_large(_os.path.join(tmpdir, 'bench_cache.h5'), size_mb=args.size_mb)
+        n_frames = max(int(args.size_mb * 2**20 / (256 * 256 * 2)), 1)
+
+        print('{:>12s} {:>10s} {:>10s} {:>10s}'.format('cache (MB)', 'time (s)', 'hit rate',
+                                                     'evictions'))
+        tstart = _time.perf_counter()
+        iterate(filename, n_frames, args.passes, args.window, False)
+        print('{:>12s} {:10.3f} {:>10s} {:>10s}'.format('off', _time.perf_counter() - tstart,
+                                                       '-', '-'))
+        for cache_mb in args.cache_mb:
+            cache = _ChunkCache(max_nbytes=int(cache_mb * 2**20))
+            tstart = _time.perf_counter()
+            iterate(filename, n_frames, args.passes, args.window, cache)
+            elapsed = _time.perf_counter() - tstart
+            stats = cache.stats()
+            print('{:12.0f} {:10.3f} {:10.2f} {:10d}'.format(cache_mb, elapsed,
+                                                             stats['hit_rate'],
+                                                             stats['evictions']))
+
+if __name__ == '__main__':
+    main()
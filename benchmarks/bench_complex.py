@@ -0,0 +1,66 @@
+"""
+Benchmark: write and read throughput (MB/s) of complex data with each
+storage layout of lazy5.create.save (complex_layout), read back as complex
+with lazy5.load.load.
+
+Usage
+-----
+    python -m benchmarks.bench_complex --size-mb 256 --compression gzip
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import numpy as _np
+
+from lazy5.create import save as _save, COMPLEX_LAYOUTS as _COMPLEX_LAYOUTS
+from lazy5.load import load as _load
+
+def best_of(func, repeat):
+    """ Best wall time (s) of repeat calls """
+    times = []
+    for _ in range(repeat):
+        tstart = _time.perf_counter()
+        func()
+        times.append(_time.perf_counter() - tstart)
+    return min(times)
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=128)
+    parser.add_argument('--dtype', default='complex64', choices=['complex64', 'complex128'])
+    parser.add_argument('--compression', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    dtype = _np.dtype(args.dtype)
+    n_cols = 1024
+    n_rows = max(1, int(args.size_mb * 2**20 / (dtype.itemsize * n_cols)))
+    rng = _np.random.RandomState(0)
+    data = (rng.randn(n_rows, n_cols) + 1j * rng.randn(n_rows, n_cols)).astype(dtype)
+    size_mb = data.nbytes / 2**20
+    chunks = (max(1, 2**20 // (dtype.itemsize * n_cols)), n_cols)
+
+    print('{:>12s} {:>14s} {:>14s}'.format('layout', 'write (MB/s)', 'read (MB/s)'))
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        for layout in _COMPLEX_LAYOUTS:
+            filename = _os.path.join(tmpdir, 'bench_complex_{}.h5'.format(layout))
+
+            def write():
+                _save(filename, 'data', data, mode='w', chunks=chunks,
+                      compression=args.compression, workers=args.workers,
+                      complex_layout=layout)
+
+            t_write = best_of(write, args.repeat)
+            out = _load(filename, 'data', workers=args.workers)
+            assert (out.dtype == dtype) and _np.array_equal(out, data)
+            t_read = best_of(lambda: _load(filename, 'data', workers=args.workers),
+                             args.repeat)
+            print('{:>12s} {:14.1f} {:14.1f}'.format(layout, size_mb / t_write,
+                                                     size_mb / t_read))
+
+if __name__ == '__main__':
+    main()
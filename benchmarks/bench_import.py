@@ -0,0 +1,56 @@
+"""
+Benchmark: cost of ``import lazy5`` (and of first use of a submodule) in a
+fresh interpreter. Also reports whether h5py was imported.
+
+Usage
+-----
+    python benchmarks/bench_import.py --repeat 10
+"""
+import argparse as _argparse
+import subprocess as _subprocess
+import sys as _sys
+
+STATEMENTS = ['import lazy5',
+              'lazy5.inspect',
+              'lazy5.load']
+
+_CODE = """
+import sys, time
+tstart = time.perf_counter()
+import lazy5
+times = [time.perf_counter() - tstart]
+for attr in {attrs!r}:
+    tstart = time.perf_counter()
+    getattr(lazy5, attr)
+    times.append(time.perf_counter() - tstart)
+print(' '.join([str(t) for t in times]), 'h5py' in sys.modules)
+"""
+
+def import_times(attrs):
+    """
+    Wall time (s) of importing lazy5 and then accessing each submodule in
+    attrs, in a fresh interpreter, and whether h5py ended up imported
+    """
+    proc = _subprocess.run([_sys.executable, '-c', _CODE.format(attrs=list(attrs))],
+                           stdout=_subprocess.PIPE, universal_newlines=True, check=True)
+    fields = proc.stdout.split()
+    return [float(field) for field in fields[:-1]], fields[-1] == 'True'
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    attrs = [statement.split('.', 1)[1] for statement in STATEMENTS[1:]]
+    results = [import_times(attrs) for _ in range(args.repeat)]
+    _, h5py_loaded = import_times([])
+
+    print('{:>16s} {:>10s}'.format('statement', 'time (ms)'))
+    for num, statement in enumerate(STATEMENTS):
+        best = min([result[0][num] for result in results])
+        print('{:>16s} {:10.2f}'.format(statement, 1e3 * best))
+    print('h5py imported by "import lazy5": {}'.format(h5py_loaded))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: parallel raw-chunk decompression (lazy5.load) vs standard h5py
+reads of a gzip-compressed dataset, as a function of worker count.
+
+Usage
+-----
+    python benchmarks/bench_load.py --size-mb 256 --workers 1 2 4 8
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import h5py as _h5py
+import numpy as _np
+
+from lazy5.load import (load as _load, read_chunks_parallel as _read_chunks_parallel)
+
+def make_file(filename, size_mb, chunks=(64, 256, 256), level=4, shuffle=True):
+    """ Write a compressible float32 dataset of about size_mb MiB """
+    n_frames = max(int(size_mb * 2**20 / (256 * 256 * 4)), 1)
+    rng = _np.random.RandomState(0)
+    with _h5py.File(filename, 'w') as fid:
+        dset = fid.create_dataset('data', shape=(n_frames, 256, 256), dtype=_np.float32,
+                                  chunks=(min(chunks[0], n_frames),) + chunks[1:],
+                                  compression='gzip', compression_opts=level,
+                                  shuffle=shuffle)
+        for start in range(0, n_frames, 64):
+            stop = min(start + 64, n_frames)
+            frames = rng.poisson(10, size=(stop - start, 256, 256)).astype(_np.float32)
+            dset[start:stop] = frames
+    return n_frames * 256 * 256 * 4
+
+def best_of(func, repeat):
+    """ Best wall time (s) of repeat calls """
+    times = []
+    for _ in range(repeat):
+        tstart = _time.perf_counter()
+        func()
+        times.append(_time.perf_counter() - tstart)
+    return min(times)
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=128)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filename = _os.path.join(tmpdir, 'bench_load.h5')
+        nbytes = make_file(filename, args.size_mb)
+        mb = nbytes / 2**20
+
+        t_h5py = best_of(lambda: _load(filename, 'data'), args.repeat)
+        print('{:>12s} {:>10s} {:>10s} {:>8s}'.format('reader', 'time (s)', 'MB/s', 'speedup'))
+        print('{:>12s} {:10.3f} {:10.1f} {:8.2f}'.format('h5py', t_h5py, mb / t_h5py, 1.0))
+        for workers in args.workers:
+            with _h5py.File(filename, 'r') as fid:
+                t_par = best_of(lambda: _read_chunks_parallel(fid['data'], workers=workers),
+                                args.repeat)
+            print('{:>12s} {:10.3f} {:10.1f} {:8.2f}'.format('workers={}'.format(workers),
+                                                             t_par, mb / t_par, t_h5py / t_par))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: concurrent slice reads (e.g., requests of a service) from many
+client threads, with lazy5.load.load in the threads (serialized by h5py's
+lock) vs a lazy5.pool.ReaderPool of worker processes. Reports requests per
+second for each number of pool workers.
+
+Usage
+-----
+    python -m benchmarks.bench_pool --files 4 --size-mb 64 --workers 1 2 4 8
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+import numpy as _np
+
+from lazy5.load import load as _load
+from lazy5.pool import ReaderPool as _ReaderPool
+
+from benchmarks.generators import make_large as _make_large
+
+def requests(filenames, n_frames, n_requests, frames=8):
+    """ (filename, slice) of random frame ranges of random files """
+    rng = _np.random.RandomState(0)
+    out = []
+    for _ in range(n_requests):
+        start = rng.randint(0, max(n_frames - frames, 1))
+        out.append((filenames[rng.randint(len(filenames))], _np.s_[start:start + frames]))
+    return out
+
+def serve(read, reqs, threads):
+    """ Requests per second of read(filename, slc) from threads """
+    tstart = _time.perf_counter()
+    with _ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda req: read(*req), reqs))
+    return len(reqs) / (_time.perf_counter() - tstart)
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--size-mb', type=float, default=32)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filenames = [_make_large(_os.path.join(tmpdir, 'bench_pool_{}.h5'.format(num)),
+                                 size_mb=args.size_mb) for num in range(args.files)]
+        n_frames = max(int(args.size_mb * 2**20 / (256 * 256 * 2)), 1)
+        reqs = requests(filenames, n_frames, args.requests)
+
+        rate = serve(lambda filename, slc: _load(filename, 'data', slc=slc), reqs,
+                     args.threads)
+        print('{:>16s} {:>12s}'.format('reader', 'requests/s'))
+        print('{:>16s} {:12.1f}'.format('threads', rate))
+        for workers in args.workers:
+            with _ReaderPool(workers=workers) as pool:
+                pool.load(filenames[0], 'data', slc=_np.s_[:1])  # Start-up
+                rate = serve(lambda filename, slc: pool.load(filename, 'data', slc=slc),
+                             reqs, args.threads)
+            print('{:>16s} {:12.1f}'.format('pool ({})'.format(workers), rate))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: sequential iteration over the frames of a compressed image stack
+with a consumer doing work on each block, without read-ahead (load per
+block) vs lazy5.load.iter_frames at fixed depths and adaptive. Reports total
+time, time the consumer stalled on reads, and the (peak) depth.
+
+Usage
+-----
+    python -m benchmarks.bench_readahead --size-mb 64 --work-ms 5 --depths 1 2 4
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import h5py as _h5py
+import numpy as _np
+
+from lazy5.load import load as _load, iter_frames as _iter_frames
+
+from benchmarks.generators import make_large as _make_large
+
+def consume(block, work_ms):
+    """ Consumer work: a reduction plus busy time releasing the GIL """
+    block.sum()
+    _time.sleep(work_ms / 1000)
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=32)
+    parser.add_argument('--work-ms', type=float, default=5)
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filename = _make_large(_os.path.join(tmpdir, 'bench_readahead.h5'),
+                               size_mb=args.size_mb, chunks=(4, 256, 256))
+        print('{:>16s} {:>10s} {:>10s} {:>8s}'.format('read-ahead', 'time (s)', 'stall (s)',
+                                                     'depth'))
+        with _h5py.File(filename, 'r') as fid:
+            n_frames = fid['data'].shape[0]
+            tstart = _time.perf_counter()
+            stall = 0.0
+            for start in range(0, n_frames, 4):
+                tread = _time.perf_counter()
+                block = _load(fid, 'data', slc=_np.s_[start:start + 4], workers=args.workers)
+                stall += _time.perf_counter() - tread
+                consume(block, args.work_ms)
+            print('{:>16s} {:10.3f} {:10.3f} {:>8s}'.format('none', _time.perf_counter() - tstart,
+                                                          stall, '-'))
+
+            runs = [(str(depth), depth, False) for depth in args.depths]
+            runs.append(('adaptive', 1, True))
+            for label, depth, adaptive in runs:
+                tstart = _time.perf_counter()
+                with _iter_frames(fid, 'data', depth=depth, adaptive=adaptive,
+                                  workers=args.workers) as frames:
+                    for _, block in frames:
+                        consume(block, args.work_ms)
+                stats = frames.stats()
+                print('{:>16s} {:10.3f} {:10.3f} {:8d}'.format(label,
+                                                              _time.perf_counter() - tstart,
+                                                              stats['stall_time'],
+                                                              stats['peak_depth']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark: parallel chunk compression (lazy5.create.save with workers) vs
+libhdf5's single-threaded filter pipeline, as a function of worker count.
+
+Usage
+-----
+    python benchmarks/bench_save.py --size-mb 256 --workers 1 2 4 8
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import numpy as _np
+
+from lazy5.create import save as _save
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=128)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--level', type=int, default=4)
+    parser.add_argument('--shuffle', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    n_frames = max(int(args.size_mb * 2**20 / (256 * 256 * 2)), 1)
+    data = _np.random.RandomState(0).poisson(100, size=(n_frames, 256, 256)).astype(_np.uint16)
+    mb = data.nbytes / 2**20
+    chunks = (min(16, n_frames), 256, 256)
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filename = _os.path.join(tmpdir, 'bench_save.h5')
+
+        def run(workers):
+            """ Best wall time (s) of args.repeat saves """
+            times = []
+            for _ in range(args.repeat):
+                tstart = _time.perf_counter()
+                _save(filename, 'data', data, mode='w', chunks=chunks, compression='gzip',
+                      compression_opts=args.level, shuffle=args.shuffle, workers=workers)
+                times.append(_time.perf_counter() - tstart)
+            return min(times)
+
+        t_h5py = run(None)
+        print('{:>12s} {:>10s} {:>10s} {:>8s}'.format('writer', 'time (s)', 'MB/s', 'speedup'))
+        print('{:>12s} {:10.3f} {:10.1f} {:8.2f}'.format('h5py', t_h5py, mb / t_h5py, 1.0))
+        for workers in args.workers:
+            t_par = run(workers)
+            print('{:>12s} {:10.3f} {:10.1f} {:8.2f}'.format('workers={}'.format(workers),
+                                                             t_par, mb / t_par, t_h5py / t_par))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: browsing a served file (lazy5.serve) by scrolling a window of
+frames through an image stack, as a viewer does, with and without the
+client's chunk-aligned block cache and gzip transfer. Reports time and
+bytes transferred.
+
+Usage
+-----
+    python -m benchmarks.bench_serve --size-mb 64 --window 32 --step 4
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import numpy as _np
+
+from lazy5.serve import HdfServer as _HdfServer, HdfClient as _HdfClient
+from lazy5.instrument import Collector as _Collector
+
+from benchmarks.generators import make_large as _make_large
+
+def scroll(client, n_frames, window, step):
+    """ Read a window of frames at every step position """
+    for start in range(0, max(n_frames - window, 1), step):
+        client.load('bench_serve.h5', 'data', slc=_np.s_[start:start + window])
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=32)
+    parser.add_argument('--window', type=int, default=32)
+    parser.add_argument('--step', type=int, default=4)
+    parser.add_argument('--unix-socket', action='store_true')
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        _make_large(_os.path.join(tmpdir, 'bench_serve.h5'), size_mb=args.size_mb)
+        n_frames = max(int(args.size_mb * 2**20 / (256 * 256 * 2)), 1)
+        sock = _os.path.join(tmpdir, 'bench_serve.sock') if args.unix_socket else None
+        with _HdfServer(tmpdir, port=0, unix_socket=sock) as server:
+            print('{:>12s} {:>6s} {:>10s} {:>12s}'.format('cache', 'gzip', 'time (s)',
+                                                        'MB received'))
+            for cache_nbytes in (0, 2**28):
+                for compress in (False, True):
+                    client = _HdfClient(server.url, cache_nbytes=cache_nbytes,
+                                        compress=compress)
+                    with _Collector() as stats:
+                        tstart = _time.perf_counter()
+                        scroll(client, n_frames, args.window, args.step)
+                        elapsed = _time.perf_counter() - tstart
+                    client.close()
+                    print('{:>12s} {:>6s} {:10.3f} {:12.1f}'.format(
+                        'off' if cache_nbytes == 0 else 'on', str(compress), elapsed,
+                        stats.bytes_read['serve.HdfClient'] / 2**20))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: filtered reads (lazy5.load.load_where) of sparse-event data with
+per-chunk statistics vs reading everything with h5py and filtering in
+memory. Reports the fraction of chunks skipped and the speedup, as a
+function of the threshold.
+
+Usage
+-----
+    python -m benchmarks.bench_where --size-mb 256 --thresholds 3 5 8
+"""
+import argparse as _argparse
+import os as _os
+import tempfile as _tempfile
+import time as _time
+
+import h5py as _h5py
+import numpy as _np
+
+from lazy5.load import load_where as _load_where
+from lazy5.alter import index_chunk_stats as _index_chunk_stats
+from lazy5.chunks import candidate_chunks as _candidate_chunks
+
+from benchmarks.generators import make_sparse_events as _make_sparse_events
+
+def best_of(func, repeat):
+    """ Best wall time (s) of repeat calls """
+    times = []
+    for _ in range(repeat):
+        tstart = _time.perf_counter()
+        func()
+        times.append(_time.perf_counter() - tstart)
+    return min(times)
+
+def full_scan(filename, threshold):
+    """ Read everything with h5py; filter in memory """
+    with _h5py.File(filename, 'r') as fid:
+        data = fid['signal'][()]
+    index = _np.nonzero(data > threshold)
+    return index, data[index]
+
+def main():
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=128)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[3.0, 5.0, 8.0])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        filename = _os.path.join(tmpdir, 'bench_where.h5')
+        _make_sparse_events(filename, args.size_mb, chunk_stats=False)
+
+        tstart = _time.perf_counter()
+        _index_chunk_stats(filename, workers=args.workers)
+        print('Statistics sweep: {:.3f} s'.format(_time.perf_counter() - tstart))
+
+        print('{:>10s} {:>8s} {:>10s} {:>12s} {:>12s} {:>8s}'.format(
+            'threshold', 'matches', 'skipped', 'h5py (s)', 'where (s)', 'speedup'))
+        for threshold in args.thresholds:
+            where = [('>', threshold)]
+            with _h5py.File(filename, 'r') as fid:
+                _, offsets, n_skipped = _candidate_chunks(fid['signal'], where)
+            skip_rate = n_skipped / (n_skipped + len(offsets))
+            _, values = _load_where(filename, 'signal', where, workers=args.workers)
+
+            t_full = best_of(lambda: full_scan(filename, threshold), args.repeat)
+            t_where = best_of(lambda: _load_where(filename, 'signal', where,
+                                                  workers=args.workers), args.repeat)
+            print('{:10.1f} {:8d} {:9.1f}% {:12.3f} {:12.3f} {:8.2f}'.format(
+                threshold, values.size, 100 * skip_rate, t_full, t_where, t_full / t_where))
+
+if __name__ == '__main__':
+    main()
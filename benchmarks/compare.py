@@ -0,0 +1,59 @@
+"""
+Compare two benchmark result files (see benchmarks/run.py). Exits with code
+1 if any benchmark slowed down by more than the threshold or opens more
+files.
+
+Usage
+-----
+    python -m benchmarks.compare base.json new.json --threshold 1.25
+"""
+import argparse as _argparse
+import json as _json
+import sys as _sys
+
+def compare(base, new, threshold=1.25):
+    """
+    Compare results dictionaries
+
+    Returns
+    -------
+    list : (name, base time, new time, ratio, base opens, new opens, regressed)
+    """
+    rows = []
+    for name in sorted(set(base['results']) & set(new['results'])):
+        res_a = base['results'][name]
+        res_b = new['results'][name]
+        if ('error' in res_a) or ('error' in res_b):
+            continue
+        ratio = res_b['time_min'] / res_a['time_min'] if res_a['time_min'] > 0 else float('inf')
+        regressed = (ratio > threshold) or (res_b['file_opens'] > res_a['file_opens'])
+        rows.append((name, res_a['time_min'], res_b['time_min'], ratio,
+                     res_a['file_opens'], res_b['file_opens'], regressed))
+    return rows
+
+def main(argv=None):
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', '-t', type=float, default=1.25,
+                        help='Time ratio (new/base) flagged as a regression')
+    args = parser.parse_args(argv)
+
+    with open(args.base) as fid:
+        base = _json.load(fid)
+    with open(args.new) as fid:
+        new = _json.load(fid)
+
+    print('base: {} | new: {}'.format(base['meta'].get('commit'), new['meta'].get('commit')))
+    print('{:45s} {:>10s} {:>10s} {:>7s} {:>11s}'.format('benchmark', 'base (s)', 'new (s)',
+                                                         'ratio', 'opens'))
+    rows = compare(base, new, threshold=args.threshold)
+    for name, t_a, t_b, ratio, opens_a, opens_b, regressed in rows:
+        print('{:45s} {:10.4f} {:10.4f} {:7.2f} {:>5d}->{:<5d}{}'.format(name, t_a, t_b, ratio,
+                                                                         opens_a, opens_b,
+                                                                         ' !' if regressed else ''))
+    return 1 if any([row[-1] for row in rows]) else 0
+
+if __name__ == '__main__':
+    _sys.exit(main())
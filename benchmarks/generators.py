@@ -0,0 +1,96 @@
+""" Synthetic HDF5 file generators for benchmarks """
+import os as _os
+
+import h5py as _h5py
+import numpy as _np
+
+def make_deep(filename, depth=64, dsets_per_grp=2):
+    """ Deep hierarchy: a chain of depth nested groups, each with datasets """
+    with _h5py.File(filename, 'w') as fid:
+        grp = fid['/']
+        for level in range(depth):
+            grp = grp.create_group('Level{}'.format(level))
+            for num in range(dsets_per_grp):
+                grp.create_dataset('dset{}'.format(num), data=_np.arange(10))
+    return filename
+
+def make_wide(filename, n_groups=500, dsets_per_grp=4, n_attrs=4):
+    """ Wide hierarchy: many sibling groups, each with datasets and attributes """
+    with _h5py.File(filename, 'w') as fid:
+        for grp_num in range(n_groups):
+            grp = fid.create_group('Group{}'.format(grp_num))
+            for num in range(dsets_per_grp):
+                dset = grp.create_dataset('dset{}'.format(num), data=_np.arange(10))
+                for attr_num in range(n_attrs):
+                    dset.attrs['Attr{}'.format(attr_num)] = attr_num
+                dset.attrs['Memo'] = 'Group {} dataset {}'.format(grp_num, num)
+    return filename
+
+def make_many_attrs(filename, n_attrs=1000):
+    """ Single dataset with many attributes of mixed types """
+    with _h5py.File(filename, 'w') as fid:
+        dset = fid.create_dataset('base', data=_np.arange(10))
+        for num in range(n_attrs):
+            kind = num % 4
+            if kind == 0:
+                dset.attrs['Attr{:04d}'.format(num)] = num
+            elif kind == 1:
+                dset.attrs['Attr{:04d}'.format(num)] = num * 1.1
+            elif kind == 2:
+                dset.attrs['Attr{:04d}'.format(num)] = 'Value {}'.format(num)
+            else:
+                dset.attrs['Attr{:04d}'.format(num)] = _np.arange(num % 16 + 1)
+    return filename
+
+def make_large(filename, size_mb=64, chunks=(16, 256, 256), compression='gzip',
+               shuffle=True):
+    """ Large chunked (and compressed) uint16 image stack of about size_mb MiB """
+    n_frames = max(int(size_mb * 2**20 / (256 * 256 * 2)), 1)
+    rng = _np.random.RandomState(0)
+    with _h5py.File(filename, 'w') as fid:
+        dset = fid.create_dataset('data', shape=(n_frames, 256, 256), dtype=_np.uint16,
+                                  chunks=(min(chunks[0], n_frames),) + tuple(chunks[1:]),
+                                  compression=compression, shuffle=shuffle)
+        for start in range(0, n_frames, 64):
+            stop = min(start + 64, n_frames)
+            dset[start:stop] = rng.poisson(100, size=(stop - start, 256, 256))
+    return filename
+
+def make_many_small(directory, n_files=200):
+    """ Many small files, each with a few groups, datasets, and attributes """
+    filenames = []
+    for num in range(n_files):
+        filename = _os.path.join(directory, 'small_{:04d}.h5'.format(num))
+        with _h5py.File(filename, 'w') as fid:
+            for grp_num in range(3):
+                dset = fid.create_dataset('Group{}/dset'.format(grp_num), data=_np.arange(10))
+                dset.attrs['Memo'] = 'File {}'.format(num)
+        filenames.append(filename)
+    return filenames
+
+def make_sparse_events(filename, size_mb=64, chunk_rows=2**16, event_rate=1e-5,
+                       chunk_stats=True):
+    """
+    1D float32 signal of about size_mb MiB (dataset 'signal'): unit Gaussian
+    noise with rare events (amplitude 3-10) in bursts, gzip-compressed.
+    Optionally with per-chunk statistics (lazy5.alter.index_chunk_stats).
+    """
+    n_rows = max(int(size_mb * 2**20 / 4), chunk_rows)
+    rng = _np.random.RandomState(0)
+    with _h5py.File(filename, 'w') as fid:
+        dset = fid.create_dataset('signal', shape=(n_rows,), dtype=_np.float32,
+                                  chunks=(chunk_rows,), compression='gzip',
+                                  compression_opts=1)
+        block_rows = 16 * chunk_rows
+        for start in range(0, n_rows, block_rows):
+            stop = min(start + block_rows, n_rows)
+            block = rng.randn(stop - start).astype(_np.float32)
+            for center in rng.randint(0, stop - start,
+                                      size=rng.poisson(event_rate * (stop - start))):
+                burst = _np.arange(center, min(center + 100, stop - start))
+                block[burst] += rng.uniform(3, 10) * _np.exp(-(burst - center) / 20)
+            dset[start:stop] = block
+    if chunk_stats:
+        from lazy5.alter import index_chunk_stats
+        index_chunk_stats(filename)
+    return filename
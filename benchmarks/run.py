@@ -0,0 +1,178 @@
+"""
+Run the lazy5 benchmark suite and store results as JSON for comparison
+across commits (see benchmarks/compare.py).
+
+Each benchmark runs in a fresh process (so that peak RSS and open counts
+belong to that benchmark alone) and records:
+
+-   time_min, time_median, times : wall time (s) of each repeat
+-   peak_rss, rss_delta : peak resident set size (bytes) of the process and
+    its increase over the post-import baseline
+-   file_opens : HDF5 files opened/created per run
+
+Usage
+-----
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --bench 'inspect.*' --scale 0.1 --repeat 3
+"""
+import argparse as _argparse
+import datetime as _datetime
+import fnmatch as _fnmatch
+import json as _json
+import multiprocessing as _multiprocessing
+import os as _os
+import platform as _platform
+import queue as _queue
+import subprocess as _subprocess
+import sys as _sys
+import tempfile as _tempfile
+import time as _time
+
+try:
+    import resource as _resource
+except ImportError:  # Windows
+    _resource = None
+
+def _peak_rss():
+    """ Peak resident set size (bytes) of this process, or None """
+    if _resource is None:
+        return None
+    peak = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes; macOS, bytes
+    return peak if _sys.platform == 'darwin' else peak * 1024
+
+def _count_opens():
+    """ Wrap h5py's low-level file open/create; return the counter list """
+    import h5py
+    counter = [0]
+
+    def wrap(func):
+        def counted(*args, **kwargs):
+            counter[0] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    h5py.h5f.open = wrap(h5py.h5f.open)
+    h5py.h5f.create = wrap(h5py.h5f.create)
+    return counter
+
+def _measure(name, ctx, repeat, queue):
+    """ Child process: run benchmark name repeat times and report measurements """
+    from benchmarks.suites import BENCHMARKS
+    import lazy5  # pylint: disable=unused-import
+    counter = _count_opens()
+    _, run = BENCHMARKS[name]
+
+    rss_baseline = _peak_rss()
+    times = []
+    opens = []
+    for _ in range(repeat):
+        n_opens = counter[0]
+        tstart = _time.perf_counter()
+        run(ctx)
+        times.append(_time.perf_counter() - tstart)
+        opens.append(counter[0] - n_opens)
+    peak = _peak_rss()
+
+    times_sorted = sorted(times)
+    queue.put({'time_min': times_sorted[0],
+               'time_median': times_sorted[len(times) // 2],
+               'times': times,
+               'peak_rss': peak,
+               'rss_delta': None if peak is None else peak - rss_baseline,
+               'file_opens': max(opens)})
+
+def run_benchmark(name, ctx, repeat=3, timeout=600):
+    """ Run a benchmark in a fresh process; return its measurements """
+    mp_ctx = _multiprocessing.get_context('spawn')
+    queue = mp_ctx.Queue()
+    proc = mp_ctx.Process(target=_measure, args=(name, ctx, repeat, queue))
+    proc.start()
+    try:
+        # Get before join: the child cannot exit until the queue is drained
+        result = queue.get(timeout=timeout)
+    except _queue.Empty:
+        proc.terminate()
+        result = {'error': 'timeout ({} s) or exit code {}'.format(timeout, proc.exitcode)}
+    proc.join()
+    return result
+
+def metadata():
+    """ Environment and commit information """
+    import h5py
+    import numpy
+    import lazy5
+    try:
+        commit = _subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                          stderr=_subprocess.DEVNULL).decode().strip()
+    except (OSError, _subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit,
+            'date': _datetime.datetime.now().isoformat(),
+            'lazy5': lazy5.__version__,
+            'python': _platform.python_version(),
+            'numpy': numpy.__version__,
+            'h5py': h5py.__version__,
+            'hdf5': h5py.version.hdf5_version,
+            'platform': _platform.platform(),
+            'cpu_count': _os.cpu_count()}
+
+def main(argv=None):
+    from benchmarks.suites import BENCHMARKS, copy_setup
+
+    parser = _argparse.ArgumentParser(description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', '-o', default=None,
+                        help='JSON results file (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--bench', '-b', nargs='+', default=['*'],
+                        help='Glob pattern(s) of benchmark names')
+    parser.add_argument('--repeat', '-r', type=int, default=3)
+    parser.add_argument('--scale', '-s', type=float, default=1.0,
+                        help='Multiplier of synthetic file sizes')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Per-benchmark time limit (s)')
+    parser.add_argument('--list', action='store_true', help='List benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS
+             if any([_fnmatch.fnmatchcase(name, pattern) for pattern in args.bench])]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    meta = metadata()
+    meta.update({'repeat': args.repeat, 'scale': args.scale})
+    results = {}
+    setups = {}
+
+    with _tempfile.TemporaryDirectory() as tmpdir:
+        for name in names:
+            setup, _ = BENCHMARKS[name]
+            if setup not in setups:
+                setup_dir = _os.path.join(tmpdir, setup.__name__)
+                _os.mkdir(setup_dir)
+                setups[setup] = setup(setup_dir, args.scale)
+            run_dir = _tempfile.mkdtemp(dir=tmpdir)
+            ctx = copy_setup(setups[setup], run_dir)
+
+            results[name] = run_benchmark(name, ctx, repeat=args.repeat, timeout=args.timeout)
+            res = results[name]
+            if 'error' in res:
+                print('{:45s} ERROR: {}'.format(name, res['error']))
+            else:
+                rss = '' if res['rss_delta'] is None else '{:8.1f} MiB'.format(res['rss_delta'] / 2**20)
+                print('{:45s} {:10.4f} s {} {:6d} opens'.format(name, res['time_min'], rss,
+                                                                res['file_opens']))
+
+    output = args.output
+    if output is None:
+        output = _os.path.join(_os.path.dirname(_os.path.abspath(__file__)), 'results',
+                               '{}.json'.format((meta['commit'] or 'nocommit')[:10]))
+        _os.makedirs(_os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as fid:
+        _json.dump({'meta': meta, 'results': results}, fid, indent=2)
+    print('Results written to {}'.format(output))
+    return 0
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Benchmark definitions covering the public macros of lazy5.
+
+Each benchmark is a (setup, run) pair. setup(tmpdir, scale) generates the
+synthetic file(s) once per session (shared across benchmarks) and returns a
+picklable context; run(ctx) is what gets measured, in a fresh process.
+"""
+import os as _os
+import shutil as _shutil
+from collections import OrderedDict as _OrderedDict
+
+import numpy as _np
+
+from benchmarks import generators as _gen
+
+BENCHMARKS = _OrderedDict()
+
+def benchmark(name, setup):
+    """ Decorator registering run as benchmark name with a setup function """
+    def register(run):
+        BENCHMARKS[name] = (setup, run)
+        return run
+    return register
+
+# Setups (cached per session by the runner)
+
+def setup_deep(tmpdir, scale):
+    return _gen.make_deep(_os.path.join(tmpdir, 'deep.h5'), depth=max(int(64 * scale), 2))
+
+def setup_wide(tmpdir, scale):
+    return _gen.make_wide(_os.path.join(tmpdir, 'wide.h5'), n_groups=max(int(500 * scale), 2))
+
+def setup_many_attrs(tmpdir, scale):
+    return _gen.make_many_attrs(_os.path.join(tmpdir, 'attrs.h5'),
+                                n_attrs=max(int(1000 * scale), 4))
+
+def setup_large(tmpdir, scale):
+    return _gen.make_large(_os.path.join(tmpdir, 'large.h5'), size_mb=64 * scale)
+
+def setup_many_small(tmpdir, scale):
+    directory = _os.path.join(tmpdir, 'many_small')
+    _os.mkdir(directory)
+    return _gen.make_many_small(directory, n_files=max(int(200 * scale), 2))
+
+def setup_large_array(tmpdir, scale):
+    """ In-memory data for save benchmarks (stored to .npy, loaded in run) """
+    filename = _os.path.join(tmpdir, 'large_array.npy')
+    n_frames = max(int(64 * scale * 2**20 / (256 * 256 * 2)), 1)
+    data = _np.random.RandomState(0).poisson(100, size=(n_frames, 256, 256)).astype(_np.uint16)
+    _np.save(filename, data)
+    return filename
+
+def setup_sparse_events(tmpdir, scale):
+    return _gen.make_sparse_events(_os.path.join(tmpdir, 'sparse_events.h5'),
+                                   size_mb=64 * scale)
+
+def _scratch(filename, suffix):
+    """ Scratch filename next to filename """
+    return '{}.{}.h5'.format(filename, suffix)
+
+# inspect
+
+@benchmark('inspect.get_groups[deep]', setup_deep)
+def bench_get_groups_deep(filename):
+    from lazy5.inspect import get_groups
+    get_groups(filename)
+
+@benchmark('inspect.get_groups[wide]', setup_wide)
+def bench_get_groups_wide(filename):
+    from lazy5.inspect import get_groups
+    get_groups(filename)
+
+@benchmark('inspect.get_datasets[wide]', setup_wide)
+def bench_get_datasets_wide(filename):
+    from lazy5.inspect import get_datasets
+    get_datasets(filename)
+
+@benchmark('inspect.get_hierarchy[deep]', setup_deep)
+def bench_get_hierarchy_deep(filename):
+    from lazy5.inspect import get_hierarchy
+    get_hierarchy(filename)
+
+@benchmark('inspect.get_hierarchy[wide]', setup_wide)
+def bench_get_hierarchy_wide(filename):
+    from lazy5.inspect import get_hierarchy
+    get_hierarchy(filename)
+
+@benchmark('inspect.get_hierarchy[many_small]', setup_many_small)
+def bench_get_hierarchy_many_small(filenames):
+    from lazy5.inspect import get_hierarchy
+    for filename in filenames:
+        get_hierarchy(filename)
+
+@benchmark('inspect.get_attrs_dset[many_attrs]', setup_many_attrs)
+def bench_get_attrs_dset(filename):
+    from lazy5.inspect import get_attrs_dset
+    get_attrs_dset(filename, '/base')
+
+@benchmark('inspect.valid_dsets[wide]', setup_wide)
+def bench_valid_dsets_wide(filename):
+    from lazy5.inspect import valid_dsets
+    valid_dsets(filename, ['/Group0/dset0', '/Group1/dset1', '/Group1/missing'])
+
+@benchmark('inspect.valid_file[many_small]', setup_many_small)
+def bench_valid_file_many_small(filenames):
+    from lazy5.inspect import valid_file
+    for filename in filenames:
+        valid_file(filename)
+
+# alter
+
+@benchmark('alter.alter_attr[many_attrs]', setup_many_attrs)
+def bench_alter_attr(filename):
+    from lazy5.alter import alter_attr
+    for num in range(100):
+        alter_attr('/base', 'Attr{:04d}'.format(num), num, file=filename)
+
+@benchmark('alter.write_attr_dict[many_attrs]', setup_many_attrs)
+def bench_write_attr_dict(filename):
+    import h5py
+    from lazy5.alter import write_attr_dict
+    # NOTE: re-writing attributes in dense storage scales super-linearly
+    attr_dict = dict([['New{:04d}'.format(num), num] for num in range(200)])
+    with h5py.File(filename, 'r+') as fid:
+        write_attr_dict('/base', attr_dict, fid=fid, sort_attrs=True)
+
+@benchmark('alter.repack[large]', setup_large)
+def bench_repack(filename):
+    from lazy5.alter import repack
+    repack(filename, _scratch(filename, 'repack'), compression='gzip', compression_opts=1)
+
+@benchmark('alter.copy_dsets[wide]', setup_wide)
+def bench_copy_dsets(filename):
+    from lazy5.alter import copy_dsets
+    copy_dsets(filename, _scratch(filename, 'copy'), patterns='/Group1*', dset_overwrite=True)
+
+@benchmark('alter.copy_file[large]', setup_large)
+def bench_copy_file(filename):
+    from lazy5.alter import copy_file
+    copy_file(filename, _scratch(filename, 'copy_file'))
+
+# create
+
+@benchmark('create.save[large]', setup_large_array)
+def bench_save(filename):
+    from lazy5.create import save
+    save(_scratch(filename, 'save'), 'data', _np.load(filename), mode='w')
+
+@benchmark('create.save_gzip[large]', setup_large_array)
+def bench_save_gzip(filename):
+    from lazy5.create import save
+    save(_scratch(filename, 'save'), 'data', _np.load(filename), mode='w',
+         chunks=(16, 256, 256), compression='gzip', shuffle=True)
+
+@benchmark('create.save_gzip_parallel[large]', setup_large_array)
+def bench_save_gzip_parallel(filename):
+    from lazy5.create import save
+    save(_scratch(filename, 'save'), 'data', _np.load(filename), mode='w',
+         chunks=(16, 256, 256), compression='gzip', shuffle=True, workers=_os.cpu_count())
+
+# load
+
+@benchmark('load.load[large]', setup_large)
+def bench_load(filename):
+    from lazy5.load import load
+    load(filename, 'data')
+
+@benchmark('load.load_parallel[large]', setup_large)
+def bench_load_parallel(filename):
+    from lazy5.load import load
+    load(filename, 'data', workers=max(_os.cpu_count() or 1, 2))
+
+@benchmark('load.load_where[sparse_events]', setup_sparse_events)
+def bench_load_where(filename):
+    from lazy5.load import load_where
+    load_where(filename, 'signal', [('>', 5.0)])
+
+# Viewer model (what HdfLoad does, without Qt)
+
+@benchmark('ui.viewer_model[wide]', setup_wide)
+def bench_viewer_model(filename):
+    from lazy5.inspect import get_hierarchy, get_attrs_dset
+    from lazy5.nonh5utils import filterlist
+    hierarchy = get_hierarchy(filename, grp_w_dset=True)
+    for grp in list(hierarchy)[:50]:
+        dsets = filterlist(hierarchy[grp], ['dset'], keep_filtered_items=True)
+        for dset in dsets:
+            get_attrs_dset(filename, '{}/{}'.format(grp, dset).replace('//', '/'),
+                           convert_to_str=True)
+
+def copy_setup(ctx, tmpdir):
+    """
+    Copy a setup context's files into tmpdir so that benchmarks that modify
+    files (e.g., alter) do not affect others. Returns the new context.
+    """
+    if isinstance(ctx, list):
+        return [copy_setup(item, tmpdir) for item in ctx]
+    new = _os.path.join(tmpdir, _os.path.basename(ctx))
+    _shutil.copyfile(ctx, new)
+    return new
@@ -1,13 +1,18 @@
 """Macros for h5py... because I'm lazy"""
 
-# ! Inside try-except so setup can still grab the __version__ prior to install
-try:
-    from . import config
-    from . import utils
-    from . import inspect
-    from . import alter
-    from . import create
-except Exception as e:
-    print(e)
-
-__version__ = '0.3.0'
\ No newline at end of file
+__version__ = '0.3.0'
+
+# Submodules are imported on first attribute access (PEP 562), so importing
+# lazy5 (e.g., by setup.py for __version__, or a CLI's --help) does not
+# import h5py or numpy.
+_SUBMODULES = ('alter', 'cache', 'chunks', 'cli', 'config', 'create', 'inspect', 'instrument',
+               'load', 'nonh5utils', 'pool', 'query', 'serve', 'swmr', 'table', 'ui', 'utils')
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        from importlib import import_module
+        return import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBMODULES))
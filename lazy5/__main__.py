@@ -0,0 +1,6 @@
+""" python -m lazy5: see lazy5.cli """
+import sys as _sys
+
+from .cli import main
+
+_sys.exit(main())
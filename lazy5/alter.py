@@ -1,12 +1,33 @@
 """ Macros for inspection of HDF5 files """
+import os as _os
+import time as _time
+import fnmatch as _fnmatch
+from math import gcd as _gcd
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+
 import h5py as _h5py
+import numpy as _np
 
-from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath)
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    complex_to_compound as _complex_to_compound,
+                    compound_to_complex as _compound_to_complex)
 from .nonh5utils import (check_type_compat as _check_type_compat)
-
-from .config import DefaultConfig
-_h5py.get_config().complex_names = DefaultConfig().complex_names
-
+from .inspect import (get_groups as _get_groups, get_datasets as _get_datasets)
+from .chunks import (get_filters as _get_filters,
+                     has_supported_filters as _has_supported_filters,
+                     chunk_offsets as _chunk_offsets,
+                     write_chunk_stats as _write_chunk_stats,
+                     delete_chunk_stats as _delete_chunk_stats,
+                     STATS_GROUP as _STATS_GROUP, CHECKSUM_GROUP as _CHECKSUM_GROUP)
+from .config import setting as _setting
+
+def _is_internal(dset):
+    """ Is a dataset lazy5 metadata (chunk statistics or checksums), not user data """
+    return dset.startswith((_STATS_GROUP + '/', _CHECKSUM_GROUP + '/'))
+
+@_instrument.timed('alter.alter_attr')
 def alter_attr(dset, attr_key, attr_val, file=None, pth=None, verbose=False,
                check_same_type=False, must_exist=False):
     """
@@ -71,7 +92,7 @@ def alter_attr(dset, attr_key, attr_val, file=None, pth=None, verbose=False,
             raise KeyError(err_str1 + 'must_exist set to True')
 
     if check_same_type & (dset_object.attrs.get(attr_key) is not None):
-        if not _check_type_compat(dset_object.attrs[attr_key], attr_val):
+        if not _check_type_compat(_compound_to_complex(dset_object.attrs[attr_key]), attr_val):
             err_str1 = 'New attribute value type ({}) '.format(type(attr_val))
             err_str2 = 'must be of the same type as the original '
             err_str3 = '({})'.format(type(dset_object.attrs[attr_key]))
@@ -84,11 +105,12 @@ def alter_attr(dset, attr_key, attr_val, file=None, pth=None, verbose=False,
             print('Dataset[{}] = {} -> {}'.format(attr_key, dset_object.attrs[attr_key],
                                                   attr_val))
 
-    dset_object.attrs[attr_key] = attr_val
+    dset_object.attrs[attr_key] = _complex_to_compound(attr_val)
 
     if fof is not None:
         fof.close_if_file_not_fid()
 
+@_instrument.timed('alter.alter_attr_same')
 def alter_attr_same(dset, attr_key, attr_val, file=None, pth=None, verbose=True,
                     must_exist=False):
     """
@@ -124,6 +146,7 @@ def alter_attr_same(dset, attr_key, attr_val, file=None, pth=None, verbose=True,
     return alter_attr(dset, attr_key, attr_val, file, pth, verbose,
                       check_same_type=True, must_exist=must_exist)
 
+@_instrument.timed('alter.write_attr_dict')
 def write_attr_dict(dset, attr_dict, fid=None, sort_attrs=False, verbose=False):
     """
     Write entire dictionary of attrbutes to dataset.
@@ -156,4 +179,539 @@ def write_attr_dict(dset, attr_dict, fid=None, sort_attrs=False, verbose=False):
         alter_attr(dset, attr_key, attr_val, file=fid, verbose=verbose,
                    check_same_type=False, must_exist=False)
 
-    return True
\ No newline at end of file
+    return True
+
+def _iter_links(grp):
+    """ Yield (name, link) for every soft or external link under grp """
+    for name in grp:
+        link = grp.get(name, getlink=True)
+        if isinstance(link, (_h5py.SoftLink, _h5py.ExternalLink)):
+            yield '{}/{}'.format(grp.name.rstrip('/'), name), link
+        elif isinstance(link, _h5py.HardLink) and isinstance(grp.get(name), _h5py.Group):
+            for item in _iter_links(grp[name]):
+                yield item
+
+def _is_reference(val):
+    """ Is an attribute value an object or region reference (or an array of them) """
+    if isinstance(val, (_h5py.Reference, _h5py.RegionReference)):
+        return True
+    return isinstance(val, _np.ndarray) and (_h5py.check_ref_dtype(val.dtype) is not None)
+
+def _remap_reference(src_fid, dst_fid, ref):
+    """
+    Reference to the object of dst_fid at the path of the target of ref (in
+    src_fid). None for region references and targets that were not copied.
+    """
+    if isinstance(ref, _h5py.RegionReference) or (not ref):
+        return None
+    try:
+        name = src_fid[ref].name
+    except (KeyError, ValueError):
+        return None
+    if (name is None) or _is_internal(name) or (name not in dst_fid):
+        return None
+    return dst_fid[name].ref
+
+def _copy_reference_attrs(src_obj, dst_obj):
+    """
+    Copy the reference-valued attributes of src_obj to dst_obj (in another
+    file), pointing at the same paths. Attributes whose targets were not
+    copied, and region references, are dropped.
+    """
+    for attr_key in src_obj.attrs:
+        val = src_obj.attrs[attr_key]
+        if not _is_reference(val):
+            continue
+        if isinstance(val, _np.ndarray):
+            refs = [_remap_reference(src_obj.file, dst_obj.file, ref) for ref in val.flat]
+            if any([ref is None for ref in refs]):
+                continue
+            dst_obj.attrs[attr_key] = _np.array(refs, dtype=_h5py.ref_dtype).reshape(val.shape)
+        else:
+            ref = _remap_reference(src_obj.file, dst_obj.file, val)
+            if ref is not None:
+                dst_obj.attrs[attr_key] = ref
+
+def _repack_dset_kwargs(src_dset, chunks=None, compression=None, compression_opts=None,
+                        shuffle=None, dtype=None):
+    """
+    Dataset-creation keyword arguments for the repacked copy of src_dset. A
+    setting of None keeps that of src_dset.
+    """
+    kwargs = {'shape': src_dset.shape,
+              'dtype': src_dset.dtype if dtype is None else _np.dtype(dtype)}
+    if src_dset.shape in [(), None]:
+        return kwargs
+
+    if chunks is None:
+        kwargs['chunks'] = src_dset.chunks
+    elif isinstance(chunks, (tuple, list)) and (len(chunks) != len(src_dset.shape)):
+        kwargs['chunks'] = True  # Chunk shape does not apply to this dataset
+    else:
+        kwargs['chunks'] = chunks
+    if compression is None:
+        compression = src_dset.compression
+        if compression_opts is None:
+            compression_opts = src_dset.compression_opts
+    if compression:
+        kwargs['compression'] = compression
+        kwargs['compression_opts'] = compression_opts
+    kwargs['shuffle'] = src_dset.shuffle if shuffle is None else shuffle
+    if src_dset.maxshape != src_dset.shape:
+        kwargs['maxshape'] = src_dset.maxshape
+        if not kwargs['chunks']:
+            kwargs['chunks'] = True
+    if kwargs['shuffle'] or compression:
+        kwargs['chunks'] = kwargs['chunks'] or True
+    if src_dset.fillvalue is not None and (dtype is None):
+        kwargs['fillvalue'] = src_dset.fillvalue
+    return kwargs
+
+def _repack_dset(src_dset, dst_grp, name, block_nbytes=2**26, **kwargs):
+    """
+    Stream a dataset into dst_grp[name] block-by-block (bounded memory),
+    changing chunking, compression, and/or dtype (see repack). Attributes are
+    copied, except reference-valued ones (see _copy_reference_attrs).
+    """
+    dset_kwargs = _repack_dset_kwargs(src_dset, **kwargs)
+    dst_dset = dst_grp.create_dataset(name, **dset_kwargs)
+
+    if src_dset.shape == ():
+        dst_dset[()] = src_dset[()]
+    elif (src_dset.shape is not None) and (src_dset.size > 0):
+        # Blocks along the first axis, aligned to the source and destination
+        # chunking to avoid reading/compressing chunks more than once
+        row_nbytes = max(int(_np.prod(src_dset.shape[1:])) * src_dset.dtype.itemsize, 1)
+        align = 1
+        for chk in [src_dset.chunks, dst_dset.chunks]:
+            if chk is not None:
+                align = align * chk[0] // _gcd(align, chk[0])
+        block_rows = max(block_nbytes // row_nbytes // align, 1) * align
+        for start in range(0, src_dset.shape[0], block_rows):
+            stop = min(start + block_rows, src_dset.shape[0])
+            dst_dset[start:stop] = src_dset[start:stop].astype(dst_dset.dtype, copy=False)
+
+    for attr_key in src_dset.attrs:
+        if not _is_reference(src_dset.attrs[attr_key]):
+            dst_dset.attrs[attr_key] = src_dset.attrs[attr_key]
+    return dst_dset
+
+def _repack_dsets_to_file(src_fp, dst_fp, dset_list, kwargs):
+    """ Process-pool worker: repack dset_list of src_fp into a new file dst_fp """
+    with _h5py.File(src_fp, 'r') as src_fid, _h5py.File(dst_fp, 'w') as dst_fid:
+        for dset in dset_list:
+            grp_name, dset_name = dset.rsplit('/', maxsplit=1)
+            dst_grp = dst_fid.require_group(grp_name or '/')
+            _repack_dset(src_fid[dset], dst_grp, dset_name, **kwargs)
+    return dst_fp
+
+@_instrument.timed('alter.repack')
+def repack(src, dst, pth=None, dst_pth=None, chunks=None, compression=None,
+           compression_opts=None, shuffle=None, dtype=None, block_nbytes=2**26,
+           workers=None, verbose=False):
+    """
+    Repack (defragment) an HDF5 file by streaming every dataset into a fresh
+    file, optionally changing the chunking, compression, and/or dtype. Groups,
+    attributes, and soft/external links are preserved. Object-reference
+    attributes are pointed at the repacked objects (region references are
+    dropped). lazy5's chunk statistics and checksum companions are not
+    copied: they describe the old chunks (see index_chunk_stats).
+
+    Parameters
+    ----------
+    src : str or h5py.File
+        Filename or File-object for the source HDF5 file
+
+    dst : str
+        Filename for the repacked HDF5 file (will be overwritten)
+
+    pth : str
+        Path of src
+
+    dst_pth : str
+        Path of dst. If None, pth.
+
+    chunks : tuple or bool
+        Chunk shape (applied to all datasets) or True for auto-chunking. If
+        None, keep the source chunking.
+
+    compression : str or bool
+        Compression filter (e.g., 'gzip'), or False for no compression. If
+        None, keep the source compression.
+
+    compression_opts : int
+        Compression settings (e.g., gzip level 0-9)
+
+    shuffle : bool
+        Apply the byte-shuffle filter. If None, keep the source setting.
+
+    dtype : numpy.dtype
+        Cast all datasets to dtype. If None, keep the source dtype.
+
+    block_nbytes : int
+        Approximate maximum number of bytes of a dataset held in memory (per
+        worker) at one time
+
+    workers : int
+        If > 1, repack datasets in a pool of processes. Each process writes to
+        a temporary file (dst.partN) that is then merged into dst. The merge
+        copies raw chunks (no re-compression), but every dataset is still
+        written twice and temporary disk space up to the size of dst is
+        needed (see tmp_size in the report): worthwhile when re-compression,
+        not I/O, is the bottleneck. The workers re-open src by name, so a
+        File-object src must be open read-only. If None, the workers setting
+        of the current configuration (see lazy5.config.use_config).
+
+    verbose : bool
+        Verbose output to stdout
+
+    Returns
+    -------
+    OrderedDict : Size report with keys src_size, dst_size, tmp_size (bytes
+    written to temporary files), n_groups, n_dsets, and time (s)
+
+    Notes
+    -----
+    If repacking fails, the temporary files and the partial dst are removed.
+    """
+    tstart = _time.time()
+    workers = _setting('workers', workers)
+    src_fp = _fullpath(src, pth)
+    dst_fp = _fullpath(dst, dst_pth if dst_pth is not None else pth)
+    kwargs = {'chunks': chunks, 'compression': compression,
+              'compression_opts': compression_opts, 'shuffle': shuffle,
+              'dtype': dtype, 'block_nbytes': block_nbytes}
+
+    src_fof = _FidOrFile(src_fp)
+    src_fid = src_fof.fid
+    src_name = src_fid.filename
+    tmp_fps = []
+    tmp_size = 0
+    try:
+        grp_list = [grp for grp in _get_groups(src_fid) if not _is_internal(grp + '/')]
+        dset_list = [dset for dset in _get_datasets(src_fid, fulldsetpath=True)
+                     if not _is_internal(dset)]
+        use_processes = (workers is not None) and (workers > 1) and (len(dset_list) > 1)
+        if use_processes and (src_fid.mode != 'r'):
+            raise ValueError('Repacking with workers re-opens {} by name: the File-object '
+                             'must be open read-only (or use workers=1)'.format(src_name))
+
+        with _h5py.File(dst_fp, 'w') as dst_fid:
+            for grp in grp_list:
+                dst_grp = dst_fid.require_group(grp)
+                for attr_key in src_fid[grp].attrs:
+                    if not _is_reference(src_fid[grp].attrs[attr_key]):
+                        dst_grp.attrs[attr_key] = src_fid[grp].attrs[attr_key]
+
+            if not use_processes:
+                for dset in dset_list:
+                    if verbose:
+                        print('Repacking {}'.format(dset))
+                    grp_name, dset_name = dset.rsplit('/', maxsplit=1)
+                    _repack_dset(src_fid[dset], dst_fid[grp_name or '/'], dset_name, **kwargs)
+            else:
+                # Balance bins of datasets by (uncompressed) size
+                bins = [[] for _ in range(min(workers, len(dset_list)))]
+                bin_nbytes = [0] * len(bins)
+                dset_nbytes = dict([[dset,
+                                     (src_fid[dset].size or 0) * src_fid[dset].dtype.itemsize]
+                                    for dset in dset_list])
+                for dset in sorted(dset_list, key=lambda x: -dset_nbytes[x]):
+                    idx = bin_nbytes.index(min(bin_nbytes))
+                    bins[idx].append(dset)
+                    bin_nbytes[idx] += dset_nbytes[dset]
+
+                tmp_fps = ['{}.part{}'.format(dst_fp, num) for num in range(len(bins))]
+                with _ProcessPoolExecutor(max_workers=len(bins)) as executor:
+                    futures = [executor.submit(_repack_dsets_to_file, src_name, tmp_fp,
+                                               dset_bin, kwargs)
+                               for tmp_fp, dset_bin in zip(tmp_fps, bins)]
+                    for future in futures:
+                        tmp_fp = future.result()
+                        tmp_size += _os.path.getsize(tmp_fp)
+                        with _h5py.File(tmp_fp, 'r') as tmp_fid:
+                            for dset in _get_datasets(tmp_fid, fulldsetpath=True):
+                                if verbose:
+                                    print('Repacked {}'.format(dset))
+                                dst_fid.copy(tmp_fid[dset], dset)
+                        _os.remove(tmp_fp)
+
+            for name, link in _iter_links(src_fid['/']):
+                if not _is_internal(name):
+                    dst_fid[name] = link
+
+            # Object references are addresses in src: point them at the copies
+            for name in grp_list + dset_list:
+                _copy_reference_attrs(src_fid[name], dst_fid[name])
+    except BaseException:
+        if _os.path.exists(dst_fp) and (_os.path.abspath(dst_fp) != _os.path.abspath(src_name)):
+            _os.remove(dst_fp)
+        raise
+    finally:
+        for tmp_fp in tmp_fps:
+            if _os.path.exists(tmp_fp):
+                _os.remove(tmp_fp)
+        src_fof.close_if_file_not_fid()
+
+    report = _OrderedDict([['src_size', _os.path.getsize(src_name)],
+                           ['dst_size', _os.path.getsize(dst_fp)],
+                           ['tmp_size', tmp_size],
+                           ['n_groups', len(grp_list)],
+                           ['n_dsets', len(dset_list)],
+                           ['time', _time.time() - tstart]])
+    if verbose:
+        print('Repacked {} ({} bytes) -> {} ({} bytes)'.format(src_name, report['src_size'],
+                                                                dst_fp, report['dst_size']))
+    _instrument.record('bytes_read', 'alter.repack', report['src_size'])
+    _instrument.record('bytes_written', 'alter.repack', report['dst_size'])
+    return report
+
+def _raw_compatible(src_dset, dst_dset):
+    """ Can chunks be transferred raw (no codec work) from src_dset to dst_dset """
+    return ((src_dset.chunks is not None) and (src_dset.chunks == dst_dset.chunks) and
+            (src_dset.shape == dst_dset.shape) and (src_dset.dtype == dst_dset.dtype) and
+            hasattr(src_dset.id, 'get_num_chunks') and
+            _has_supported_filters(src_dset) and _has_supported_filters(dst_dset) and
+            (_get_filters(src_dset) == _get_filters(dst_dset)))
+
+@_instrument.timed('alter.copy_chunks_raw')
+def copy_chunks_raw(src_dset, dst_dset):
+    """
+    Transfer the stored chunks of src_dset to dst_dset without decompressing
+    or re-compressing (read_direct_chunk -> write_direct_chunk). The datasets
+    must have the same shape, dtype, chunking, and filters. The statistics
+    of dst_dset (see lazy5.chunks.write_chunk_stats) are deleted.
+
+    Parameters
+    ----------
+    src_dset : h5py.Dataset
+        Source Dataset-object
+
+    dst_dset : h5py.Dataset
+        Destination Dataset-object (in the same or another file)
+
+    Returns
+    -------
+    int : Number of chunks transferred
+    """
+    if not _raw_compatible(src_dset, dst_dset):
+        err_str1 = 'Datasets {} and {} differ in shape, dtype, '.format(src_dset.name, dst_dset.name)
+        raise ValueError(err_str1 + 'chunking, or filters; cannot copy raw chunks')
+
+    _delete_chunk_stats(dst_dset.file, dst_dset.name)
+    src_offsets = set()
+    for num in range(src_dset.id.get_num_chunks()):
+        offset = src_dset.id.get_chunk_info(num).chunk_offset
+        filter_mask, buf = src_dset.id.read_direct_chunk(offset)
+        dst_dset.id.write_direct_chunk(offset, buf, filter_mask)
+        src_offsets.add(offset)
+
+    # Chunks stored in dst_dset but not in src_dset revert to the fill value
+    for offset in _chunk_offsets(dst_dset.shape, dst_dset.chunks):
+        if offset in src_offsets:
+            continue
+        if dst_dset.id.get_chunk_info_by_coord(offset).byte_offset is not None:
+            slc = tuple([slice(off, off + chk) for off, chk in zip(offset, dst_dset.chunks)])
+            dst_dset[slc] = src_dset.fillvalue
+    return len(src_offsets)
+
+@_instrument.timed('alter.copy_dsets')
+def copy_dsets(src, dst=None, patterns='*', pth=None, dst_pth=None, dst_grp='/',
+               dset_overwrite=False, dry_run=False, verbose=False):
+    """
+    Copy datasets (with attributes) within a file or across files using
+    H5Ocopy, which copies stored (compressed) chunks as-is. Existing
+    destination datasets (dset_overwrite=True) with matching shape, dtype,
+    chunking, and filters are overwritten in place by raw chunk transfer.
+
+    Parameters
+    ----------
+    src : str or h5py.File
+        Filename or File-object for the source HDF5 file
+
+    dst : str or h5py.File
+        Filename or File-object for the destination HDF5 file (created if
+        necessary). If None, copy within src.
+
+    patterns : str or list of str
+        Glob pattern(s) (fnmatch) matched against full dataset names, e.g.,
+        '/Group1/*' or ['*_1', '/base']. lazy5's metadata groups
+        (lazy5.chunks.STATS_GROUP and CHECKSUM_GROUP) are never matched.
+
+    pth : str
+        Path of src
+
+    dst_pth : str
+        Path of dst. If None, pth.
+
+    dst_grp : str
+        Group in dst under which the source hierarchy is copied
+
+    dset_overwrite : bool
+        If a destination dataset already exists, overwrite or raise error?
+
+    dry_run : bool
+        Do not copy; only report what would be copied
+
+    verbose : bool
+        Verbose output to stdout
+
+    Returns
+    -------
+    OrderedDict : (source dataset, stored size in bytes) for each dataset
+    copied (or, if dry_run, to be copied)
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    src_fp = _fullpath(src, pth)
+    dst_fp = None if dst is None else _fullpath(dst, dst_pth if dst_pth is not None else pth)
+    same_file = (dst_fp is None) or (isinstance(src_fp, str) and isinstance(dst_fp, str) and
+                                     (_os.path.abspath(src_fp) == _os.path.abspath(dst_fp)))
+    if same_file:
+        src_fof = _FidOrFile(src_fp, mode='r' if dry_run else 'r+')
+        dst_fof = None
+        dst_fid = src_fof.fid
+    else:
+        src_fof = _FidOrFile(src_fp)
+        dst_fof = None if dry_run else _FidOrFile(dst_fp, mode='a')
+        dst_fid = None if dry_run else dst_fof.fid
+    src_fid = src_fof.fid
+
+    try:
+        dset_list = [dset for dset in _get_datasets(src_fid, fulldsetpath=True)
+                     if any([_fnmatch.fnmatchcase(dset, pattern) for pattern in patterns]) and
+                     not _is_internal(dset)]
+
+        report = _OrderedDict()
+        for dset in dset_list:
+            dst_dset = dst_grp.rstrip('/') + dset
+            if same_file and (dst_dset == dset):
+                continue
+            report[dset] = src_fid[dset].id.get_storage_size()
+            if dry_run:
+                continue
+
+            if dst_dset in dst_fid:
+                if not dset_overwrite:
+                    err_str1 = 'Dataset {} exists. '.format(dst_dset)
+                    err_str2 = 'Param dset_overwrite=False. Will not overwrite'
+                    raise IOError(err_str1 + err_str2)
+                if _raw_compatible(src_fid[dset], dst_fid[dst_dset]):
+                    if verbose:
+                        print('Copying raw chunks {} -> {}'.format(dset, dst_dset))
+                    copy_chunks_raw(src_fid[dset], dst_fid[dst_dset])
+                    for attr_key in list(dst_fid[dst_dset].attrs):
+                        del dst_fid[dst_dset].attrs[attr_key]
+                    write_attr_dict(dst_fid[dst_dset], dict(src_fid[dset].attrs))
+                    continue
+                del dst_fid[dst_dset]
+
+            if verbose:
+                print('Copying {} -> {}'.format(dset, dst_dset))
+            _delete_chunk_stats(dst_fid, dst_dset)
+            dst_fid.require_group(dst_dset.rsplit('/', maxsplit=1)[0] or '/')
+            dst_fid.copy(src_fid[dset], dst_dset)
+    finally:
+        if dst_fof is not None:
+            dst_fof.close_if_file_not_fid()
+        src_fof.close_if_file_not_fid()
+
+    if not dry_run:
+        _instrument.record('bytes_written', 'alter.copy_dsets', sum(report.values()))
+    return report
+
+@_instrument.timed('alter.copy_file')
+def copy_file(src, dst, pth=None, dst_pth=None, dry_run=False):
+    """
+    Copy an entire HDF5 file (groups, datasets, attributes, and links) into a
+    new file via H5Ocopy. Stored chunks are copied without re-compression and
+    the new file carries no unused (fragmented) space.
+
+    Parameters
+    ----------
+    src : str or h5py.File
+        Filename or File-object for the source HDF5 file
+
+    dst : str
+        Filename for the new HDF5 file (will be overwritten)
+
+    pth : str
+        Path of src
+
+    dst_pth : str
+        Path of dst. If None, pth.
+
+    dry_run : bool
+        Do not copy; only report what would be copied
+
+    Returns
+    -------
+    OrderedDict : (dataset, stored size in bytes) for each dataset
+    """
+    src_fp = _fullpath(src, pth)
+    dst_fp = _fullpath(dst, dst_pth if dst_pth is not None else pth)
+
+    src_fof = _FidOrFile(src_fp)
+    src_fid = src_fof.fid
+    try:
+        report = _OrderedDict([[dset, src_fid[dset].id.get_storage_size()]
+                               for dset in _get_datasets(src_fid, fulldsetpath=True)])
+
+        if not dry_run:
+            with _h5py.File(dst_fp, 'w') as dst_fid:
+                for name in src_fid:
+                    link = src_fid.get(name, getlink=True)
+                    if isinstance(link, _h5py.HardLink):
+                        src_fid.copy(src_fid[name], dst_fid, name=name)
+                    else:
+                        dst_fid[name] = link
+                for attr_key in src_fid.attrs:
+                    dst_fid.attrs[attr_key] = src_fid.attrs[attr_key]
+    finally:
+        src_fof.close_if_file_not_fid()
+    if not dry_run:
+        _instrument.record('bytes_written', 'alter.copy_file', sum(report.values()))
+    return report
+
+@_instrument.timed('alter.index_chunk_stats')
+def index_chunk_stats(file, pth=None, dsets=None, workers=None):
+    """
+    Build (or rebuild) the per-chunk statistics (min, max, count) of numeric
+    datasets of a file, for filtered reads (see lazy5.load.load_where and
+    lazy5.chunks.write_chunk_stats). Raw chunks are decoded and reduced in a
+    pool of threads.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    pth : str
+        Path
+
+    dsets : list of str
+        Datasets to index. If None, all numeric datasets.
+
+    workers : int
+        Number of threads. If None, the workers setting of the current
+        configuration or, if None, number of CPUs.
+
+    Returns
+    -------
+    OrderedDict : (dataset, number of chunks)
+    """
+    workers = _setting('workers', workers)
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp, mode='r+')
+    fid = fof.fid
+    try:
+        if dsets is None:
+            dsets = [dset for dset in _get_datasets(fid, fulldsetpath=True)
+                     if (fid[dset].dtype.kind in 'biuf') and not _is_internal(dset)]
+        out = _OrderedDict()
+        for dset in dsets:
+            out[dset] = _write_chunk_stats(fid[dset], workers=workers)
+        return out
+    finally:
+        fof.close_if_file_not_fid()
@@ -0,0 +1,270 @@
+"""
+Process-level cache of decoded chunks, shared across datasets and files
+
+h5py's raw data chunk cache is per open dataset and is lost when the file
+is closed, i.e., after every macro called with a filename. A ChunkCache
+keeps decoded chunks (least-recently-used out) keyed by (file identity,
+dataset name, chunk offset), so re-reading a region of a file that was
+closed and re-opened does not decompress its chunks again. Entries of a file
+are dropped when its modification time or size changes.
+
+lazy5.load.load uses the process-wide CHUNK_CACHE when the chunk_cache
+setting is True (see lazy5.config.use_config), or a given ChunkCache.
+
+Examples
+--------
+>>> with use_config(chunk_cache=True):
+...     for _ in range(10):
+...         data = load('file.h5', '/data', slc=np.s_[:100])  # Decoded once
+>>> CHUNK_CACHE.stats()
+"""
+import os as _os
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+import numpy as _np
+
+from . import instrument as _instrument
+from .chunks import (get_filters as _get_filters,
+                     has_supported_filters as _has_supported_filters,
+                     chunk_offsets as _chunk_offsets,
+                     chunk_selection as _chunk_selection,
+                     decode_chunk as _decode_chunk)
+
+__all__ = ['ChunkCache', 'CHUNK_CACHE', 'file_identity', 'is_cacheable']
+
+def file_identity(filename):
+    """
+    Identity and version of a file on disk
+
+    Returns
+    -------
+    (tuple, tuple) : (real path, device, inode), (mtime (ns), size)
+    """
+    stat = _os.stat(filename)
+    return ((_os.path.realpath(filename), stat.st_dev, stat.st_ino),
+            (stat.st_mtime_ns, stat.st_size))
+
+def is_cacheable(dset):
+    """
+    Can the chunks of a dataset be cached: chunked, of a fixed-size dtype,
+    and in a file opened read-only (writes by this process do not change the
+    file's modification time until flushed)
+    """
+    return ((dset.chunks is not None) and (not dset.dtype.hasobject) and
+            (dset.file.mode == 'r'))
+
+class ChunkCache:
+    """
+    Size-bounded LRU cache of decoded chunks (thread-safe)
+
+    Parameters
+    ----------
+    max_nbytes : int
+        Maximum size (bytes) of the cached chunks. Chunks larger than this
+        are not cached.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Chunks found / not found in the cache
+
+    evictions : int
+        Chunks dropped to stay within max_nbytes
+
+    invalidations : int
+        Chunks dropped because their file was modified
+    """
+    def __init__(self, max_nbytes=2**28):
+        self.max_nbytes = max_nbytes
+        self._lock = _threading.Lock()
+        self._chunks = _OrderedDict()  # (file identity, dset name, offset): ndarray
+        self._versions = {}  # file identity: version
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def _drop(self, identity):
+        """ Drop the entries of a file (lock held). Returns the number dropped """
+        keys = [key for key in self._chunks if key[0] == identity]
+        for key in keys:
+            self.nbytes -= self._chunks.pop(key).nbytes
+        self._versions.pop(identity, None)
+        return len(keys)
+
+    def _evict(self):
+        """ Drop least-recently-used entries until within max_nbytes (lock held) """
+        while self._chunks and (self.nbytes > self.max_nbytes):
+            _, arr = self._chunks.popitem(last=False)
+            self.nbytes -= arr.nbytes
+            self.evictions += 1
+        if not self._chunks:
+            self._versions.clear()
+
+    def validate(self, filename):
+        """
+        Identity of a file, dropping its cached chunks if it was modified
+        since they were cached
+        """
+        identity, version = file_identity(filename)
+        with self._lock:
+            if self._versions.get(identity, version) != version:
+                self.invalidations += self._drop(identity)
+            self._versions[identity] = version
+        return identity
+
+    def get(self, identity, name, offset):
+        """ Cached chunk (read-only ndarray) or None """
+        with self._lock:
+            arr = self._chunks.pop((identity, name, offset), None)
+            if arr is not None:
+                self._chunks[(identity, name, offset)] = arr
+                self.hits += 1
+            else:
+                self.misses += 1
+        _instrument.record('cache_hit' if arr is not None else 'cache_miss',
+                           'cache.ChunkCache')
+        return arr
+
+    def put(self, identity, name, offset, arr):
+        """ Cache a decoded chunk (made read-only) """
+        if arr.nbytes > self.max_nbytes:
+            return
+        arr.flags.writeable = False
+        with self._lock:
+            old = self._chunks.pop((identity, name, offset), None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._chunks[(identity, name, offset)] = arr
+            self.nbytes += arr.nbytes
+            self._evict()
+
+    def resize(self, max_nbytes):
+        """ Change the maximum size, evicting entries if needed """
+        with self._lock:
+            self.max_nbytes = max_nbytes
+            self._evict()
+
+    def invalidate(self, filename=None):
+        """ Drop the cached chunks of a file or, if None, of all files """
+        with self._lock:
+            if filename is None:
+                self._chunks.clear()
+                self._versions.clear()
+                self.nbytes = 0
+            else:
+                ids = [identity for identity in self._versions
+                       if identity[0] == _os.path.realpath(filename)]
+                for identity in ids:
+                    self._drop(identity)
+
+    def stats(self):
+        """ Counters and size as a dictionary """
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._chunks), 'nbytes': self.nbytes,
+                    'max_nbytes': self.max_nbytes, 'hits': self.hits,
+                    'misses': self.misses, 'hit_rate': self.hits / total if total else None,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+    def read(self, dset, selection=None, workers=None):
+        """
+        Read a hyperslab of a chunked dataset from cached chunks, reading and
+        decoding (and caching) the missing ones. Missing chunks are read raw
+        and decoded in a pool of threads when the dataset's filters are
+        supported (see lazy5.chunks.has_supported_filters), or read with
+        h5py otherwise, and copied into the output as they complete (at most
+        4 x workers chunks in flight, as in lazy5.load.read_chunks_parallel).
+
+        Parameters
+        ----------
+        dset : h5py.Dataset
+            Dataset-object (see is_cacheable)
+
+        selection : tuple of (start, stop)
+            Per-axis bounds. If None, entire dataset.
+
+        workers : int
+            Number of decompression threads. If None or 1, serial.
+
+        Returns
+        -------
+        ndarray
+        """
+        if selection is None:
+            selection = tuple([(0, dim) for dim in dset.shape])
+        identity = self.validate(dset.file.filename)
+        name = dset.name
+        chunks = dset.chunks
+
+        out = _np.empty(tuple([stop - start for start, stop in selection]), dtype=dset.dtype)
+        if out.size == 0:
+            return out
+
+        missing = []
+        for offset in _chunk_offsets(dset.shape, chunks, selection):
+            arr = self.get(identity, name, offset)
+            if arr is None:
+                missing.append(offset)
+            else:
+                slc_chunk, slc_out = _chunk_selection(offset, chunks, selection)
+                out[slc_out] = arr[slc_chunk]
+        if not missing:
+            return out
+
+        def place(offset, arr):
+            """ Copy a decoded chunk into out and cache it """
+            slc_chunk, slc_out = _chunk_selection(offset, chunks, selection)
+            out[slc_out] = arr[slc_chunk]
+            self.put(identity, name, offset, arr)
+
+        if not _has_supported_filters(dset):
+            for offset in missing:
+                region = tuple([slice(off, min(off + chk, dim))
+                                for off, chk, dim in zip(offset, chunks, dset.shape)])
+                place(offset, dset[region])
+            return out
+
+        filters = _get_filters(dset)
+        dtype = dset.dtype
+
+        def decode(filter_mask, buf):
+            """ Decode a raw chunk (None: not allocated) """
+            if buf is None:
+                return _np.full(chunks, dset.fillvalue, dtype=dtype)
+            return _decode_chunk(buf, filters, chunks, dtype, filter_mask=filter_mask)
+
+        def raw(offset):
+            """ Raw chunk (serialized by libhdf5) """
+            if dset.id.get_chunk_info_by_coord(offset).byte_offset is None:
+                return 0, None
+            return dset.id.read_direct_chunk(offset)
+
+        if (workers is None) or (workers < 2) or (len(missing) < 2):
+            for offset in missing:
+                place(offset, decode(*raw(offset)))
+            return out
+
+        # Raw reads in this thread, decoding in the pool; chunks are placed as
+        # they complete, with a bounded number in flight to limit memory use
+        max_inflight = 4 * workers
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for offset in missing:
+                pending.append((offset, executor.submit(decode, *raw(offset))))
+                while len(pending) >= max_inflight:
+                    done_offset, future = pending.pop(0)
+                    place(done_offset, future.result())
+            for done_offset, future in pending:
+                place(done_offset, future.result())
+        return out
+
+# Process-wide cache used by lazy5.load.load (chunk_cache setting). Resize
+# with CHUNK_CACHE.resize(max_nbytes)
+CHUNK_CACHE = ChunkCache()
@@ -0,0 +1,698 @@
+""" Utilities for raw (direct) chunk access of chunked HDF5 datasets """
+import hashlib as _hashlib
+import itertools as _itertools
+import json as _json
+import operator as _operator
+import os as _os
+import zlib as _zlib
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+import h5py as _h5py
+import numpy as _np
+
+__all__ = ['SUPPORTED_FILTERS', 'get_filters', 'has_supported_filters',
+           'chunk_offsets', 'chunk_selection', 'decode_chunk', 'encode_chunk',
+           'hash_array', 'hash_layout', 'hash_chunks',
+           'write_checksums', 'read_checksums', 'verify_chunks',
+           'COMPARISONS', 'chunk_may_match', 'stats_chunks', 'iter_chunk_blocks',
+           'write_chunk_stats', 'read_chunk_stats', 'delete_chunk_stats', 'candidate_chunks']
+
+# Attributes holding a dataset's stored chunk checksums (see write_checksums)
+CHECKSUM_ATTR = 'lazy5_checksums'
+CHECKSUM_LAYOUT_ATTR = 'lazy5_checksum_layout'
+
+# Checksums of datasets with too many chunks for an attribute (64 kB) are
+# stored in a companion dataset under this group, whose path is CHECKSUM_ATTR
+# (a string: object references do not survive copies of the file)
+CHECKSUM_GROUP = '/lazy5_checksums'
+
+# Companion datasets of per-chunk statistics (see write_chunk_stats), at
+# STATS_GROUP + dataset name
+STATS_GROUP = '/lazy5_chunk_stats'
+
+# Comparison operators of conditions (e.g., ('>', 10.0)) on values
+COMPARISONS = _OrderedDict([['==', _operator.eq], ['!=', _operator.ne], ['<', _operator.lt],
+                            ['<=', _operator.le], ['>', _operator.gt], ['>=', _operator.ge]])
+
+_MAX_ATTR_NBYTES = 60000
+
+# Filters that can be applied/removed by lazy5 (outside of libhdf5)
+SUPPORTED_FILTERS = (_h5py.h5z.FILTER_DEFLATE, _h5py.h5z.FILTER_SHUFFLE)
+
+def get_filters(dset):
+    """
+    Return the filter pipeline of a dataset in the order they are applied on
+    write.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object
+
+    Returns
+    -------
+    list : [(filter_id, filter_options_tuple), ...]
+    """
+    plist = dset.id.get_create_plist()
+    filters = []
+    for num in range(plist.get_nfilters()):
+        filter_id, _, filter_opts, _ = plist.get_filter(num)
+        filters.append((filter_id, tuple(filter_opts)))
+    return filters
+
+def has_supported_filters(dset):
+    """
+    Can the chunks of a dataset be read/written directly (raw), with the
+    filter pipeline applied by lazy5
+    """
+    if dset.chunks is None:
+        return False
+    # Direct chunk access and chunk info require h5py >= 3.0, HDF5 >= 1.10.5
+    if not (hasattr(dset.id, 'read_direct_chunk') and
+            hasattr(dset.id, 'get_chunk_info_by_coord')):
+        return False
+    if dset.dtype.hasobject or (dset.dtype.kind == 'V'):
+        return False
+    return all([filt[0] in SUPPORTED_FILTERS for filt in get_filters(dset)])
+
+def chunk_offsets(shape, chunks, selection=None):
+    """
+    Iterate over the offsets (the index of the first element) of every chunk
+    in the chunk grid, or only those that overlap selection.
+
+    Parameters
+    ----------
+    shape : tuple
+        Dataset shape
+
+    chunks : tuple
+        Chunk shape
+
+    selection : tuple of (start, stop)
+        Per-axis bounds of the region of interest. If None, the whole dataset.
+
+    Yields
+    ------
+    tuple : Chunk offset
+    """
+    if selection is None:
+        selection = [(0, dim) for dim in shape]
+    ranges = [range((start // chk) * chk, stop, chk)
+              for (start, stop), chk in zip(selection, chunks)]
+    for offset in _itertools.product(*ranges):
+        yield offset
+
+def chunk_selection(offset, chunks, selection):
+    """
+    Return the overlap of a chunk and the region of interest as a pair of
+    slice-tuples: into the chunk and into the output array.
+
+    Parameters
+    ----------
+    offset : tuple
+        Chunk offset
+
+    chunks : tuple
+        Chunk shape
+
+    selection : tuple of (start, stop)
+        Per-axis bounds of the region of interest
+
+    Returns
+    -------
+    (tuple of slices, tuple of slices) : chunk-slices, output-slices
+    """
+    slc_chunk = []
+    slc_out = []
+    for off, chk, (start, stop) in zip(offset, chunks, selection):
+        lo = max(off, start)
+        hi = min(off + chk, stop)
+        slc_chunk.append(slice(lo - off, hi - off))
+        slc_out.append(slice(lo - start, hi - start))
+    return tuple(slc_chunk), tuple(slc_out)
+
+def _shuffle(buf, itemsize):
+    """ Byte-shuffle (HDF5 shuffle filter) a bytes-like buffer """
+    buf = _np.frombuffer(buf, dtype=_np.uint8)
+    n_elem = buf.size // itemsize
+    if (itemsize == 1) or (n_elem < 2):
+        return buf.tobytes()
+    main = buf[:n_elem*itemsize].reshape(n_elem, itemsize).T
+    return main.tobytes() + buf[n_elem*itemsize:].tobytes()
+
+def _unshuffle(buf, itemsize):
+    """ Undo byte-shuffle (HDF5 shuffle filter) of a bytes-like buffer """
+    buf = _np.frombuffer(buf, dtype=_np.uint8)
+    n_elem = buf.size // itemsize
+    if (itemsize == 1) or (n_elem < 2):
+        return buf.tobytes()
+    main = buf[:n_elem*itemsize].reshape(itemsize, n_elem).T
+    return main.tobytes() + buf[n_elem*itemsize:].tobytes()
+
+def decode_chunk(buf, filters, chunks, dtype, filter_mask=0):
+    """
+    Undo the filter pipeline of a raw chunk
+
+    Parameters
+    ----------
+    buf : bytes
+        Raw (filtered) chunk as stored in the file
+
+    filters : list
+        Filter pipeline (see get_filters)
+
+    chunks : tuple
+        Chunk shape
+
+    dtype : numpy.dtype
+        Data type
+
+    filter_mask : int
+        Bit-mask of filters that were skipped when the chunk was written
+
+    Returns
+    -------
+    ndarray : Chunk of shape chunks
+    """
+    dtype = _np.dtype(dtype)
+    for num in range(len(filters) - 1, -1, -1):
+        if filter_mask & (1 << num):
+            continue
+        filter_id = filters[num][0]
+        if filter_id == _h5py.h5z.FILTER_DEFLATE:
+            buf = _zlib.decompress(buf)
+        elif filter_id == _h5py.h5z.FILTER_SHUFFLE:
+            buf = _unshuffle(buf, dtype.itemsize)
+        else:
+            raise ValueError('Unsupported filter: {}'.format(filter_id))
+    return _np.frombuffer(buf, dtype=dtype).reshape(chunks)
+
+def encode_chunk(arr, filters):
+    """
+    Apply the filter pipeline to a (full-sized) chunk. The output is
+    identical in format to that of libhdf5's filters; thus, readable by any
+    HDF5 reader.
+
+    Parameters
+    ----------
+    arr : ndarray
+        Chunk data. Edge chunks must be padded to the full chunk shape.
+
+    filters : list
+        Filter pipeline (see get_filters)
+
+    Returns
+    -------
+    bytes : Raw (filtered) chunk
+    """
+    arr = _np.ascontiguousarray(arr)
+    buf = arr.tobytes()
+    for filter_id, filter_opts in filters:
+        if filter_id == _h5py.h5z.FILTER_DEFLATE:
+            level = filter_opts[0] if filter_opts else 4
+            buf = _zlib.compress(buf, level)
+        elif filter_id == _h5py.h5z.FILTER_SHUFFLE:
+            buf = _shuffle(buf, arr.dtype.itemsize)
+        else:
+            raise ValueError('Unsupported filter: {}'.format(filter_id))
+    return buf
+
+def _hash_bytes(buf):
+    """ Hex digest of a bytes-like object (blake2b releases the GIL) """
+    return _hashlib.blake2b(buf, digest_size=16).hexdigest()
+
+def hash_array(arr):
+    """ Hex digest of an ndarray's dtype and values """
+    arr = _np.asarray(arr)
+    if arr.dtype.hasobject:
+        return _hash_bytes(repr((arr.shape, arr.tolist())).encode())
+    hasher = _hashlib.blake2b(repr((arr.dtype.str, arr.shape)).encode(), digest_size=16)
+    hasher.update(_np.ascontiguousarray(arr).reshape(-1).view(_np.uint8))
+    return hasher.hexdigest()
+
+def hash_layout(dset, block_nbytes=2**24, raw=True):
+    """
+    How hash_chunks hashes a dataset. Hashes of two datasets are comparable
+    only if computed with the same layout.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object
+
+    block_nbytes : int
+        Size of the blocks of a 'data' layout (bytes)
+
+    raw : bool
+        Hash raw chunks if possible. Otherwise, always hash values.
+
+    Returns
+    -------
+    list : ['raw', chunks, filters] for raw (stored) chunks of chunked
+    datasets; otherwise, ['data', rows] for blocks of rows (along the first
+    axis) of the values
+    """
+    if (raw and (dset.chunks is not None) and hasattr(dset.id, 'read_direct_chunk') and
+            hasattr(dset.id, 'get_chunk_info_by_coord') and not dset.dtype.hasobject):
+        return ['raw', list(dset.chunks), [[filt[0], list(filt[1])] for filt in get_filters(dset)]]
+    if not dset.shape:
+        return ['data', 1]
+    row_nbytes = max(int(_np.prod(dset.shape[1:])) * dset.dtype.itemsize, 1)
+    return ['data', max(block_nbytes // row_nbytes, 1)]
+
+def hash_chunks(dset, layout=None, workers=None):
+    """
+    Hash each chunk (or block) of a dataset, in a pool of threads.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object
+
+    layout : list
+        See hash_layout. If None, hash_layout(dset). A 'raw' layout must
+        match that of dset.
+
+    workers : int
+        Number of hashing threads. If None, number of CPUs.
+
+    Returns
+    -------
+    OrderedDict : (key, hex digest). Keys are the chunk offsets (raw) or
+    first row of each block (data), as comma-separated strings. Unallocated
+    chunks have a digest of None.
+    """
+    if layout is None:
+        layout = hash_layout(dset)
+    if layout[0] == 'raw':
+        if hash_layout(dset)[:2] != layout[:2]:
+            raise ValueError('Raw hashes of {} require chunks {}'.format(dset.name, layout[1]))
+    if workers is None:
+        workers = _os.cpu_count() or 1
+
+    def hash_raw(filter_mask, buf):
+        return _hash_bytes(bytes([filter_mask & 0xff]) + buf)
+
+    hashes = _OrderedDict()
+    max_inflight = 4 * workers
+    with _ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+
+        def submit(key, func, *args):
+            pending.append((key, None if func is None else executor.submit(func, *args)))
+            # Bound the number of chunks (or blocks) held in memory
+            while len(pending) >= max_inflight:
+                done_key, future = pending.pop(0)
+                hashes[done_key] = None if future is None else future.result()
+
+        if layout[0] == 'raw':
+            for offset in chunk_offsets(dset.shape, dset.chunks):
+                key = ','.join([str(num) for num in offset])
+                info = dset.id.get_chunk_info_by_coord(offset)
+                if info.byte_offset is None:  # Not allocated
+                    submit(key, None)
+                    continue
+                filter_mask, buf = dset.id.read_direct_chunk(offset)
+                submit(key, hash_raw, filter_mask, buf)
+        elif not dset.shape:
+            submit('0', hash_array, _np.asarray(dset[()]))
+        else:
+            rows = layout[1]
+            for start in range(0, dset.shape[0], rows):
+                submit(str(start), hash_array, dset[start:start + rows])
+        for key, future in pending:
+            hashes[key] = None if future is None else future.result()
+    return hashes
+
+def write_checksums(dset, workers=None):
+    """
+    Hash the stored (raw, still compressed) chunks of a dataset and store the
+    digests with it, for verify_chunks. Datasets without raw chunk access
+    are hashed by blocks of values.
+
+    The digests (16 bytes per chunk; zeros for unallocated chunks) are kept
+    in the CHECKSUM_ATTR attribute or, if too large for an attribute, in a
+    companion dataset under CHECKSUM_GROUP whose path is CHECKSUM_ATTR.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object (of a file open for writing)
+
+    workers : int
+        Number of hashing threads. If None, number of CPUs.
+
+    Returns
+    -------
+    int : Number of chunks (or blocks) hashed
+    """
+    layout = hash_layout(dset)
+    hashes = hash_chunks(dset, layout=layout, workers=workers)
+    digests = _np.zeros((len(hashes), 16), dtype=_np.uint8)
+    for num, digest in enumerate(hashes.values()):
+        if digest is not None:
+            digests[num] = _np.frombuffer(bytes.fromhex(digest), dtype=_np.uint8)
+
+    companion = CHECKSUM_GROUP + dset.name
+    if companion in dset.file:
+        del dset.file[companion]
+    if digests.nbytes <= _MAX_ATTR_NBYTES:
+        dset.attrs[CHECKSUM_ATTR] = digests
+    else:
+        dset.file.create_dataset(companion, data=digests)
+        dset.attrs[CHECKSUM_ATTR] = companion
+    dset.attrs[CHECKSUM_LAYOUT_ATTR] = _json.dumps({'layout': layout, 'shape': list(dset.shape)})
+    return len(hashes)
+
+def read_checksums(dset):
+    """
+    Stored checksums of a dataset (see write_checksums)
+
+    Returns
+    -------
+    tuple, str, or None : (layout, shape, OrderedDict of (key, hex digest or
+    None)) with layout and digests in the format of hash_layout and
+    hash_chunks, and the dataset shape when they were written. None if there
+    are none. 'stale' if the companion dataset cannot be resolved (e.g., it
+    was not copied with the dataset).
+    """
+    if (CHECKSUM_ATTR not in dset.attrs) or (CHECKSUM_LAYOUT_ATTR not in dset.attrs):
+        return None
+    digests = dset.attrs[CHECKSUM_ATTR]
+    if isinstance(digests, (str, bytes, _h5py.Reference)):
+        if isinstance(digests, bytes):
+            digests = digests.decode()
+        try:
+            digests = dset.file[digests]
+        except (KeyError, ValueError):
+            return 'stale'
+        if not isinstance(digests, _h5py.Dataset):
+            return 'stale'
+        digests = digests[()]
+    info = _json.loads(dset.attrs[CHECKSUM_LAYOUT_ATTR])
+    layout = info['layout']
+    shape = tuple(info['shape'])
+
+    if layout[0] == 'raw':
+        keys = [','.join([str(num) for num in offset])
+                for offset in chunk_offsets(shape, tuple(layout[1]))]
+    elif not shape:
+        keys = ['0']
+    else:
+        keys = [str(start) for start in range(0, shape[0], layout[1])]
+    if len(keys) != len(digests):
+        raise ValueError('{} checksums stored for {} chunks of {}'.format(len(digests),
+                                                                         len(keys), dset.name))
+    hashes = _OrderedDict()
+    for key, digest in zip(keys, digests):
+        hashes[key] = bytes(digest).hex() if digest.any() else None
+    return layout, shape, hashes
+
+def verify_chunks(dset, workers=None):
+    """
+    Verify the stored chunks of a dataset against its checksums (see
+    write_checksums). Raw chunks are read and hashed without being
+    decompressed, in a pool of threads.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object
+
+    workers : int
+        Number of hashing threads. If None, number of CPUs.
+
+    Returns
+    -------
+    tuple : (status, keys). status is 'ok', 'corrupt' (keys: the chunks, as
+    in hash_chunks, whose digests differ), 'stale' (the dataset was
+    resized, re-chunked, or re-filtered since the checksums were written, or
+    their companion dataset is missing),
+    or 'unchecked' (no checksums).
+    """
+    stored = read_checksums(dset)
+    if stored is None:
+        return 'unchecked', []
+    if stored == 'stale':
+        return 'stale', []
+    layout, shape, expected = stored
+    if (shape != dset.shape) or ((layout[0] == 'raw') and (hash_layout(dset) != layout)):
+        return 'stale', []
+    hashes = hash_chunks(dset, layout=layout, workers=workers)
+    bad = [key for key in expected if hashes.get(key) != expected[key]]
+    return ('corrupt' if bad else 'ok'), bad
+
+def chunk_may_match(operator, low, high, value):
+    """
+    Can a chunk whose values lie in [low, high] hold a value satisfying a
+    condition (operator one of COMPARISONS). Unknown (NaN) bounds: True.
+    """
+    if (low != low) or (high != high):
+        return True
+    if operator == '==':
+        return low <= value <= high
+    if operator == '!=':
+        return not (low == high == value)
+    if operator in ('<', '<='):
+        return COMPARISONS[operator](low, value)
+    if operator in ('>', '>='):
+        return COMPARISONS[operator](high, value)
+    raise ValueError('Unknown operator {!r}. Available: {}'.format(operator,
+                                                                  tuple(COMPARISONS)))
+
+def stats_chunks(dset, block_nbytes=2**20):
+    """
+    Chunk shape of the statistics of a dataset: its chunks or, if
+    contiguous, blocks of rows of about block_nbytes
+    """
+    if dset.chunks is not None:
+        return dset.chunks
+    if not dset.shape:
+        return ()
+    rows = hash_layout(dset, block_nbytes=block_nbytes, raw=False)[1]
+    return (rows,) + dset.shape[1:]
+
+def iter_chunk_blocks(dset, chunks, offsets, func, workers=None):
+    """
+    Apply func(offset, block) to the values (block) of each chunk at offsets
+    in a pool of threads, yielding the results in order. If chunks are the
+    dataset's own with supported filters, raw chunks are read and decoded in
+    the pool; otherwise, blocks are read by h5py.
+    """
+    if workers is None:
+        workers = _os.cpu_count() or 1
+    raw = (chunks == dset.chunks) and has_supported_filters(dset)
+    filters = get_filters(dset) if raw else None
+    selection = tuple([(0, dim) for dim in dset.shape])
+
+    def task(offset, filter_mask, buf):
+        slc_chunk, _ = chunk_selection(offset, chunks, selection)
+        if buf is None:  # Not allocated
+            block = _np.full(chunks, dset.fillvalue, dtype=dset.dtype)
+        else:
+            block = decode_chunk(buf, filters, chunks, dset.dtype, filter_mask=filter_mask)
+        return func(offset, block[slc_chunk])
+
+    max_inflight = 4 * workers
+    with _ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for offset in offsets:
+            if raw:
+                if dset.id.get_chunk_info_by_coord(offset).byte_offset is None:
+                    pending.append(executor.submit(task, offset, 0, None))
+                else:
+                    pending.append(executor.submit(task, offset,
+                                                   *dset.id.read_direct_chunk(offset)))
+            else:
+                _, slc_data = chunk_selection(offset, chunks, selection)
+                pending.append(executor.submit(func, offset, dset[slc_data]))
+            while len(pending) >= max_inflight:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def _block_stats(offset, block):
+    """ (min, max, count) of the non-NaN values of block """
+    if block.dtype.kind == 'f':
+        block = block[~_np.isnan(block)]
+    if not block.size:
+        return 0, 0, 0
+    return block.min(), block.max(), block.size
+
+def _stats_version(dset):
+    """
+    Version marker of a dataset's values for its statistics: a hash of its
+    shape, dtype, and the stored size and filter mask of each allocated
+    chunk. Rewriting chunks of a compressed dataset (e.g., dset[...] = new,
+    same shape) usually changes their stored sizes; in-place writes to
+    uncompressed or contiguous datasets outside of lazy5 are not detected
+    (see write_chunk_stats).
+    """
+    hasher = _hashlib.blake2b(repr((dset.shape, dset.dtype.str)).encode(), digest_size=16)
+    if dset.chunks is not None:
+        entries = []
+        if hasattr(dset.id, 'chunk_iter'):
+            dset.id.chunk_iter(lambda info: entries.append((info.chunk_offset, info.filter_mask,
+                                                            info.size)))
+        elif hasattr(dset.id, 'get_num_chunks'):
+            for num in range(dset.id.get_num_chunks()):
+                info = dset.id.get_chunk_info(num)
+                entries.append((info.chunk_offset, info.filter_mask, info.size))
+        hasher.update(repr(sorted(entries)).encode())
+    return hasher.hexdigest()
+
+def write_chunk_stats(dset, data=None, workers=None, start=0):
+    """
+    Compute the minimum, maximum, and count (of non-NaN values) of each chunk
+    of a numeric dataset, in a pool of threads, and store them in a
+    companion dataset (STATS_GROUP + dataset name) for candidate_chunks and
+    lazy5.load.load_where. Contiguous datasets are split into blocks of
+    rows (see stats_chunks).
+
+    The statistics are tagged with a version marker of the stored chunks and
+    ignored by read_chunk_stats once it no longer matches. lazy5's writers
+    (lazy5.create, lazy5.table, and the copies of lazy5.alter) delete (or
+    rewrite) the statistics of the datasets they write. The marker does not
+    detect every write by other libraries: an in-place overwrite of an
+    uncompressed or contiguous dataset (e.g., with h5py) leaves the stored
+    chunks' sizes unchanged. The statistics, and the filtered reads based
+    on them, are only valid for datasets written through lazy5 since they
+    were computed; rebuild them (lazy5.alter.index_chunk_stats) after
+    writing with other tools.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object (of a file open for writing)
+
+    data : ndarray
+        Values of the dataset, if in memory (e.g., just written), to avoid
+        reading them back. With start, the values from the first recomputed
+        row (start rounded down to a chunk boundary) on.
+
+    workers : int
+        Number of threads. If None, number of CPUs.
+
+    start : int
+        Recompute only the chunks from the one holding row start on (e.g.,
+        after appending rows), keeping the statistics of earlier chunks
+
+    Returns
+    -------
+    int : Number of chunks
+    """
+    if dset.dtype.kind not in 'biuf':
+        raise TypeError('Statistics need a numeric dataset; {} is {}'.format(dset.name,
+                                                                            dset.dtype))
+    chunks = stats_chunks(dset)
+    offsets = list(chunk_offsets(dset.shape, chunks))
+    companion = STATS_GROUP + dset.name
+    stats_dtype = [('min', dset.dtype), ('max', dset.dtype), ('count', _np.int64)]
+
+    first_row = (start // chunks[0]) * chunks[0] if (start and chunks) else 0
+    kept = _np.zeros(0, dtype=stats_dtype)
+    old = dset.file.get(companion)
+    if first_row:
+        n_keep = len([offset for offset in offsets if offset[0] < first_row])
+        if ((old is not None) and (tuple(_json.loads(old.attrs['chunks'])) == tuple(chunks)) and
+                (old.dtype == _np.dtype(stats_dtype)) and (old.shape[0] >= n_keep)):
+            kept = old[:n_keep]
+            offsets = offsets[n_keep:]
+        else:  # No compatible statistics to keep: recompute all
+            first_row = 0
+            data = None
+
+    if data is None:
+        results = iter_chunk_blocks(dset, chunks, offsets, _block_stats, workers=workers)
+    else:
+        selection = ((first_row, dset.shape[0]),) + tuple([(0, dim) for dim in dset.shape[1:]])
+        results = [_block_stats(offset, data[chunk_selection(offset, chunks, selection)[1]])
+                   for offset in offsets]
+    stats = _np.zeros(len(offsets), dtype=stats_dtype)
+    for num, result in enumerate(results):
+        stats[num] = result
+    stats = _np.concatenate([kept, stats])
+
+    if old is not None:
+        del dset.file[companion]
+    dset.file.flush()  # Chunks held in the chunk cache are stored (see _stats_version)
+    stats_dset = dset.file.create_dataset(companion, data=stats)
+    stats_dset.attrs['chunks'] = _json.dumps(list(chunks))
+    stats_dset.attrs['shape'] = _json.dumps(list(dset.shape))
+    stats_dset.attrs['version'] = _stats_version(dset)
+    return stats.shape[0]
+
+def read_chunk_stats(dset):
+    """
+    Per-chunk statistics of a dataset (see write_chunk_stats)
+
+    Returns
+    -------
+    tuple or None : (chunks, stats). stats is a structured array (min, max,
+    count) in the order of chunk_offsets. None if there are no statistics or
+    they are detectably stale (the dataset was resized or its stored chunks
+    changed since; see write_chunk_stats for the writes that are not
+    detected).
+    """
+    stats_dset = dset.file.get(STATS_GROUP + dset.name)
+    if ((stats_dset is None) or ('version' not in stats_dset.attrs) or
+            (tuple(_json.loads(stats_dset.attrs['shape'])) != dset.shape) or
+            (stats_dset.attrs['version'] != _stats_version(dset))):
+        return None
+    return tuple(_json.loads(stats_dset.attrs['chunks'])), stats_dset[()]
+
+def delete_chunk_stats(fid, name):
+    """
+    Delete the statistics (see write_chunk_stats) of dataset name, or of all
+    datasets under group name, of an open file (for writing)
+    """
+    companion = STATS_GROUP + '/' + name.strip('/')
+    if companion in fid:
+        del fid[companion]
+
+def candidate_chunks(dset, where):
+    """
+    Chunks of a dataset that may hold values satisfying all conditions,
+    according to its statistics (see write_chunk_stats)
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object
+
+    where : list of (operator, value)
+        Conditions (operator one of COMPARISONS)
+
+    Returns
+    -------
+    tuple : (chunks, offsets, n_skipped). The offsets of the candidate
+    chunks of shape chunks, and the number of chunks ruled out. Without
+    (up-to-date) statistics, all chunks of stats_chunks(dset).
+    """
+    stored = read_chunk_stats(dset)
+    if stored is None:
+        chunks = stats_chunks(dset)
+        return chunks, list(chunk_offsets(dset.shape, chunks)), 0
+    chunks, stats = stored
+    size = _np.prod(chunks) if chunks else 1
+    selection = tuple([(0, dim) for dim in dset.shape])
+    offsets = []
+    n_skipped = 0
+    for offset, (low, high, count) in zip(chunk_offsets(dset.shape, chunks), stats):
+        n_values = size
+        if count < size:  # Edge chunk or NaNs: number of values in the chunk
+            n_values = int(_np.prod([sl.stop - sl.start for sl in
+                                     chunk_selection(offset, chunks, selection)[1]]))
+        keep = True
+        for operator, value in where:
+            if (operator == '!=') and (count < n_values):  # NaN != value
+                continue
+            if (count == 0) or not chunk_may_match(operator, low, high, value):
+                keep = False
+                break
+        if keep:
+            offsets.append(offset)
+        else:
+            n_skipped += 1
+    return chunks, offsets, n_skipped
@@ -0,0 +1,358 @@
+"""
+Command-line interface: inspect, search, and edit (attributes of) HDF5 files
+
+Output is a stream of JSON records (one per dataset, group hierarchy, etc.),
+written as they are produced: a JSON array (--format json) or one record per
+line (--format ndjson). Files are processed in parallel with --workers.
+Dataset values are never read unless asked for (ls --data).
+
+Usage
+-----
+    lazy5 ls *.h5 --format ndjson
+    lazy5 tree run.h5
+    lazy5 attrs run*.h5 -d /Spectra/Raw
+    lazy5 set-attr run*.h5 -d /Spectra/Raw -a Operator='"CHC"' -a Gain=2 -w 8
+    lazy5 find run*.h5 -n Raw -a Gain=2
+    lazy5 verify /archive/*.h5 -w 8
+    lazy5 copy run.h5 subset.h5 -p '/Spectra/*'
+    lazy5 repack run.h5 packed.h5 --compression gzip --shuffle
+    lazy5 serve /data/store --port 8765
+"""
+import argparse as _argparse
+import fnmatch as _fnmatch
+import json as _json
+import sys as _sys
+
+__all__ = ['main']
+
+def _json_default(obj):
+    """ JSON-encode numpy arrays/scalars and bytes """
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', 'replace')
+    return str(obj)
+
+def _normalize(val):
+    """ Value as it would appear in JSON output """
+    return _json.loads(_json.dumps(val, default=_json_default))
+
+def _parse_value(val_str):
+    """ Parse a command-line value as JSON; otherwise, it is a string """
+    try:
+        return _json.loads(val_str)
+    except ValueError:
+        return val_str
+
+def _parse_key_values(items):
+    """ ['KEY=VALUE', ...] -> [(KEY, value), ...]; VALUE may be omitted """
+    out = []
+    for item in items:
+        key, sep, val = item.partition('=')
+        out.append((key, _parse_value(val) if sep else None))
+    return out
+
+def _select_dsets(fid, patterns=None):
+    """ Full dataset names of fid matching any of the glob patterns (all if None) """
+    from .inspect import get_hierarchy
+    dsets = [dset for dsets in get_hierarchy(fid, fulldsetpath=True).values()
+             for dset in dsets]
+    dsets = ['/' + dset if not dset.startswith('/') else dset for dset in dsets]
+    if patterns:
+        dsets = [dset for dset in dsets
+                 if any([_fnmatch.fnmatchcase(dset, pattern) for pattern in patterns])]
+    return dsets
+
+# Per-file commands. Each returns a list of records (dicts) for one file.
+
+def _cmd_ls(fp, args):
+    from .utils import FidOrFile
+    fof = FidOrFile(fp)
+    fid = fof.fid
+    records = []
+    try:
+        for dset in _select_dsets(fid, args.dset):
+            dset_id = fid[dset]
+            record = {'file': fp, 'dset': dset, 'shape': list(dset_id.shape),
+                      'dtype': str(dset_id.dtype),
+                      'chunks': None if dset_id.chunks is None else list(dset_id.chunks),
+                      'compression': dset_id.compression,
+                      'storage_size': dset_id.id.get_storage_size()}
+            if args.data:
+                record['data'] = dset_id[()]
+            records.append(record)
+    finally:
+        fof.close_if_file_not_fid()
+    return records
+
+def _cmd_tree(fp, args):
+    from .inspect import get_hierarchy
+    return [{'file': fp,
+             'hierarchy': get_hierarchy(fp, fulldsetpath=args.full, grp_w_dset=args.grp_w_dset)}]
+
+def _cmd_attrs(fp, args):
+    from .utils import FidOrFile
+    from .inspect import get_attrs_dset
+    fof = FidOrFile(fp)
+    try:
+        return [{'file': fp, 'dset': dset,
+                 'attrs': get_attrs_dset(fof.fid, dset, convert_to_str=True,
+                                         convert_sgl_np_to_num=True)}
+                for dset in _select_dsets(fof.fid, args.dset)]
+    finally:
+        fof.close_if_file_not_fid()
+
+def _cmd_set_attr(fp, args):
+    from .utils import FidOrFile
+    from .alter import alter_attr, write_attr_dict
+    attr_dict = dict(_parse_key_values(args.attr))
+    fof = FidOrFile(fp, mode='r+')
+    records = []
+    try:
+        for dset in _select_dsets(fof.fid, args.dset):
+            if args.must_exist or args.check_type:
+                for attr_key, attr_val in attr_dict.items():
+                    alter_attr(dset, attr_key, attr_val, file=fof.fid,
+                               check_same_type=args.check_type, must_exist=args.must_exist)
+            else:
+                write_attr_dict(dset, attr_dict, fid=fof.fid)
+            records.append({'file': fp, 'dset': dset, 'attrs': attr_dict})
+    finally:
+        fof.close_if_file_not_fid()
+    return records
+
+def _cmd_find(fp, args):
+    from .utils import FidOrFile
+    from .inspect import get_attrs_dset
+    from .nonh5utils import filterlist
+    fof = FidOrFile(fp)
+    try:
+        dsets = _select_dsets(fof.fid, args.dset)
+        if args.name:
+            dsets = filterlist(dsets, args.name, keep_filtered_items=True,
+                               exclusive=not args.any)
+        if args.exclude:
+            dsets = filterlist(dsets, args.exclude, keep_filtered_items=False,
+                               exclusive=False)
+        attr_conds = _parse_key_values(args.attr or [])
+        records = []
+        for dset in dsets:
+            if attr_conds:
+                attrs = get_attrs_dset(fof.fid, dset, convert_to_str=True,
+                                       convert_sgl_np_to_num=True)
+                if not all([(key in attrs) and ((val is None) or
+                                                (_normalize(attrs[key]) == val))
+                            for key, val in attr_conds]):
+                    continue
+            records.append({'file': fp, 'dset': dset})
+        return records
+    finally:
+        fof.close_if_file_not_fid()
+
+def _cmd_verify(fp, args):
+    from .utils import FidOrFile
+    from .inspect import verify
+    fof = FidOrFile(fp)
+    try:
+        dsets = None if args.dset is None else _select_dsets(fof.fid, args.dset)
+        records = []
+        for dset, result in verify(fof.fid, dsets=dsets).items():
+            record = {'file': fp, 'dset': dset, 'status': result['status'],
+                      'chunks': result['chunks']}
+            if result['status'] == 'corrupt':
+                record['error'] = 'Corrupt chunks'
+            records.append(record)
+        return records
+    finally:
+        fof.close_if_file_not_fid()
+
+def _error_record(e, **kwargs):
+    """ Record of an exception """
+    kwargs['error'] = '{}: {}'.format(type(e).__name__, e)
+    return kwargs
+
+def _run_per_file(func, fp, args):
+    """ Records of func for one file; errors become records """
+    try:
+        return func(fp, args)
+    except Exception as e:  # pylint: disable=broad-except
+        return [_error_record(e, file=fp)]
+
+def _iter_records(func, args):
+    """ Yield records of func over args.files, in order, as files complete """
+    if (args.workers is None) or (args.workers <= 1) or (len(args.files) <= 1):
+        for fp in args.files:
+            for record in _run_per_file(func, fp, args):
+                yield record
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            n_files = len(args.files)
+            for records in executor.map(_run_per_file, [func] * n_files, args.files,
+                                        [args] * n_files):
+                for record in records:
+                    yield record
+
+# Single-invocation commands
+
+def _cmd_copy(args):
+    from .alter import copy_dsets
+    report = copy_dsets(args.src, args.dst, patterns=args.pattern or '*', dst_grp=args.dst_grp,
+                        dset_overwrite=args.overwrite, dry_run=args.dry_run)
+    for dset, nbytes in report.items():
+        yield {'src': args.src, 'dst': args.dst, 'dset': dset, 'storage_size': nbytes,
+               'dry_run': args.dry_run}
+
+def _cmd_repack(args):
+    from .alter import repack
+    if args.chunks in (None, 'keep'):
+        chunks = None
+    elif args.chunks in ('auto', 'none'):
+        chunks = {'auto': True, 'none': False}[args.chunks]
+    else:
+        chunks = tuple([int(dim) for dim in args.chunks.split(',')])
+    compression = False if args.compression == 'none' else args.compression
+    report = repack(args.src, args.dst, chunks=chunks, compression=compression,
+                    compression_opts=args.compression_opts,
+                    shuffle=True if args.shuffle else None, dtype=args.dtype,
+                    workers=args.workers)
+    report.update({'src': args.src, 'dst': args.dst})
+    yield report
+
+def _cmd_serve(args):
+    from .serve import HdfServer
+    server = HdfServer(args.root, host=args.host, port=args.port,
+                       unix_socket=args.unix_socket)
+    try:
+        yield {'url': server.url, 'root': args.root}
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+class _Writer:
+    """ Stream records to stream as a JSON array or NDJSON """
+    def __init__(self, fmt='json', stream=None):
+        self.fmt = fmt
+        self.stream = _sys.stdout if stream is None else stream
+        self.n_records = 0
+
+    def write(self, record):
+        text = _json.dumps(record, default=_json_default)
+        if self.fmt == 'ndjson':
+            self.stream.write(text + '\n')
+        else:
+            self.stream.write(('[\n' if self.n_records == 0 else ',\n') + text)
+        self.stream.flush()
+        self.n_records += 1
+
+    def close(self):
+        if self.fmt == 'json':
+            self.stream.write('[]\n' if self.n_records == 0 else '\n]\n')
+        self.stream.flush()
+
+def build_parser():
+    """ Argument parser of the lazy5 command """
+    parser = _argparse.ArgumentParser(prog='lazy5', description=__doc__,
+                                      formatter_class=_argparse.RawDescriptionHelpFormatter)
+    common = _argparse.ArgumentParser(add_help=False)
+    common.add_argument('--format', '-f', choices=['json', 'ndjson'], default='json',
+                        help='Output format (default: json)')
+    common.add_argument('--workers', '-w', type=int, default=None,
+                        help='Number of worker processes')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_files_parser(name, func, help_str):
+        sub = subparsers.add_parser(name, parents=[common], help=help_str)
+        sub.add_argument('files', nargs='+', help='HDF5 file(s)')
+        sub.add_argument('--dset', '-d', action='append',
+                         help='Dataset(s) (full name or glob pattern). Default: all')
+        sub.set_defaults(per_file=func)
+        return sub
+
+    sub = add_files_parser('ls', _cmd_ls, 'List datasets with shape, dtype, and storage')
+    sub.add_argument('--data', action='store_true', help='Include dataset values')
+
+    sub = add_files_parser('tree', _cmd_tree, 'Group hierarchy of each file')
+    sub.add_argument('--full', action='store_true', help='Full dataset names')
+    sub.add_argument('--grp-w-dset', action='store_true',
+                     help='Only groups that contain datasets')
+
+    add_files_parser('attrs', _cmd_attrs, 'Dataset attributes')
+
+    sub = add_files_parser('set-attr', _cmd_set_attr, 'Set attributes of datasets')
+    sub.add_argument('--attr', '-a', action='append', required=True, metavar='KEY=VALUE',
+                     help='Attribute to write. VALUE is parsed as JSON, else a string')
+    sub.add_argument('--must-exist', action='store_true',
+                     help='Attributes must already exist')
+    sub.add_argument('--check-type', action='store_true',
+                     help='New values must be type-compatible with existing ones')
+
+    sub = add_files_parser('find', _cmd_find, 'Find datasets by name and attributes')
+    sub.add_argument('--name', '-n', action='append',
+                     help='Substring(s) the dataset name must contain')
+    sub.add_argument('--any', action='store_true', help='Match any (not all) --name')
+    sub.add_argument('--exclude', '-x', action='append',
+                     help='Substring(s) the dataset name must not contain')
+    sub.add_argument('--attr', '-a', action='append', metavar='KEY[=VALUE]',
+                     help='Attribute that must exist (and equal VALUE, parsed as JSON)')
+
+    add_files_parser('verify', _cmd_verify,
+                     'Verify stored chunks against their checksums (exit code 1 if corrupt)')
+
+    sub = subparsers.add_parser('copy', parents=[common], help='Copy datasets between files')
+    sub.add_argument('src')
+    sub.add_argument('dst')
+    sub.add_argument('--pattern', '-p', action='append',
+                     help='Glob pattern(s) of datasets. Default: all')
+    sub.add_argument('--dst-grp', default='/', help='Destination group')
+    sub.add_argument('--overwrite', action='store_true', help='Overwrite existing datasets')
+    sub.add_argument('--dry-run', action='store_true', help='Only report what would be copied')
+    sub.set_defaults(single=_cmd_copy)
+
+    sub = subparsers.add_parser('repack', parents=[common], help='Repack a file')
+    sub.add_argument('src')
+    sub.add_argument('dst')
+    sub.add_argument('--chunks', help="'keep' (default), 'auto', 'none', or e.g. 64,256,256")
+    sub.add_argument('--compression', help="E.g., 'gzip', or 'none' to decompress")
+    sub.add_argument('--compression-opts', type=int, help='E.g., gzip level')
+    sub.add_argument('--shuffle', action='store_true', help='Apply the shuffle filter')
+    sub.add_argument('--dtype', help='Convert datasets to dtype')
+    sub.set_defaults(single=_cmd_repack)
+
+    sub = subparsers.add_parser('serve', parents=[common],
+                                help='Serve the files of a directory over HTTP (read-only)')
+    sub.add_argument('root', help='Served directory')
+    sub.add_argument('--host', default='127.0.0.1', help='Interface (default: localhost)')
+    sub.add_argument('--port', type=int, default=8765, help='TCP port')
+    sub.add_argument('--unix-socket', help='Listen on a Unix socket instead')
+    sub.set_defaults(single=_cmd_serve)
+
+    return parser
+
+def main(argv=None):
+    """ Entry point of the lazy5 command. Returns the exit code """
+    args = build_parser().parse_args(argv)
+
+    if getattr(args, 'per_file', None) is not None:
+        records = _iter_records(args.per_file, args)
+    else:
+        records = args.single(args)
+
+    writer = _Writer(args.format)
+    n_errors = 0
+    try:
+        for record in records:
+            n_errors += 'error' in record
+            writer.write(record)
+    except Exception as e:  # pylint: disable=broad-except
+        n_errors += 1
+        writer.write(_error_record(e, command=args.command))
+    finally:
+        writer.close()
+    return 1 if n_errors else 0
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -1,5 +1,122 @@
-""" Default configuration class """
+"""
+Default configuration class, and configuration scoped to a context
+
+Settings are read when a macro runs (never at import), from the
+configuration of the current context (see use_config) or, if none, the
+process-wide default (lazy5.utils.FidOrFile.config). Contexts are per thread
+and per asyncio task, so different threads or requests of a service can use
+different settings without affecting each other or h5py's global state.
+
+Examples
+--------
+>>> with use_config(compression='gzip', workers=4, rdcc_nbytes=2**26):
+...     save('out.h5', 'data', data)  # gzip, 4 workers, 64 MiB chunk cache
+"""
+import copy as _copy
+import contextvars as _contextvars
+from contextlib import contextmanager as _contextmanager
+
+__all__ = ['DefaultConfig', 'get_config', 'use_config', 'setting']
 
 class DefaultConfig:
     def __init__(self):
-        self.complex_names = ('Re', 'Im')
\ No newline at end of file
+        # Field names of the compound type of complex data (real, imaginary),
+        # used by lazy5 when writing and reading (h5py's global setting is
+        # not modified)
+        self.complex_names = ('Re', 'Im')
+
+        # Storage of complex data written by lazy5.create.save: 'compound'
+        # (fields complex_names), 'interleaved' (float with a trailing axis
+        # of 2: real, imag), or 'split' (a group of real and imag datasets)
+        self.complex_layout = 'compound'
+
+        # Filters of datasets written by lazy5.create.save when a call does
+        # not set them
+        self.compression = None  # E.g., 'gzip'
+        self.compression_opts = None  # E.g., gzip level
+        self.shuffle = False
+
+        # Workers of parallel macros (e.g., load, save, verify, diff) when a
+        # call passes workers=None. None: serial
+        self.workers = None
+
+        # Decoded chunks read by lazy5.load.load are kept in a process-level
+        # cache that outlives open files: True (lazy5.cache.CHUNK_CACHE), a
+        # lazy5.cache.ChunkCache, or False
+        self.chunk_cache = False
+
+        # File-access settings applied by lazy5.utils.FidOrFile when opening a
+        # file. None: h5py/HDF5 default.
+
+        # Raw data chunk cache (per open dataset)
+        self.rdcc_nbytes = None  # Cache size (bytes)
+        self.rdcc_nslots = None  # Hash table slots (prime, ~100x chunks in cache)
+        self.rdcc_w0 = None  # Preemption policy (0-1). 1: fully-read chunks evicted first
+
+        # Metadata cache (per open file)
+        self.mdc_initial_size = None  # Initial size (bytes)
+        self.mdc_max_size = None  # Maximum size (bytes)
+
+        # Page buffer (bytes). Only for files created with fs_strategy='page'
+        self.page_buf_size = None
+
+        # File-space management. Only applied when a file is created.
+        self.fs_strategy = None  # 'fsm', 'page', 'aggregate', or 'none'
+        self.fs_page_size = None  # Page size (bytes) for fs_strategy='page'
+
+        # Library version bounds. E.g., 'earliest', 'latest', ('v110', 'latest')
+        self.libver = None
+
+# Process-wide default (also lazy5.utils.FidOrFile.config)
+DEFAULT_CONFIG = DefaultConfig()
+
+_CONTEXT_CONFIG = _contextvars.ContextVar('lazy5_config', default=None)
+
+def get_config(default=None):
+    """
+    Configuration of the current context (see use_config). If none, default
+    or, if None, the process-wide DEFAULT_CONFIG.
+    """
+    config = _CONTEXT_CONFIG.get()
+    if config is not None:
+        return config
+    return DEFAULT_CONFIG if default is None else default
+
+def setting(name, value=None):
+    """ value if not None, else setting name of the current configuration """
+    return getattr(get_config(), name) if value is None else value
+
+@_contextmanager
+def use_config(config=None, **settings):
+    """
+    Apply a configuration within a with-block, in the current context only
+    (thread or asyncio task). Nested blocks inherit and override the
+    enclosing settings.
+
+    New threads start with no context configuration: enter use_config in
+    the thread, or run it with contextvars.copy_context().run.
+
+    Parameters
+    ----------
+    config : DefaultConfig
+        Base configuration. If None, a copy of the current one.
+
+    **settings
+        Settings to override (attributes of DefaultConfig), e.g.,
+        complex_names=('real', 'imag'), workers=4
+
+    Yields
+    ------
+    DefaultConfig : The configuration in effect
+    """
+    new_config = _copy.copy(get_config() if config is None else config)
+    unknown = [k for k in settings if not hasattr(new_config, k)]
+    if unknown:
+        raise TypeError('Unknown setting(s): {}'.format(unknown))
+    for k, v in settings.items():
+        setattr(new_config, k, v)
+    token = _CONTEXT_CONFIG.set(new_config)
+    try:
+        yield new_config
+    finally:
+        _CONTEXT_CONFIG.reset(token)
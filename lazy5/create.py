@@ -1,16 +1,127 @@
 """ Macros for creation of HDF5 files and/or datasets"""
+import os as _os
+import json as _json
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import (ThreadPoolExecutor as _ThreadPoolExecutor,
+                                ProcessPoolExecutor as _ProcessPoolExecutor)
+
 import h5py as _h5py
+import numpy as _np
 
-from .config import DefaultConfig
-from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath)
-from .inspect import (valid_dsets as _valid_dsets)
+from .config import setting as _setting
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    complex_to_compound as _complex_to_compound)
+from .inspect import (valid_dsets as _valid_dsets, get_datasets as _get_datasets)
 from .alter import (write_attr_dict as _write_attr_dict)
+from .chunks import (get_filters as _get_filters,
+                     has_supported_filters as _has_supported_filters,
+                     chunk_offsets as _chunk_offsets,
+                     chunk_selection as _chunk_selection,
+                     encode_chunk as _encode_chunk,
+                     write_checksums as _write_checksums,
+                     hash_array as _hash_array,
+                     write_chunk_stats as _write_chunk_stats,
+                     delete_chunk_stats as _delete_chunk_stats)
+
+__all__ = ['save', 'save_dedup', 'write_chunks_parallel', 'create_vds', 'build_pyramid']
+
+# Attribute of complex data stored as interleaved floats or split real and
+# imaginary datasets by save (the layout)
+COMPLEX_ATTR = 'lazy5_complex'
+COMPLEX_LAYOUTS = ('compound', 'interleaved', 'split')
+
+# Attribute of a virtual dataset built by create_vds holding its sources (JSON)
+VDS_ATTR = 'lazy5_vds'
+
+# Attribute of a deduplicated array (group) written by save_dedup (JSON)
+DEDUP_ATTR = 'lazy5_dedup'
+
+# Attributes of the base dataset and of the levels of a pyramid written by
+# build_pyramid (JSON)
+PYRAMID_ATTR = 'lazy5_pyramid'
+PYRAMID_LEVEL_ATTR = 'lazy5_pyramid_level'
+
+@_instrument.timed('create.write_chunks_parallel')
+def write_chunks_parallel(dset, data, workers=None, use_processes=False):
+    """
+    Write data to a chunked dataset by applying the filter pipeline (e.g.,
+    shuffle and gzip) in a pool of workers and committing raw chunks, in
+    order, with write_direct_chunk. The stored chunks are identical in format
+    to those written by libhdf5.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object. Must be chunked with only supported filters (see
+        lazy5.chunks.has_supported_filters) and of the same shape as data.
+
+    data : ndarray
+        Data to write
+
+    workers : int
+        Number of compression workers. If None, the workers setting of the
+        current configuration (see lazy5.config.use_config) or, if None,
+        number of CPUs.
+
+    use_processes : bool
+        Compress in worker processes rather than threads. zlib releases the
+        GIL, so threads are usually sufficient.
+
+    Returns
+    -------
+    int : Number of chunks written
+    """
+    if not _has_supported_filters(dset):
+        raise ValueError('Dataset {} cannot be written via raw chunks'.format(dset.name))
+    data = _np.asarray(data, dtype=dset.dtype)
+    if data.shape != dset.shape:
+        raise ValueError('Data shape {} does not match dataset shape {}'.format(data.shape,
+                                                                               dset.shape))
+    workers = _setting('workers', workers)
+    if workers is None:
+        workers = _os.cpu_count() or 1
+
+    filters = _get_filters(dset)
+    chunks = dset.chunks
+    selection = tuple([(0, dim) for dim in dset.shape])
+    fillvalue = dset.fillvalue
+    _delete_chunk_stats(dset.file, dset.name)  # Rewritten: stale
 
-_h5py.get_config().complex_names = DefaultConfig().complex_names
+    def chunk_data(offset):
+        """ Full-sized chunk (edge chunks padded with the fill value) """
+        slc_chunk, slc_data = _chunk_selection(offset, chunks, selection)
+        block = data[slc_data]
+        if block.shape == chunks:
+            return block
+        padded = _np.empty(chunks, dtype=dset.dtype)
+        padded.fill(fillvalue)
+        padded[slc_chunk] = block
+        return padded
 
+    executor_class = _ProcessPoolExecutor if use_processes else _ThreadPoolExecutor
+    n_chunks = 0
+    max_inflight = 4 * workers
+    with executor_class(max_workers=workers) as executor:
+        pending = []
+        for offset in _chunk_offsets(dset.shape, chunks):
+            pending.append((offset, executor.submit(_encode_chunk, chunk_data(offset), filters)))
+            # Commit in order; bound the number of chunks held in memory
+            while len(pending) >= max_inflight:
+                done_offset, future = pending.pop(0)
+                dset.id.write_direct_chunk(done_offset, future.result())
+                n_chunks += 1
+        for done_offset, future in pending:
+            dset.id.write_direct_chunk(done_offset, future.result())
+            n_chunks += 1
+    return n_chunks
+
+@_instrument.timed('create.save')
 def save(file, dset, data, pth=None, attr_dict=None, mode='a',
          dset_overwrite=False, sort_attrs=False,
-         chunks=True, verbose=False):
+         chunks=True, verbose=False, compression=None, compression_opts=None,
+         shuffle=None, workers=None, fletcher32=False, checksums=False, maxshape=None,
+         chunk_stats=False, complex_layout=None):
     """
     Save an HDF5 file
 
@@ -47,12 +158,67 @@ def save(file, dset, data, pth=None, attr_dict=None, mode='a',
     verbose : bool
         Verbose output
 
+    compression : str
+        Compression filter (e.g., 'gzip'). If None, the compression setting
+        of the current configuration (see lazy5.config.use_config); by
+        default, no compression. False: no compression, whatever the
+        configuration.
+
+    compression_opts : int
+        Compression settings (e.g., gzip level 0-9). If None, the
+        configured compression_opts.
+
+    shuffle : bool
+        Apply the byte-shuffle filter. If None, the configured shuffle
+        (default False). False: no shuffle, whatever the configuration.
+
+    workers : int
+        If > 1, compress chunks in parallel (see write_chunks_parallel) when
+        the dataset's filters are supported. Otherwise, libhdf5 applies the
+        filters. If None, the configured workers.
+
+    fletcher32 : bool
+        Apply the Fletcher32 checksum filter (checked by libhdf5 on every
+        read)
+
+    checksums : bool
+        Store per-chunk hashes of the stored chunks with the dataset (see
+        lazy5.chunks.write_checksums), for lazy5.inspect.verify and
+        lazy5.load.load(..., verify=True)
+
+    maxshape : tuple
+        Maximum shape (None for unlimited axes), to allow resizing (e.g.,
+        appending). Requires chunking.
+
+    chunk_stats : bool
+        Store the minimum, maximum, and count of each chunk of a numeric
+        dataset (see lazy5.chunks.write_chunk_stats), for filtered reads
+        with lazy5.load.load_where
+
+    complex_layout : str
+        Storage of complex data: 'compound' (fields named complex_names of
+        the current configuration), 'interleaved' (float dataset with a
+        trailing axis of 2), or 'split' (group of 'real' and 'imag'
+        datasets). If None, the configured complex_layout. lazy5.load.load
+        reads all three back as complex.
+
     Returns
     -------
 
     bool : Saved with no errors
 
     """
+    complex_layout = _setting('complex_layout', complex_layout)
+    compression = _setting('compression', compression)
+    compression_opts = _setting('compression_opts', compression_opts)
+    shuffle = _setting('shuffle', shuffle)
+    workers = _setting('workers', workers)
+    if complex_layout not in COMPLEX_LAYOUTS:
+        raise ValueError('complex_layout must be one of {}'.format(COMPLEX_LAYOUTS))
+    if chunk_stats and (_np.asarray(data).dtype.kind not in 'biuf'):
+        # Checked before anything is written
+        raise TypeError('Statistics need numeric data; {} is {}'.format(dset,
+                                                                        _np.asarray(data).dtype))
 
     if isinstance(file, str):
         fp = _fullpath(file, pth)
@@ -70,12 +236,590 @@ def save(file, dset, data, pth=None, attr_dict=None, mode='a',
             err_str2 = 'Param dset_overwrite=False. Will not overwrite'
             raise IOError(err_str1 + err_str2)
 
-    dset_id = fid.require_dataset(name=dset, data=data, shape=data.shape, 
-                                  dtype=data.dtype, chunks=chunks)
+    complex_layout = complex_layout if _np.iscomplexobj(data) else 'compound'
+    if complex_layout != 'compound':
+        if dset in fid:
+            if not dset_overwrite:
+                err_str1 = 'Dataset {} exists. '.format(dset)
+                err_str2 = 'Param dset_overwrite=False. Will not overwrite'
+                raise IOError(err_str1 + err_str2)
+            del fid[dset]
+            _delete_chunk_stats(fid, dset)
+
+    if complex_layout == 'split':
+        data = _np.asarray(data)
+        grp = fid.create_group(dset)
+        for part, values in [('real', data.real), ('imag', data.imag)]:
+            save(fid, grp.name + '/' + part, _np.ascontiguousarray(values), chunks=chunks,
+                 compression=compression, compression_opts=compression_opts,
+                 shuffle=shuffle, workers=workers, fletcher32=fletcher32,
+                 checksums=checksums, maxshape=maxshape)
+        grp.attrs[COMPLEX_ATTR] = complex_layout
+        if attr_dict:
+            _write_attr_dict(dset, attr_dict, fid=fid, sort_attrs=sort_attrs)
+        fof.close_if_file_not_fid()
+        return True
+
+    if complex_layout == 'interleaved':
+        # Zero-copy float view: (..., 2) of (real, imag)
+        data = _np.ascontiguousarray(data)
+        data = data.view(data.real.dtype).reshape(data.shape + (2,))
+        if isinstance(chunks, (tuple, list)):
+            chunks = tuple(chunks) + (2,)
+        if maxshape is not None:
+            maxshape = tuple(maxshape) + (2,)
+    else:  # Compound view, with the configured field names
+        data = _complex_to_compound(data)
+
+    filter_kwargs = {}
+    if (compression is not None) and (compression is not False):
+        filter_kwargs['compression'] = compression
+        filter_kwargs['compression_opts'] = compression_opts
+    if shuffle:
+        filter_kwargs['shuffle'] = shuffle
+    if fletcher32:
+        filter_kwargs['fletcher32'] = fletcher32
+    if maxshape is not None:
+        filter_kwargs['maxshape'] = maxshape
+
+    if (workers is not None) and (workers > 1) and filter_kwargs and (data.size > 0):
+        dset_id = fid.require_dataset(name=dset, shape=data.shape, dtype=data.dtype,
+                                      chunks=chunks, **filter_kwargs)
+        if _has_supported_filters(dset_id):
+            write_chunks_parallel(dset_id, data, workers=workers)
+        else:
+            dset_id[...] = data
+    else:
+        dset_id = fid.require_dataset(name=dset, data=data, shape=data.shape,
+                                      dtype=data.dtype, chunks=chunks, **filter_kwargs)
+
+    if complex_layout == 'interleaved':
+        dset_id.attrs[COMPLEX_ATTR] = complex_layout
 
     if attr_dict:
         _write_attr_dict(dset_id, attr_dict, sort_attrs=sort_attrs)
 
+    if checksums:
+        _write_checksums(dset_id, workers=workers)
+
+    if chunk_stats:
+        _write_chunk_stats(dset_id, data=data, workers=workers)
+    else:  # Statistics of a previous dataset (or values) are stale
+        _delete_chunk_stats(fid, dset_id.name)
+
     fof.close_if_file_not_fid()
 
+    _instrument.record('bytes_written', 'create.save', data.nbytes)
     return True
+
+def _dedup_chunk(data, offset, chunks):
+    """ Full-sized chunk of data at offset (edge chunks zero-padded) """
+    selection = tuple([(0, dim) for dim in data.shape])
+    slc_chunk, slc_data = _chunk_selection(offset, chunks, selection)
+    block = data[slc_data]
+    if block.shape == chunks:
+        return block
+    padded = _np.zeros(chunks, dtype=data.dtype)
+    padded[slc_chunk] = block
+    return padded
+
+@_instrument.timed('create.save_dedup')
+def save_dedup(file, dset, data, pth=None, chunks=None, attr_dict=None, mode='a',
+               dset_overwrite=False, sort_attrs=False, compression=None,
+               compression_opts=None, shuffle=None, workers=None):
+    """
+    Save an array storing identical chunks only once (e.g., repeated dark
+    frames or zero-padded blocks).
+
+    Each chunk is hashed (in a pool of threads) before it is committed. The
+    array is stored as a group (dset) holding 'store', the unique chunks
+    (one HDF5 chunk each, filtered as requested), and 'map', the index into
+    'store' of every chunk of the chunk grid. lazy5.load.load reads it back
+    like a dataset (see lazy5.load.read_dedup).
+
+    Unique chunks are appended to 'store' as they are found, so memory use
+    is bounded by the chunks in flight (4 x workers), not by the number of
+    unique chunks. If writing fails, the partial group is removed.
+
+    Parameters
+    ----------
+    file : str or h5py.File object (fid)
+        Filename
+
+    dset : str
+        Dataset (group) name (including groups if any)
+
+    data : ndarray
+        Data to write (at least 1D)
+
+    pth : str
+        Path to file. Otherwise, will use present working directory (PWD)
+
+    chunks : tuple
+        Chunk shape, the unit of deduplication. If None, one row (e.g., one
+        frame of a time series): (1,) + data.shape[1:].
+
+    attr_dict : dict
+        Attribute dictionary (written to the group)
+
+    mode : str
+        h5py file mode.
+
+    dset_overwrite : bool
+        If dset already exists, overwrite or raise error?
+
+    sort_attrs : bool
+        Sort the attribute dictionary (alphabetically) prior to saving
+
+    compression, compression_opts, shuffle :
+        Filters of the unique chunks (see save). If None, the settings of
+        the current configuration (see lazy5.config.use_config). False:
+        none, whatever the configuration.
+
+    workers : int
+        Number of hashing (and, with supported filters, compression)
+        threads. If None, the configured workers or, if None, number of
+        CPUs.
+
+    Returns
+    -------
+    OrderedDict : n_chunks (in the chunk grid) and n_unique (stored)
+    """
+    data = _complex_to_compound(_np.asarray(data))
+    if data.ndim == 0:
+        raise ValueError('Cannot deduplicate a scalar')
+    if chunks is None:
+        chunks = (1,) + data.shape[1:]
+    chunks = tuple([max(int(chk), 1) for chk in chunks])
+    if len(chunks) != data.ndim:
+        raise ValueError('Chunks {} do not match data shape {}'.format(chunks, data.shape))
+    compression = _setting('compression', compression)
+    compression_opts = _setting('compression_opts', compression_opts)
+    shuffle = _setting('shuffle', shuffle)
+    workers = _setting('workers', workers)
+    if workers is None:
+        workers = _os.cpu_count() or 1
+
+    if isinstance(file, str):
+        fof = _FidOrFile(_fullpath(file, pth), mode=mode)
+    elif isinstance(file, _h5py.File):
+        fof = _FidOrFile(file, mode=mode)
+    else:
+        raise TypeError('file needs to be a str or h5py.File object.')
+    fid = fof.fid
+    grp = None
+    try:
+        if dset in fid:
+            if not dset_overwrite:
+                err_str1 = 'Dataset {} exists. '.format(dset)
+                err_str2 = 'Param dset_overwrite=False. Will not overwrite'
+                raise IOError(err_str1 + err_str2)
+            del fid[dset]
+            _delete_chunk_stats(fid, dset)
+
+        filter_kwargs = {}
+        if (compression is not None) and (compression is not False):
+            filter_kwargs['compression'] = compression
+            filter_kwargs['compression_opts'] = compression_opts
+        if shuffle:
+            filter_kwargs['shuffle'] = shuffle
+
+        # Unique chunks are appended to a resizable store as they are found,
+        # so only the chunks in flight are held in memory
+        grp = fid.create_group(dset)
+        store = grp.create_dataset('store', shape=(0,) + chunks, maxshape=(None,) + chunks,
+                                   dtype=data.dtype, chunks=(1,) + chunks, **filter_kwargs)
+        raw = (workers > 1) and bool(filter_kwargs) and _has_supported_filters(store)
+        filters = _get_filters(store) if raw else None
+
+        # Hash every chunk; the first occurrence of each digest is stored
+        grid_shape = tuple([-(-dim // chk) for dim, chk in zip(data.shape, chunks)])
+        chunk_map = _np.zeros(grid_shape, dtype=_np.int64)
+        digests = {}
+        max_inflight = 4 * workers
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            hashing = []
+            writing = []
+
+            def commit(index, future):
+                """ Write an encoded unique chunk """
+                store.id.write_direct_chunk((index,) + (0,) * len(chunks), future.result())
+
+            def append(block):
+                """ Append a unique chunk to the store (grown in batches) """
+                index = len(digests) - 1
+                if index >= store.shape[0]:
+                    store.resize(max(2 * store.shape[0], 16), axis=0)
+                if raw:
+                    writing.append((index, executor.submit(_encode_chunk, block[None],
+                                                           filters)))
+                    while len(writing) >= max_inflight:
+                        commit(*writing.pop(0))
+                else:
+                    store[index] = block
+
+            def assign(offset, block, future):
+                digest = future.result()
+                if digest not in digests:
+                    digests[digest] = len(digests)
+                    append(block)
+                chunk_map[tuple([off // chk for off, chk in zip(offset, chunks)])] = digests[digest]
+
+            for offset in _chunk_offsets(data.shape, chunks):
+                block = _dedup_chunk(data, offset, chunks)
+                hashing.append((offset, block, executor.submit(_hash_array, block)))
+                while len(hashing) >= max_inflight:
+                    assign(*hashing.pop(0))
+            for args in hashing:
+                assign(*args)
+            for args in writing:
+                commit(*args)
+        store.resize(len(digests), axis=0)
+
+        grp.create_dataset('map', data=chunk_map)
+        grp.attrs[DEDUP_ATTR] = _json.dumps({'shape': list(data.shape), 'chunks': list(chunks)})
+        if attr_dict:
+            _write_attr_dict(dset, attr_dict, fid=fid, sort_attrs=sort_attrs)
+    except Exception:
+        if grp is not None:  # Do not leave a partial array
+            del fid[grp.name]
+        raise
+    finally:
+        fof.close_if_file_not_fid()
+
+    nbytes = len(digests) * int(_np.prod(chunks)) * data.dtype.itemsize + chunk_map.nbytes
+    _instrument.record('bytes_written', 'create.save_dedup', nbytes)
+    return _OrderedDict([['n_chunks', chunk_map.size], ['n_unique', len(digests)]])
+
+def _vds_source_info(fp, src_dset=None):
+    """
+    Dataset name, shape, and dtype of the source dataset of file fp. If
+    src_dset is None, the file must contain exactly one dataset.
+    """
+    fof = _FidOrFile(fp)
+    fid = fof.fid
+    try:
+        if src_dset is None:
+            dset_list = _get_datasets(fid, fulldsetpath=True)
+            if len(dset_list) != 1:
+                err_str = '{} has {} datasets; src_dset must be given'
+                raise ValueError(err_str.format(fp, len(dset_list)))
+            src_dset = dset_list[0]
+        elif not _valid_dsets(fid, src_dset):
+            raise KeyError('Dataset {} not found in {}'.format(src_dset, fp))
+        dset_id = fid[src_dset]
+        return src_dset, dset_id.shape, dset_id.dtype.str
+    finally:
+        fof.close_if_file_not_fid()
+
+@_instrument.timed('create.create_vds')
+def create_vds(file, dset, sources, src_dset=None, pth=None, axis=0, mode='a',
+               dset_overwrite=False, relative=True, update=True, verbose=False):
+    """
+    Create a virtual dataset (VDS) that concatenates the datasets of many
+    files along an axis. No data is copied: the VDS maps onto the source
+    files, which must remain accessible.
+
+    The sources (and their shapes and modification times) are stored in the
+    VDS attribute lazy5.create.VDS_ATTR. Calling again with more sources
+    rebuilds the VDS, but only opens (validates) new or modified files.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for the (master) HDF5 file holding the VDS
+
+    dset : str
+        VDS name (including groups if any)
+
+    sources : list of str
+        Source filenames, in order of concatenation
+
+    src_dset : str
+        Source dataset name in each file. If None, each file must contain
+        exactly one dataset.
+
+    pth : str
+        Path of file (and of relative source filenames)
+
+    axis : int
+        Axis of concatenation. All other axes must be of equal size.
+
+    mode : str
+        h5py file mode of file
+
+    dset_overwrite : bool
+        If dset exists (and is not a VDS built by create_vds), overwrite or
+        raise error?
+
+    relative : bool
+        Map sources by their path relative to the master file's directory,
+        so that the files may be moved together.
+
+    update : bool
+        Reuse the shapes of unmodified sources stored by a previous call
+
+    verbose : bool
+        Verbose output
+
+    Returns
+    -------
+    OrderedDict : shape (of the VDS), n_sources, n_scanned (files opened)
+    """
+    if isinstance(file, str):
+        fp = _fullpath(file, pth)
+        fof = _FidOrFile(fp, mode=mode)
+    elif isinstance(file, _h5py.File):
+        fof = _FidOrFile(file, mode=mode)
+    else:
+        raise TypeError('file needs to be a str or h5py.File object.')
+    fid = fof.fid
+    master_dir = _os.path.dirname(_os.path.abspath(fid.filename))
+
+    try:
+        # Previously stored sources: (filename, src_dset) -> entry
+        cached = {}
+        if dset in fid:
+            stored = fid[dset].attrs.get(VDS_ATTR)
+            if stored is None:
+                if not dset_overwrite:
+                    err_str1 = 'Dataset {} exists. '.format(dset)
+                    err_str2 = 'Param dset_overwrite=False. Will not overwrite'
+                    raise IOError(err_str1 + err_str2)
+            else:
+                stored = _json.loads(stored)
+                if update and (stored['axis'] == axis):
+                    cached = dict([[(entry['file'], entry['src_dset']), entry]
+                                   for entry in stored['sources']])
+
+        entries = []
+        n_scanned = 0
+        for source in sources:
+            src_fp = _fullpath(source, pth)
+            mtime = _os.path.getmtime(src_fp)
+            entry = cached.get((source, src_dset))
+            if (entry is None) or (entry['mtime'] != mtime):
+                if verbose:
+                    print('Scanning {}'.format(src_fp))
+                name, shape, dtype = _vds_source_info(src_fp, src_dset)
+                entry = {'file': source, 'src_dset': src_dset, 'dset': name,
+                         'shape': list(shape), 'dtype': dtype, 'mtime': mtime}
+                n_scanned += 1
+            entries.append(entry)
+
+        if not entries:
+            raise ValueError('No sources given')
+
+        # Validate: same dtype and shape (except along axis)
+        first = entries[0]
+        if not (0 <= axis < len(first['shape'])):
+            raise ValueError('axis {} out of range for shape {}'.format(axis, first['shape']))
+        for entry in entries[1:]:
+            if _np.dtype(entry['dtype']) != _np.dtype(first['dtype']):
+                raise TypeError('{} has dtype {}, not {}'.format(entry['file'], entry['dtype'],
+                                                                first['dtype']))
+            other_axes = [dim for num, dim in enumerate(entry['shape']) if num != axis]
+            if ((len(entry['shape']) != len(first['shape'])) or
+                    (other_axes != [dim for num, dim in enumerate(first['shape'])
+                                    if num != axis])):
+                err_str = '{} has shape {}, incompatible with {} along axis {}'
+                raise ValueError(err_str.format(entry['file'], entry['shape'], first['shape'],
+                                                axis))
+
+        shape = list(first['shape'])
+        shape[axis] = sum([entry['shape'][axis] for entry in entries])
+        layout = _h5py.VirtualLayout(shape=tuple(shape), dtype=_np.dtype(first['dtype']))
+        start = 0
+        for entry in entries:
+            src_fp = _os.path.abspath(_fullpath(entry['file'], pth))
+            if relative:
+                src_fp = _os.path.relpath(src_fp, master_dir)
+            vsource = _h5py.VirtualSource(src_fp, entry['dset'], shape=tuple(entry['shape']))
+            stop = start + entry['shape'][axis]
+            slc = [slice(None)] * len(shape)
+            slc[axis] = slice(start, stop)
+            layout[tuple(slc)] = vsource
+            start = stop
+
+        if dset in fid:
+            del fid[dset]
+            _delete_chunk_stats(fid, dset)
+        dset_id = fid.create_virtual_dataset(dset, layout)
+        dset_id.attrs[VDS_ATTR] = _json.dumps({'axis': axis, 'sources': entries})
+    finally:
+        fof.close_if_file_not_fid()
+
+    return _OrderedDict([['shape', tuple(shape)],
+                         ['n_sources', len(entries)],
+                         ['n_scanned', n_scanned]])
+
+def _downsample(block, axes, method):
+    """
+    Downsample block 2x along axes by the mean or max of each pair (an odd
+    last element is paired with itself)
+    """
+    for axis in axes:
+        if block.shape[axis] % 2:
+            last = [slice(None)] * block.ndim
+            last[axis] = slice(-1, None)
+            block = _np.concatenate([block, block[tuple(last)]], axis=axis)
+    shape = []
+    pair_axes = []
+    for axis, dim in enumerate(block.shape):
+        if axis in axes:
+            shape.extend([dim // 2, 2])
+            pair_axes.append(len(shape) - 1)
+        else:
+            shape.append(dim)
+    block = block.reshape(shape)
+    if method == 'max':
+        return block.max(axis=tuple(pair_axes))
+    out = block.mean(axis=tuple(pair_axes))
+    if block.dtype.kind in 'iub':
+        out = _np.round(out)
+    return out.astype(block.dtype)
+
+def _downsample_tile(src, src_slc, axes, method):
+    """ Read and downsample one tile of src """
+    return _downsample(src[src_slc], axes, method)
+
+def _pyramid_chunks(src, axes, tile):
+    """ Chunk (and tile) shape of the level below src """
+    chunks = []
+    for axis, dim in enumerate(src.shape):
+        if src.chunks is not None:
+            size = src.chunks[axis]
+        else:
+            size = tile if axis in axes else 64
+        chunks.append(max(min(size, -(-dim // 2) if axis in axes else dim), 1))
+    return tuple(chunks)
+
+@_instrument.timed('create.build_pyramid')
+def build_pyramid(file, dset, pth=None, axes=None, method='mean', min_size=256, levels=None,
+                  tile=512, compression=None, compression_opts=None, shuffle=None,
+                  workers=None):
+    """
+    Build a multi-resolution pyramid of a (large) image or cube: levels
+    downsampled 2x, 4x, ... along axes, stored as sibling datasets
+    (dset + '_level1', ...). Each level is computed from the previous one,
+    streamed in chunk-aligned tiles that are downsampled in a pool of
+    threads, so memory use is bounded by a few tiles. Existing levels are
+    replaced.
+
+    See lazy5.load.pick_level and lazy5.load.load_level for reading the
+    level fitting an output size.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Base dataset name
+
+    pth : str
+        Path
+
+    axes : tuple of int
+        Axes to downsample. If None, the last two (one, for 1D).
+
+    method : str
+        'mean' or 'max' of each 2x2 (2^len(axes)) block
+
+    min_size : int
+        Stop when the largest downsampled dimension is <= min_size
+
+    levels : int
+        Maximum number of levels (excluding the base). If None, no limit.
+
+    tile : int
+        Tile size along axes if the base dataset is contiguous. Otherwise,
+        tiles are the base dataset's chunks.
+
+    compression, compression_opts, shuffle :
+        Filters of the levels (see save). If None, the settings of the
+        current configuration (see lazy5.config.use_config). False:
+        none, whatever the configuration.
+
+    workers : int
+        Number of downsampling threads. If None, the configured workers
+        or, if None, number of CPUs.
+
+    Returns
+    -------
+    list : (name, shape) of each level, from the finest
+    """
+    if method not in ('mean', 'max'):
+        raise ValueError('method must be mean or max, not {!r}'.format(method))
+    compression = _setting('compression', compression)
+    compression_opts = _setting('compression_opts', compression_opts)
+    shuffle = _setting('shuffle', shuffle)
+    workers = _setting('workers', workers)
+    if workers is None:
+        workers = _os.cpu_count() or 1
+
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp, mode='r+')
+    fid = fof.fid
+    try:
+        base = fid[dset]
+        if axes is None:
+            axes = tuple(range(max(base.ndim - 2, 0), base.ndim))
+        axes = tuple(sorted([axis % base.ndim for axis in axes]))
+
+        if PYRAMID_ATTR in base.attrs:
+            for entry in _json.loads(base.attrs[PYRAMID_ATTR])['levels']:
+                if entry['name'] in fid:
+                    del fid[entry['name']]
+                    _delete_chunk_stats(fid, entry['name'])
+
+        filter_kwargs = {}
+        if (compression is not None) and (compression is not False):
+            filter_kwargs['compression'] = compression
+            filter_kwargs['compression_opts'] = compression_opts
+        if shuffle:
+            filter_kwargs['shuffle'] = shuffle
+
+        entries = []
+        src = base
+        while ((levels is None) or (len(entries) < levels)) and \
+                (max([src.shape[axis] for axis in axes]) > min_size):
+            factor = 2**(len(entries) + 1)
+            shape = tuple([-(-dim // 2) if axis in axes else dim
+                           for axis, dim in enumerate(src.shape)])
+            chunks = _pyramid_chunks(src, axes, tile)
+            name = '{}_level{}'.format(base.name, len(entries) + 1)
+            dst = fid.create_dataset(name, shape=shape, dtype=src.dtype, chunks=chunks,
+                                     **filter_kwargs)
+
+            # Destination tiles (its chunks) <- 2x source regions, in parallel
+            max_inflight = 4 * workers
+            with _ThreadPoolExecutor(max_workers=workers) as executor:
+                pending = []
+                for offset in _chunk_offsets(shape, chunks):
+                    dst_slc = tuple([slice(off, min(off + chk, dim))
+                                     for off, chk, dim in zip(offset, chunks, shape)])
+                    src_slc = tuple([slice(2 * sl.start, min(2 * sl.stop, src_dim))
+                                     if axis in axes else sl
+                                     for axis, (sl, src_dim) in enumerate(zip(dst_slc,
+                                                                              src.shape))])
+                    pending.append((dst_slc, executor.submit(_downsample_tile, src, src_slc,
+                                                             axes, method)))
+                    while len(pending) >= max_inflight:
+                        done_slc, future = pending.pop(0)
+                        dst[done_slc] = future.result()
+                for done_slc, future in pending:
+                    dst[done_slc] = future.result()
+
+            dst.attrs[PYRAMID_LEVEL_ATTR] = _json.dumps({'base': base.name,
+                                                        'level': len(entries) + 1,
+                                                        'factor': factor, 'method': method,
+                                                        'axes': list(axes)})
+            entries.append({'name': name, 'factor': factor, 'shape': list(shape)})
+            src = dst
+
+        base.attrs[PYRAMID_ATTR] = _json.dumps({'method': method, 'axes': list(axes),
+                                                'levels': entries})
+    finally:
+        fof.close_if_file_not_fid()
+    return [(entry['name'], tuple(entry['shape'])) for entry in entries]
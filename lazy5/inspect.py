@@ -1,20 +1,25 @@
 """ Macros for inspection of HDF5 files """
 import os as _os
 from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
 
 import h5py as _h5py
 import numpy as _np
 
+from . import instrument as _instrument
 from .utils import (FidOrFile as _FidOrFile, hdf_is_open as _hdf_is_open,
-                    fullpath as _fullpath)
-
-from .config import DefaultConfig
-_h5py.get_config().complex_names = DefaultConfig().complex_names
-
-__all__ = ['get_groups', 'get_datasets', 'get_hierarchy',
-           'get_attrs_dset', 'valid_dsets', 'valid_file']
-
-def get_groups(file, pth=None):
+                    fullpath as _fullpath, compound_to_complex as _compound_to_complex)
+from .chunks import (hash_array as _hash_array, hash_layout as _hash_layout,
+                     hash_chunks as _hash_chunks, get_filters as _get_filters,
+                     verify_chunks as _verify_chunks, CHECKSUM_GROUP as _CHECKSUM_GROUP)
+from .config import setting as _setting
+
+__all__ = ['get_groups', 'get_datasets', 'get_hierarchy', 'walk_hierarchy',
+           'get_attrs_dset', 'valid_dsets', 'valid_file', 'snapshot', 'diff',
+           'verify']
+
+@_instrument.timed('inspect.get_groups')
+def get_groups(file, pth=None, follow_links=False, max_depth=8, workers=None):
     """
     Parameters
     ----------
@@ -22,6 +27,17 @@ def get_groups(file, pth=None):
     file : str or h5py.File
         Filename or File-object for open HDF5 file
 
+    follow_links : bool
+        Include groups reached through soft and external links (see
+        walk_hierarchy)
+
+    max_depth : int
+        If following links, maximum number of links followed in a chain
+
+    workers : int
+        If following links and > 1, walk externally-linked files in a pool of
+        processes
+
     Notes
     -----
     Gets groups in a hierarchical list starting from the base '/'. Thus if
@@ -34,6 +50,12 @@ def get_groups(file, pth=None):
     fof = _FidOrFile(fp)
     fid = fof.fid
 
+    if follow_links:
+        nodes = walk_hierarchy(fid, max_depth=max_depth, workers=workers)
+        grp_list = [item for item in nodes if nodes[item]['type'] == 'group']
+        fof.close_if_file_not_fid()
+        return grp_list
+
     all_items_list = []
     fid.visit(lambda x: all_items_list.append('/{}'.format(x)))
 
@@ -47,7 +69,9 @@ def get_groups(file, pth=None):
 
     return grp_list
 
-def get_datasets(file, pth=None, fulldsetpath=True):
+@_instrument.timed('inspect.get_datasets')
+def get_datasets(file, pth=None, fulldsetpath=True, follow_links=False, max_depth=8,
+                 workers=None):
     """
     Parameters
     ----------
@@ -57,6 +81,17 @@ def get_datasets(file, pth=None, fulldsetpath=True):
 
     fulldsetpath : bool
         Return just the dataset names with group names or not.
+
+    follow_links : bool
+        Include datasets reached through soft and external links (see
+        walk_hierarchy)
+
+    max_depth : int
+        If following links, maximum number of links followed in a chain
+
+    workers : int
+        If following links and > 1, walk externally-linked files in a pool of
+        processes
     """
     
     if isinstance(file, str):
@@ -68,12 +103,16 @@ def get_datasets(file, pth=None, fulldsetpath=True):
 
     fid = fof.fid
 
-    all_items_list = []
-    fid.visit(lambda x: all_items_list.append('/{}'.format(x)))
-    dset_list = []
+    if follow_links:
+        nodes = walk_hierarchy(fid, max_depth=max_depth, workers=workers)
+        dset_list = [item for item in nodes if nodes[item]['type'] == 'dataset']
+    else:
+        all_items_list = []
+        fid.visit(lambda x: all_items_list.append('/{}'.format(x)))
 
-    # list-set-list removes duplicates
-    dset_list = list(set([item for item in all_items_list if isinstance(fid[item], _h5py.Dataset)]))
+        # list-set-list removes duplicates
+        dset_list = list(set([item for item in all_items_list
+                              if isinstance(fid[item], _h5py.Dataset)]))
     dset_list.sort()
 
     if not fulldsetpath:
@@ -88,7 +127,9 @@ def get_datasets(file, pth=None, fulldsetpath=True):
 
     return dset_list
 
-def get_hierarchy(file, pth=None, fulldsetpath=False, grp_w_dset=False):
+@_instrument.timed('inspect.get_hierarchy')
+def get_hierarchy(file, pth=None, fulldsetpath=False, grp_w_dset=False, follow_links=False,
+                  max_depth=8, workers=None):
     """
     Return an ordered dictionary, where the keys are groups and the items are
     the datasets
@@ -107,6 +148,17 @@ def get_hierarchy(file, pth=None, fulldsetpath=False, grp_w_dset=False):
         If True, only return groups that contain datasets. If False, include
         empty groups
 
+    follow_links : bool
+        Resolve soft and external links into a unified hierarchy. For the
+        source file of each group/dataset, see walk_hierarchy.
+
+    max_depth : int
+        If following links, maximum number of links followed in a chain
+
+    workers : int
+        If following links and > 1, walk externally-linked files in a pool of
+        processes
+
     Returns
     -------
     OrderedDict : (group, [dataset list])
@@ -119,8 +171,13 @@ def get_hierarchy(file, pth=None, fulldsetpath=False, grp_w_dset=False):
     fof = _FidOrFile(fp)
     fid = fof.fid
 
-    grp_list = get_groups(fid)
-    dset_list = get_datasets(fid, fulldsetpath=True)
+    if follow_links:
+        nodes = walk_hierarchy(fid, max_depth=max_depth, workers=workers)
+        grp_list = [item for item in nodes if nodes[item]['type'] == 'group']
+        dset_list = [item for item in nodes if nodes[item]['type'] == 'dataset']
+    else:
+        grp_list = get_groups(fid)
+        dset_list = get_datasets(fid, fulldsetpath=True)
 
     grp_dict = _OrderedDict([[grp, []] for grp in grp_list])
 
@@ -151,6 +208,169 @@ def get_hierarchy(file, pth=None, fulldsetpath=False, grp_w_dset=False):
 
     return grp_dict
 
+def _resolve_external(filename, linking_file):
+    """ Path of an external link's target file, as libhdf5 resolves it """
+    if _os.path.isabs(filename):
+        return filename
+    candidate = _os.path.join(_os.path.dirname(linking_file), filename)
+    return candidate if _os.path.exists(candidate) else filename
+
+def _node(node_type, filename, name, link, reason=None):
+    """ walk_hierarchy entry """
+    node = {'type': node_type, 'file': filename, 'name': name, 'link': link}
+    if reason is not None:
+        node['reason'] = reason
+    return node
+
+def _walk_file(fid, filename, stubs, max_depth):
+    """
+    Walk the objects of one (open) file that are reached through stubs, a
+    list of (path, target, link, depth, ancestors): path in the unified
+    hierarchy; target object name in fid; link type that led here; number of
+    links followed; and (file, address) of the groups above.
+
+    Returns
+    -------
+    (list, list) : (path, node) entries and external-link stubs found,
+    as (path, target file, target name, depth, ancestors)
+    """
+    file_id = _os.path.abspath(filename)
+    entries = []
+    ext_stubs = []
+
+    def visit(obj, path, link, depth, ancestors):
+        if isinstance(obj, _h5py.Dataset):
+            entries.append((path, _node('dataset', filename, obj.name, link)))
+            return
+        obj_id = (file_id, _h5py.h5o.get_info(obj.id).addr)
+        if obj_id in ancestors:
+            entries.append((path, _node('unresolved', filename, obj.name, link, 'cycle')))
+            return
+        entries.append((path, _node('group', filename, obj.name, link)))
+        ancestors = ancestors + (obj_id,)
+
+        for name in obj:
+            child_path = '{}/{}'.format(path.rstrip('/'), name)
+            child_link = obj.get(name, getlink=True)
+            if isinstance(child_link, _h5py.HardLink):
+                visit(obj[name], child_path, 'hard', depth, ancestors)
+            elif depth >= max_depth:
+                entries.append((child_path, _node('unresolved', filename,
+                                                  '{}/{}'.format(obj.name.rstrip('/'), name),
+                                                  'soft' if isinstance(child_link, _h5py.SoftLink)
+                                                  else 'external', 'max_depth')))
+            elif isinstance(child_link, _h5py.ExternalLink):
+                ext_stubs.append((child_path, _resolve_external(child_link.filename, filename),
+                                  child_link.path, depth + 1, ancestors))
+            else:
+                # Relative soft links resolve from the group holding the link
+                target = obj.get(child_link.path)
+                if target is None:
+                    target_name = child_link.path
+                    if not target_name.startswith('/'):
+                        target_name = '{}/{}'.format(obj.name.rstrip('/'), target_name)
+                    entries.append((child_path, _node('unresolved', filename, target_name,
+                                                      'soft', 'dangling')))
+                else:
+                    visit(target, child_path, 'soft', depth + 1, ancestors)
+
+    for path, target, link, depth, ancestors in stubs:
+        obj = fid.get(target)
+        if obj is None:
+            entries.append((path, _node('unresolved', filename, target, link, 'dangling')))
+        else:
+            visit(obj, path, link, depth, ancestors)
+    return entries, ext_stubs
+
+def _walk_external(filename, stubs, max_depth):
+    """ Open filename and walk it from external-link stubs (see _walk_file) """
+    fof = _FidOrFile(filename)
+    try:
+        return _walk_file(fof.fid, filename, stubs, max_depth)
+    finally:
+        fof.close_if_file_not_fid()
+
+@_instrument.timed('inspect.walk_hierarchy')
+def walk_hierarchy(file, pth=None, max_depth=8, workers=None):
+    """
+    Walk a file's hierarchy, following soft and external links, into a
+    unified hierarchy spanning all linked files.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    pth : str
+        Path
+
+    max_depth : int
+        Maximum number of (soft or external) links followed in a chain
+
+    workers : int
+        If > 1, externally-linked files are walked in a pool of processes.
+        Otherwise, each linked file is opened once and kept open (cached)
+        until the walk is complete. If None, the workers setting of the
+        current configuration (see lazy5.config.use_config).
+
+    Returns
+    -------
+    OrderedDict : (path, node) sorted by path. Each node is a dict with
+    'type' ('group', 'dataset', or 'unresolved'), 'file' (source file),
+    'name' (object name within the source file), and 'link' (type of the
+    last link: 'hard', 'soft', or 'external'). Unresolved nodes have a
+    'reason': 'cycle', 'dangling', 'missing_file', or 'max_depth'.
+
+    Notes
+    -----
+    A link leading back to one of its ancestor groups (in any file) is a
+    cycle and is not followed.
+    """
+    workers = _setting('workers', workers)
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp)
+    fid = fof.fid
+    cache = {}
+
+    try:
+        entries, stubs = _walk_file(fid, fid.filename, [('/', '/', 'hard', 0, ())], max_depth)
+
+        while stubs:
+            by_file = _OrderedDict()
+            for stub in stubs:
+                path, target_file, target, depth, ancestors = stub
+                if not _os.path.isfile(target_file):
+                    entries.append((path, _node('unresolved', target_file, target, 'external',
+                                                'missing_file')))
+                else:
+                    by_file.setdefault(target_file, []).append((path, target, 'external', depth,
+                                                                ancestors))
+            stubs = []
+            if (workers is not None) and (workers > 1) and (len(by_file) > 1):
+                with _ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(_walk_external, target_file, file_stubs, max_depth)
+                               for target_file, file_stubs in by_file.items()]
+                    for future in futures:
+                        new_entries, new_stubs = future.result()
+                        entries.extend(new_entries)
+                        stubs.extend(new_stubs)
+            else:
+                for target_file, file_stubs in by_file.items():
+                    key = _os.path.abspath(target_file)
+                    if key not in cache:
+                        cache[key] = _FidOrFile(target_file)
+                    new_entries, new_stubs = _walk_file(cache[key].fid, target_file, file_stubs,
+                                                        max_depth)
+                    entries.extend(new_entries)
+                    stubs.extend(new_stubs)
+    finally:
+        for cached_fof in cache.values():
+            cached_fof.close_if_file_not_fid()
+        fof.close_if_file_not_fid()
+
+    return _OrderedDict(sorted(entries, key=lambda entry: entry[0]))
+
+@_instrument.timed('inspect.get_attrs_dset')
 def get_attrs_dset(file, dset, pth=None, convert_to_str=True, convert_sgl_np_to_num=False):
     """
     Get dictionary of attribute values for a given dataset
@@ -191,7 +411,7 @@ def get_attrs_dset(file, dset, pth=None, convert_to_str=True, convert_sgl_np_to_
     attr_list = []
     for k in attr_keys_list:
         try:
-            attr_val = ds_attrs[k]
+            attr_val = _compound_to_complex(ds_attrs[k])
         except (TypeError, ValueError):
             print('Could not get value for attribute: {}. Set to None'.format(k))
             attr_list.append([k, None])
@@ -216,6 +436,7 @@ def get_attrs_dset(file, dset, pth=None, convert_to_str=True, convert_sgl_np_to_
 
     return attr_dict
 
+@_instrument.timed('inspect.valid_file')
 def valid_file(file, pth=None, verbose=False):
     """ Validate whether a file exists (or if a fid, is-open """
 
@@ -236,6 +457,7 @@ def valid_file(file, pth=None, verbose=False):
     
     return isvalid
 
+@_instrument.timed('inspect.valid_dsets')
 def valid_dsets(file, dset_list, pth=None, verbose=False):
     """ Check whether 1 or more datasets are valid """
 
@@ -286,3 +508,265 @@ def valid_dsets(file, dset_list, pth=None, verbose=False):
         err_str2 = 'is not a str, list, or tuple'
         raise TypeError(err_str1 + err_str2)
 
+def _object_meta(obj):
+    """ Cheap (no data read) description of a group or dataset for diff """
+    attrs = _OrderedDict([[key, _hash_array(obj.attrs[key])] for key in sorted(obj.attrs)])
+    meta = {'type': 'dataset' if isinstance(obj, _h5py.Dataset) else 'group',
+            'attrs': attrs,
+            'attrs_hash': _hash_array(_np.array(list(attrs.items()), dtype=str))}
+    if meta['type'] == 'dataset':
+        meta['shape'] = None if obj.shape is None else list(obj.shape)
+        meta['dtype'] = obj.dtype.str
+    return meta
+
+def _sorted_paths(fid):
+    """ All group and dataset names of fid, sorted """
+    return sorted(set(get_groups(fid) + get_datasets(fid, fulldsetpath=True)))
+
+@_instrument.timed('inspect.snapshot')
+def snapshot(file, pth=None, data=False, workers=None):
+    """
+    Describe every group and dataset of a file, for later comparison with
+    diff (e.g., the state of the file at the last sync). The result is
+    JSON-serializable.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    pth : str
+        Path
+
+    data : bool
+        Include per-chunk (or per-block) hashes of each dataset's data (see
+        lazy5.chunks.hash_chunks)
+
+    workers : int
+        Number of hashing threads. If None, the workers setting of the
+        current configuration (see lazy5.config.use_config).
+
+    Returns
+    -------
+    OrderedDict : (name, description) with type, attribute hashes, and (for
+    datasets) shape, dtype, and optionally hash layout and chunk hashes
+    """
+    workers = _setting('workers', workers)
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp)
+    fid = fof.fid
+    try:
+        out = _OrderedDict()
+        for name in _sorted_paths(fid):
+            meta = _object_meta(fid[name])
+            if data and (meta['type'] == 'dataset'):
+                meta['layout'] = _hash_layout(fid[name])
+                meta['chunk_hashes'] = _hash_chunks(fid[name], layout=meta['layout'],
+                                                    workers=workers)
+            out[name] = meta
+        return out
+    finally:
+        fof.close_if_file_not_fid()
+
+class _DiffSide:
+    """ A file (opened for the life of the diff) or a snapshot """
+    def __init__(self, source, pth):
+        if isinstance(source, dict):
+            self.fof = None
+            self.snap = source
+            self.paths = sorted(source)
+        else:
+            self.fof = _FidOrFile(_fullpath(source, pth))
+            self.snap = None
+            self.paths = _sorted_paths(self.fof.fid)
+
+    def meta(self, name):
+        if self.snap is not None:
+            return self.snap[name]
+        return _object_meta(self.fof.fid[name])
+
+    def layout(self, name):
+        if self.snap is not None:
+            if 'layout' not in self.snap[name]:
+                raise ValueError('Snapshot has no data hashes. Create it with data=True')
+            return self.snap[name]['layout']
+        return _hash_layout(self.fof.fid[name])
+
+    def hashes(self, name, layout, workers):
+        """ Chunk hashes with layout, or None if they cannot be computed """
+        if self.snap is not None:
+            return self.snap[name]['chunk_hashes'] if self.snap[name]['layout'] == layout else None
+        dset = self.fof.fid[name]
+        if (layout[0] == 'raw') and (_hash_layout(dset) != layout):
+            return None
+        return _hash_chunks(dset, layout=layout, workers=workers)
+
+    def close(self):
+        if self.fof is not None:
+            self.fof.close_if_file_not_fid()
+
+def _data_layout(side_a, side_b, name):
+    """ Hash layout for comparing the data of name, preferring raw chunks """
+    layout_a = side_a.layout(name)
+    layout_b = side_b.layout(name)
+    if layout_a == layout_b:
+        return layout_a
+    # Snapshot hashes are fixed; a file can always be hashed by blocks of values
+    for side, layout in [(side_a, layout_a), (side_b, layout_b)]:
+        if side.snap is not None:
+            return layout
+    return _hash_layout(side_a.fof.fid[name], raw=False)
+
+def diff(a, b, pth=None, b_pth=None, data=False, workers=None):
+    """
+    Generator of the differences between two files, or a snapshot (see
+    snapshot) and a file, from a (old) to b (new). Objects are compared in
+    order of name, and the cheap checks (type, shape, dtype, attribute
+    hashes) come first: data are only hashed (per chunk, in parallel) for
+    datasets whose metadata match.
+
+    Parameters
+    ----------
+    a, b : str, h5py.File, or dict
+        Filename, File-object, or snapshot (from snapshot)
+
+    pth, b_pth : str
+        Paths of a and b. If b_pth is None, pth.
+
+    data : bool
+        Compare data via per-chunk hashes. Snapshots must have been created
+        with data=True.
+
+    workers : int
+        Number of hashing threads. If None, the workers setting of the
+        current configuration (see lazy5.config.use_config).
+
+    Yields
+    ------
+    dict : 'name'; 'change' ('added', 'removed', 'type', 'shape', 'dtype',
+    'attrs', or 'data'); and 'a' and 'b', the values in a and b. For
+    'attrs', 'b' is a dict of 'added', 'removed', and 'changed' attribute
+    keys; for 'data', 'b' is a list of the differing chunk (or block) keys,
+    or None if the chunk hashes are not comparable.
+    """
+    workers = _setting('workers', workers)
+    side_a = _DiffSide(a, pth)
+    side_b = _DiffSide(b, b_pth if b_pth is not None else pth)
+    try:
+        paths_a = side_a.paths
+        paths_b = side_b.paths
+        idx_a = idx_b = 0
+        while (idx_a < len(paths_a)) or (idx_b < len(paths_b)):
+            name_a = paths_a[idx_a] if idx_a < len(paths_a) else None
+            name_b = paths_b[idx_b] if idx_b < len(paths_b) else None
+            if (name_b is None) or ((name_a is not None) and (name_a < name_b)):
+                yield {'name': name_a, 'change': 'removed', 'a': side_a.meta(name_a)['type'],
+                       'b': None}
+                idx_a += 1
+                continue
+            if (name_a is None) or (name_b < name_a):
+                yield {'name': name_b, 'change': 'added', 'a': None,
+                       'b': side_b.meta(name_b)['type']}
+                idx_b += 1
+                continue
+            idx_a += 1
+            idx_b += 1
+            for change in _diff_object(side_a, side_b, name_a, data, workers):
+                yield change
+    finally:
+        side_a.close()
+        side_b.close()
+
+def _diff_object(side_a, side_b, name, data, workers):
+    """ Differences of an object present in both sides (see diff) """
+    meta_a = side_a.meta(name)
+    meta_b = side_b.meta(name)
+    for key in ['type', 'shape', 'dtype']:
+        if meta_a.get(key) != meta_b.get(key):
+            yield {'name': name, 'change': key, 'a': meta_a.get(key), 'b': meta_b.get(key)}
+            return
+
+    if meta_a['attrs_hash'] != meta_b['attrs_hash']:
+        attrs_a = meta_a['attrs']
+        attrs_b = meta_b['attrs']
+        yield {'name': name, 'change': 'attrs', 'a': None,
+               'b': {'added': [key for key in attrs_b if key not in attrs_a],
+                     'removed': [key for key in attrs_a if key not in attrs_b],
+                     'changed': [key for key in attrs_a
+                                 if (key in attrs_b) and (attrs_a[key] != attrs_b[key])]}}
+
+    if data and (meta_a['type'] == 'dataset'):
+        layout = _data_layout(side_a, side_b, name)
+        hashes_a = side_a.hashes(name, layout, workers)
+        hashes_b = side_b.hashes(name, layout, workers)
+        if (hashes_a is None) or (hashes_b is None):
+            yield {'name': name, 'change': 'data', 'a': None, 'b': None}
+        elif hashes_a != hashes_b:
+            yield {'name': name, 'change': 'data', 'a': None,
+                   'b': [key for key in hashes_b if hashes_a.get(key) != hashes_b[key]]}
+
+def _verify_fletcher32(dset):
+    """ Start rows of the blocks of dset failing libhdf5's Fletcher32 check """
+    if not dset.shape:
+        blocks = [(0, ())]
+    else:
+        rows = _hash_layout(dset, raw=False)[1]
+        blocks = [(start, slice(start, start + rows)) for start in range(0, dset.shape[0], rows)]
+    bad = []
+    for start, slc in blocks:
+        try:
+            dset[slc]
+        except OSError:
+            bad.append(str(start))
+    return bad
+
+@_instrument.timed('inspect.verify')
+def verify(file, pth=None, dsets=None, workers=None):
+    """
+    Verify the stored data of a file: the raw (still compressed) chunks of
+    each dataset with checksums (see lazy5.create.save(..., checksums=True)
+    and lazy5.chunks.write_checksums) are read and hashed in a pool of
+    threads. Datasets without checksums but with the Fletcher32 filter are
+    read (decompressed), letting libhdf5 check them.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    pth : str
+        Path
+
+    dsets : list of str
+        Datasets to verify. If None, all datasets.
+
+    workers : int
+        Number of hashing threads. If None, the workers setting of the
+        current configuration or, if None, number of CPUs.
+
+    Returns
+    -------
+    OrderedDict : (dataset, {'status', 'chunks'}). status is 'ok', 'corrupt'
+    (chunks: the keys of the corrupt chunks, or first rows of the corrupt
+    blocks), 'stale' (checksums do not match the dataset's current shape or
+    layout), or 'unchecked' (no checksums or Fletcher32 filter).
+    """
+    workers = _setting('workers', workers)
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp)
+    fid = fof.fid
+    try:
+        if dsets is None:
+            dsets = [dset for dset in get_datasets(fid, fulldsetpath=True)
+                     if not dset.startswith(_CHECKSUM_GROUP + '/')]
+        out = _OrderedDict()
+        for dset in dsets:
+            status, bad = _verify_chunks(fid[dset], workers=workers)
+            if ((status == 'unchecked') and
+                    (_h5py.h5z.FILTER_FLETCHER32 in [filt[0] for filt in _get_filters(fid[dset])])):
+                bad = _verify_fletcher32(fid[dset])
+                status = 'corrupt' if bad else 'ok'
+            out[dset] = {'status': status, 'chunks': bad}
+        return out
+    finally:
+        fof.close_if_file_not_fid()
@@ -0,0 +1,248 @@
+"""
+Instrumentation of lazy5: call counts, latencies, bytes transferred, file
+opens/closes, and cache hit rates.
+
+Events are only recorded while a Collector is active (``with Collector():``)
+or a sink is registered (add_sink); otherwise, instrumented calls cost a
+single check of an empty list.
+
+Events
+------
+Each event is a (kind, name, value) triplet passed to every active
+collector and sink:
+
+-   'call', 'error' : name of the macro (e.g., 'load.load'); value 1
+-   'latency' : name of the macro; value in seconds
+-   'bytes_read', 'bytes_written' : name of the macro; value in bytes
+-   'open', 'close' : filename; value 1
+-   'mdc_hit_rate' : filename; metadata cache hit rate (0-1) at close
+-   'cache_hit', 'cache_miss' : name of the cache; value 1
+
+Note: events in worker processes (e.g., repack with workers > 1) are not
+recorded.
+
+Examples
+--------
+>>> with Collector() as stats:
+...     data = lazy5.load.load('file.h5', '/Group1/Dataset')
+>>> stats.calls['load.load'], stats.bytes_read['load.load'], stats.opens
+
+>>> add_sink(lambda kind, name, value: statsd.incr(kind))
+"""
+import functools as _functools
+import math as _math
+import threading as _threading
+import time as _time
+from collections import Counter as _Counter
+
+__all__ = ['Collector', 'Histogram', 'add_sink', 'remove_sink', 'enabled', 'record',
+           'timed']
+
+# Active collectors' record methods and user sinks. Empty: disabled.
+_SINKS = []
+
+def enabled():
+    """ Is any collector or sink active """
+    return bool(_SINKS)
+
+def add_sink(sink):
+    """
+    Register a callback, sink(kind, name, value), called for every event
+    (from any thread)
+    """
+    _SINKS.append(sink)
+
+def remove_sink(sink):
+    """ Unregister a callback registered with add_sink """
+    _SINKS.remove(sink)
+
+def record(kind, name, value=1):
+    """ Pass an event to all active collectors and sinks """
+    if not _SINKS:
+        return
+    for sink in list(_SINKS):
+        sink(kind, name, value)
+
+def timed(name):
+    """
+    Decorator recording 'call', 'latency', and (if raised) 'error' events of
+    a function under name
+    """
+    def decorate(func):
+        @_functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _SINKS:
+                return func(*args, **kwargs)
+            tstart = _time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                record('error', name)
+                raise
+            finally:
+                record('call', name)
+                record('latency', name, _time.perf_counter() - tstart)
+        return wrapper
+    return decorate
+
+class Histogram:
+    """
+    Latency histogram with base-2 logarithmic bins. Bin 0 holds values below
+    min_value; bin n holds [min_value * 2**(n-1), min_value * 2**n); the last
+    bin holds everything above.
+
+    Parameters
+    ----------
+    min_value : float
+        Upper edge of the first bin (seconds)
+
+    n_bins : int
+        Number of bins
+    """
+    def __init__(self, min_value=1e-6, n_bins=32):
+        self.min_value = min_value
+        self.counts = [0] * n_bins
+        self.n = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """ Add a value """
+        if value < self.min_value:
+            idx = 0
+        else:
+            idx = min(int(_math.log2(value / self.min_value)) + 1, len(self.counts) - 1)
+        self.counts[idx] += 1
+        self.n += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def edges(self):
+        """ Upper edge of each bin (the last is inf) """
+        return ([self.min_value * 2**idx for idx in range(len(self.counts) - 1)] +
+                [float('inf')])
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else None
+
+    def quantile(self, q):
+        """ Upper bin edge below which a fraction q of the values lie (capped at max) """
+        if not self.n:
+            return None
+        target = q * self.n
+        cumulative = 0
+        for count, edge in zip(self.counts, self.edges()):
+            cumulative += count
+            if cumulative >= target:
+                return min(edge, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'n': self.n, 'total': self.total, 'mean': self.mean, 'min': self.min,
+                'max': self.max, 'p50': self.quantile(0.5), 'p99': self.quantile(0.99),
+                'counts': list(self.counts)}
+
+class Collector:
+    """
+    Collects events while active. Use as a context manager, or call
+    start/stop. Collectors may be nested; each sees every event while
+    active.
+
+    Attributes
+    ----------
+    calls, errors : collections.Counter
+        Calls (and those raising) per macro name
+
+    latency : dict
+        Histogram of latencies (s) per macro name
+
+    bytes_read, bytes_written : collections.Counter
+        Bytes per macro name
+
+    opens, closes : int
+        Files opened and closed (by lazy5.utils.FidOrFile)
+
+    mdc_hit_rate : dict
+        Last metadata cache hit rate per filename
+
+    cache_hits, cache_misses : collections.Counter
+        Hits and misses per cache name
+    """
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Clear all statistics """
+        self.calls = _Counter()
+        self.errors = _Counter()
+        self.latency = {}
+        self.bytes_read = _Counter()
+        self.bytes_written = _Counter()
+        self.opens = 0
+        self.closes = 0
+        self.mdc_hit_rate = {}
+        self.cache_hits = _Counter()
+        self.cache_misses = _Counter()
+
+    def start(self):
+        _SINKS.append(self.record)
+        return self
+
+    def stop(self):
+        if self.record in _SINKS:
+            _SINKS.remove(self.record)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def record(self, kind, name, value=1):
+        """ Record an event (see module docstring) """
+        with self._lock:
+            if kind == 'call':
+                self.calls[name] += value
+            elif kind == 'latency':
+                if name not in self.latency:
+                    self.latency[name] = Histogram()
+                self.latency[name].add(value)
+            elif kind == 'bytes_read':
+                self.bytes_read[name] += value
+            elif kind == 'bytes_written':
+                self.bytes_written[name] += value
+            elif kind == 'open':
+                self.opens += value
+            elif kind == 'close':
+                self.closes += value
+            elif kind == 'mdc_hit_rate':
+                self.mdc_hit_rate[name] = value
+            elif kind == 'cache_hit':
+                self.cache_hits[name] += value
+            elif kind == 'cache_miss':
+                self.cache_misses[name] += value
+            elif kind == 'error':
+                self.errors[name] += value
+
+    def hit_rate(self, name):
+        """ Hit rate (0-1) of cache name, or None if never accessed """
+        total = self.cache_hits[name] + self.cache_misses[name]
+        return self.cache_hits[name] / total if total else None
+
+    def summary(self):
+        """ Statistics as a (JSON-serializable) dictionary """
+        with self._lock:
+            caches = set(self.cache_hits) | set(self.cache_misses)
+            return {'calls': dict(self.calls),
+                    'errors': dict(self.errors),
+                    'latency': dict([[k, v.to_dict()] for k, v in self.latency.items()]),
+                    'bytes_read': dict(self.bytes_read),
+                    'bytes_written': dict(self.bytes_written),
+                    'opens': self.opens,
+                    'closes': self.closes,
+                    'mdc_hit_rate': dict(self.mdc_hit_rate),
+                    'cache_hit_rate': dict([[k, self.hit_rate(k)] for k in caches])}
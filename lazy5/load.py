@@ -0,0 +1,712 @@
+""" Macros for loading data from HDF5 files """
+import json as _json
+import math as _math
+import os as _os
+import time as _time
+import weakref as _weakref
+from collections import deque as _deque
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+import h5py as _h5py
+import numpy as _np
+
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    compound_to_complex as _compound_to_complex,
+                    _complex_dtype)
+from .chunks import (get_filters as _get_filters,
+                     has_supported_filters as _has_supported_filters,
+                     chunk_offsets as _chunk_offsets,
+                     chunk_selection as _chunk_selection,
+                     decode_chunk as _decode_chunk,
+                     verify_chunks as _verify_chunks,
+                     COMPARISONS as _COMPARISONS, candidate_chunks as _candidate_chunks,
+                     iter_chunk_blocks as _iter_chunk_blocks)
+from .config import (setting as _setting, get_config as _get_config,
+                     use_config as _use_config)
+from .cache import CHUNK_CACHE as _CHUNK_CACHE, is_cacheable as _is_cacheable
+from .create import (DEDUP_ATTR as _DEDUP_ATTR, PYRAMID_ATTR as _PYRAMID_ATTR,
+                     COMPLEX_ATTR as _COMPLEX_ATTR)
+
+__all__ = ['load', 'read_chunks_parallel', 'read_dedup', 'load_where', 'pick_level',
+           'load_level', 'ReadAhead', 'iter_frames']
+
+def _selection_bounds(slc, shape):
+    """
+    Convert a selection (slice, int, Ellipsis, or tuple thereof) into
+    per-axis (start, stop) bounds and a tuple of axes to drop (integer
+    indexing). Returns None if the selection is not a simple hyperslab
+    (e.g., steps other than 1 or fancy indexing).
+    """
+    if slc is None:
+        slc = ()
+    elif not isinstance(slc, tuple):
+        slc = (slc,)
+
+    if any([sl is Ellipsis for sl in slc]):
+        if sum([sl is Ellipsis for sl in slc]) > 1:
+            return None
+        idx = [num for num, sl in enumerate(slc) if sl is Ellipsis][0]
+        n_fill = len(shape) - (len(slc) - 1)
+        slc = slc[:idx] + (slice(None),) * n_fill + slc[idx + 1:]
+
+    if len(slc) > len(shape):
+        return None
+    slc = slc + (slice(None),) * (len(shape) - len(slc))
+
+    bounds = []
+    drop_axes = []
+    for axis, (sl, dim) in enumerate(zip(slc, shape)):
+        if isinstance(sl, slice):
+            start, stop, step = sl.indices(dim)
+            if step != 1:
+                return None
+            bounds.append((start, max(start, stop)))
+        elif isinstance(sl, (int, _np.integer)):
+            idx = int(sl)
+            if idx < 0:
+                idx += dim
+            if not 0 <= idx < dim:
+                raise IndexError('Index {} out of range for axis {} of size {}'.format(sl, axis, dim))
+            bounds.append((idx, idx + 1))
+            drop_axes.append(axis)
+        else:
+            return None
+    return tuple(bounds), tuple(drop_axes)
+
+def _interleaved_selection(slc, ndim):
+    """ Selection of ndim complex axes as a selection of an interleaved dataset """
+    if slc is None:
+        return None
+    if not isinstance(slc, tuple):
+        slc = (slc,)
+    if not any([sl is Ellipsis for sl in slc]):
+        slc = slc + (slice(None),) * (ndim - len(slc))
+    return slc + (slice(None),)
+
+def _read_split(grp, slc=None):
+    """ Complex data stored as separate real and imaginary datasets """
+    real = grp['real'][() if slc is None else slc]
+    imag = grp['imag'][() if slc is None else slc]
+    out = _np.empty(_np.shape(real), dtype=_complex_dtype(_np.asarray(real).dtype))
+    out.real = real
+    out.imag = imag
+    return out
+
+@_instrument.timed('load.read_chunks_parallel')
+def read_chunks_parallel(dset, slc=None, workers=None):
+    """
+    Read a (hyperslab of a) chunked dataset by pulling raw chunks
+    (read_direct_chunk) and undoing the filter pipeline (e.g., gzip) in a
+    pool of threads. zlib releases the GIL, so decompression scales with the
+    number of workers.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object. Must be chunked with only supported filters (see
+        lazy5.chunks.has_supported_filters).
+
+    slc : slice, int, or tuple thereof
+        Hyperslab selection (steps of 1 only). If None, entire dataset.
+
+    workers : int
+        Number of decompression threads. If None, the workers setting of
+        the current configuration (see lazy5.config.use_config) or, if None,
+        number of CPUs.
+
+    Returns
+    -------
+    ndarray
+    """
+    if not _has_supported_filters(dset):
+        raise ValueError('Dataset {} cannot be read via raw chunks'.format(dset.name))
+
+    bounds = _selection_bounds(slc, dset.shape)
+    if bounds is None:
+        raise ValueError('Selection {} is not a simple hyperslab'.format(slc))
+    selection, drop_axes = bounds
+
+    workers = _setting('workers', workers)
+    if workers is None:
+        workers = _os.cpu_count() or 1
+
+    out_shape = tuple([stop - start for start, stop in selection])
+    out = _np.empty(out_shape, dtype=dset.dtype)
+    if dset.fillvalue is not None:
+        out.fill(dset.fillvalue)
+
+    filters = _get_filters(dset)
+    chunks = dset.chunks
+    dtype = dset.dtype
+
+    def decode_and_place(filter_mask, buf, offset):
+        """ Decode one raw chunk and copy overlap into out """
+        arr = _decode_chunk(buf, filters, chunks, dtype, filter_mask=filter_mask)
+        slc_chunk, slc_out = _chunk_selection(offset, chunks, selection)
+        out[slc_out] = arr[slc_chunk]
+
+    if out.size > 0:
+        # Raw reads go through libhdf5 (serialized); decoding is done by the
+        # pool. In-flight chunks are bounded to limit memory use.
+        max_inflight = 4 * workers
+        with _ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for offset in _chunk_offsets(dset.shape, chunks, selection):
+                info = dset.id.get_chunk_info_by_coord(offset)
+                if info.byte_offset is None:  # Not allocated: fill value
+                    continue
+                filter_mask, buf = dset.id.read_direct_chunk(offset)
+                futures.append(executor.submit(decode_and_place, filter_mask, buf, offset))
+                if len(futures) >= max_inflight:
+                    futures.pop(0).result()
+            for future in futures:
+                future.result()
+
+    if drop_axes:
+        out = out.reshape([dim for axis, dim in enumerate(out_shape) if axis not in drop_axes])
+    return out
+
+def read_dedup(grp, slc=None):
+    """
+    Read a (selection of a) deduplicated array written by
+    lazy5.create.save_dedup. Only the unique chunks overlapping the
+    selection are read, each once.
+
+    Parameters
+    ----------
+    grp : h5py.Group
+        Group-object of the deduplicated array
+
+    slc : slice, int, or tuple thereof
+        Selection. If None, entire array.
+
+    Returns
+    -------
+    ndarray
+    """
+    info = _json.loads(grp.attrs[_DEDUP_ATTR])
+    shape = tuple(info['shape'])
+    chunks = tuple(info['chunks'])
+    store = grp['store']
+
+    bounds = _selection_bounds(slc, shape)
+    if bounds is None:  # Not a simple hyperslab: select from the whole array
+        return read_dedup(grp)[slc]
+    selection, drop_axes = bounds
+
+    out_shape = tuple([stop - start for start, stop in selection])
+    out = _np.empty(out_shape, dtype=store.dtype)
+    if out.size > 0:
+        grid_slc = tuple([slice(start // chk, -(-stop // chk))
+                          for (start, stop), chk in zip(selection, chunks)])
+        chunk_map = grp['map'][grid_slc]
+        needed = _np.unique(chunk_map)
+        unique = store[needed.tolist()]
+        positions = _np.searchsorted(needed, chunk_map)
+        for offset in _chunk_offsets(shape, chunks, selection):
+            grid_idx = tuple([off // chk - sl.start
+                              for off, chk, sl in zip(offset, chunks, grid_slc)])
+            slc_chunk, slc_out = _chunk_selection(offset, chunks, selection)
+            out[slc_out] = unique[positions[grid_idx]][slc_chunk]
+
+    if drop_axes:
+        out = out.reshape([dim for axis, dim in enumerate(out_shape) if axis not in drop_axes])
+    return out
+
+@_instrument.timed('load.load')
+def load(file, dset, pth=None, slc=None, workers=None, verify=False, cache=None):
+    """
+    Load a dataset (or a selection of one)
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Full dataset name with preprended group names. E.g., '/Group1/Dataset'.
+        May also be a deduplicated array (see read_dedup). Complex data stored
+        with any layout of lazy5.create.save (complex_layout) is returned as
+        complex; compound (fields named complex_names of the current
+        configuration) and interleaved layouts as zero-copy views.
+
+    pth : str
+        Path
+
+    slc : slice, int, or tuple thereof
+        Selection. If None, entire dataset.
+
+    workers : int
+        If > 1, decompress chunks in parallel (see read_chunks_parallel) when
+        the dataset's filters are supported and slc is a simple hyperslab.
+        Otherwise, a standard h5py read is performed. If None, the workers
+        setting of the current configuration (see lazy5.config.use_config).
+
+    verify : bool
+        Verify the dataset's stored chunks against its checksums (see
+        lazy5.chunks.write_checksums) before reading. Raises IOError if any
+        chunk is corrupt.
+
+    cache : bool or lazy5.cache.ChunkCache
+        Read simple hyperslabs of chunked datasets of files opened read-only
+        through a cache of decoded chunks that outlives the open file: True
+        (lazy5.cache.CHUNK_CACHE) or a ChunkCache. If None, the chunk_cache
+        setting of the current configuration.
+
+    Returns
+    -------
+    ndarray
+    """
+    workers = _setting('workers', workers)
+    cache = _setting('chunk_cache', cache)
+    if cache is True:
+        cache = _CHUNK_CACHE
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp)
+    try:
+        dset_id = fof.fid[dset]
+        if verify:
+            status, bad = _verify_chunks(dset_id, workers=workers)
+            if status == 'corrupt':
+                raise IOError('Dataset {} failed verification. Corrupt chunks: {}'.format(dset,
+                                                                                        bad))
+        is_group = isinstance(dset_id, _h5py.Group)
+        complex_layout = dset_id.attrs.get(_COMPLEX_ATTR)
+        if isinstance(complex_layout, bytes):
+            complex_layout = complex_layout.decode()
+        read_slc = slc
+        if complex_layout == 'interleaved':
+            read_slc = _interleaved_selection(slc, dset_id.ndim - 1)
+        bounds = None if is_group else _selection_bounds(read_slc, dset_id.shape)
+        use_cache = ((bounds is not None) and (cache is not None) and (cache is not False) and
+                     _is_cacheable(dset_id))
+        use_parallel = ((not is_group) and (workers is not None) and (workers > 1) and
+                        _has_supported_filters(dset_id) and
+                        (bounds is not None))
+        if is_group and (_DEDUP_ATTR in dset_id.attrs):
+            data = read_dedup(dset_id, slc=slc)
+        elif is_group and (complex_layout == 'split'):
+            data = _read_split(dset_id, slc=slc)
+        elif use_cache:
+            data = cache.read(dset_id, selection=bounds[0], workers=workers)
+            if bounds[1]:
+                data = data.reshape([dim for axis, dim in enumerate(data.shape)
+                                     if axis not in bounds[1]])
+        elif use_parallel:
+            data = read_chunks_parallel(dset_id, slc=read_slc, workers=workers)
+        elif read_slc is None:
+            data = dset_id[()]
+        else:
+            data = dset_id[read_slc]
+
+        if complex_layout == 'interleaved':  # Zero-copy view (..., 2) -> complex
+            data = _np.ascontiguousarray(data)
+            data = data.view(_complex_dtype(data.dtype))[..., 0]
+        else:
+            data = _compound_to_complex(data)
+    finally:
+        fof.close_if_file_not_fid()
+
+    _instrument.record('bytes_read', 'load.load', data.nbytes)
+    return data
+
+@_instrument.timed('load.load_where')
+def load_where(file, dset, where, pth=None, workers=None):
+    """
+    Load the elements of a dataset satisfying all conditions, like
+    np.nonzero(condition) and data[condition], without reading the chunks
+    that the dataset's statistics (see lazy5.create.save(...,
+    chunk_stats=True) and lazy5.alter.index_chunk_stats) rule out. Without
+    statistics, every chunk is read. Candidate chunks are decoded and
+    filtered in a pool of threads.
+
+    The statistics are only valid for datasets written through lazy5 since
+    they were computed: after in-place writes with other tools (e.g., h5py),
+    rebuild them with lazy5.alter.index_chunk_stats, or matching elements
+    may be missed (see lazy5.chunks.write_chunk_stats).
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Full dataset name with preprended group names
+
+    where : list of (operator, value)
+        Conditions, e.g., [('>', 10.0)]. operator is one of '==', '!=', '<',
+        '<=', '>', '>='.
+
+    pth : str
+        Path
+
+    workers : int
+        Number of threads. If None, the workers setting of the current
+        configuration or, if None, number of CPUs.
+
+    Returns
+    -------
+    (tuple of ndarray, ndarray) : Indices (one array per axis, in C order)
+    and values of the matching elements
+    """
+    workers = _setting('workers', workers)
+    where = list(where)
+    for operator, _ in where:
+        if operator not in _COMPARISONS:
+            raise ValueError('Unknown operator {!r}. Available: {}'.format(
+                operator, tuple(_COMPARISONS)))
+
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp)
+    try:
+        dset_id = fof.fid[dset]
+        if not dset_id.shape:
+            raise ValueError('Dataset {} is a scalar'.format(dset))
+        chunks, offsets, _ = _candidate_chunks(dset_id, where)
+        selection = tuple([(0, dim) for dim in dset_id.shape])
+
+        def match(offset, block):
+            mask = None
+            for operator, value in where:
+                cond = _COMPARISONS[operator](block, value)
+                mask = cond if mask is None else (mask & cond)
+            _, slc_data = _chunk_selection(offset, chunks, selection)
+            index = [idx + sl.start for idx, sl in zip(_np.nonzero(mask), slc_data)]
+            return index, block[mask], block.nbytes
+
+        indices = [[] for _ in dset_id.shape]
+        values = []
+        nbytes = 0
+        for index, vals, n_read in _iter_chunk_blocks(dset_id, chunks, offsets, match,
+                                                      workers=workers):
+            for axis, idx in enumerate(index):
+                indices[axis].append(idx)
+            values.append(vals)
+            nbytes += n_read
+        dtype = dset_id.dtype
+    finally:
+        fof.close_if_file_not_fid()
+
+    indices = tuple([_np.concatenate(idx) if idx else _np.zeros(0, dtype=_np.intp)
+                     for idx in indices])
+    values = _np.concatenate(values) if values else _np.zeros(0, dtype=dtype)
+    if len(indices) > 1:  # Chunk order -> C order
+        order = _np.lexsort(indices[::-1])
+        indices = tuple([idx[order] for idx in indices])
+        values = values[order]
+    _instrument.record('bytes_read', 'load.load_where', nbytes)
+    return indices, values
+
+def _pick_level(dset_id, shape, slc=None):
+    """
+    Level (dataset, factor) of the pyramid of dset_id for output shape, and
+    the selection slc (in base coordinates) in that level's coordinates
+    """
+    if _PYRAMID_ATTR not in dset_id.attrs:
+        raise KeyError('Dataset {} has no pyramid (see lazy5.create.build_pyramid)'.format(
+            dset_id.name))
+    info = _json.loads(dset_id.attrs[_PYRAMID_ATTR])
+    axes = info['axes']
+    if isinstance(shape, (int, _np.integer)):
+        shape = [int(shape)] * len(axes)
+    if len(shape) != len(axes):
+        raise ValueError('shape {} needs one size per pyramid axis {}'.format(shape, axes))
+
+    bounds = _selection_bounds(slc, dset_id.shape)
+    if bounds is None:
+        raise ValueError('Selection {} is not a simple hyperslab'.format(slc))
+    selection, drop_axes = bounds
+
+    # Coarsest level still at least shape along every (selected, not indexed) axis
+    name, factor = dset_id.name, 1
+    for entry in info['levels']:
+        if all([-(-(selection[axis][1] - selection[axis][0]) // entry['factor']) >= size
+                for axis, size in zip(axes, shape) if axis not in drop_axes]):
+            name, factor = entry['name'], entry['factor']
+
+    level_slc = []
+    for axis, (start, stop) in enumerate(selection):
+        if axis in axes:
+            start, stop = start // factor, max(-(-stop // factor), start // factor + 1)
+        level_slc.append(start if axis in drop_axes else slice(start, stop))
+    return dset_id.file[name], factor, tuple(level_slc)
+
+def pick_level(file, dset, shape, pth=None, slc=None):
+    """
+    Pick the level of a pyramid (see lazy5.create.build_pyramid) for an
+    output of (at least) shape: the coarsest level still at least that large
+    along the downsampled axes.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Base dataset name
+
+    shape : int or tuple of int
+        Output size along each downsampled axis (e.g., the viewport in
+        pixels)
+
+    pth : str
+        Path
+
+    slc : slice, int, or tuple thereof
+        Region of interest, in base coordinates (steps of 1 only). If None,
+        entire dataset.
+
+    Returns
+    -------
+    tuple : (level dataset name, downsampling factor)
+    """
+    fof = _FidOrFile(_fullpath(file, pth))
+    try:
+        level, factor, _ = _pick_level(fof.fid[dset], shape, slc=slc)
+        return level.name, factor
+    finally:
+        fof.close_if_file_not_fid()
+
+@_instrument.timed('load.load_level')
+def load_level(file, dset, shape, pth=None, slc=None):
+    """
+    Load a region of a pyramid at the coarsest level at least shape along
+    the downsampled axes (see pick_level)
+
+    Returns
+    -------
+    ndarray : The region, downsampled by the level's factor (see
+    pick_level) along the pyramid's axes
+    """
+    fof = _FidOrFile(_fullpath(file, pth))
+    try:
+        level, _, level_slc = _pick_level(fof.fid[dset], shape, slc=slc)
+        data = level[level_slc]
+    finally:
+        fof.close_if_file_not_fid()
+    _instrument.record('bytes_read', 'load.load_level', data.nbytes)
+    return data
+
+def _read_block(fid, dset, slc, workers, cache, config):
+    """ Read one block of a ReadAhead (in a background thread) and its latency """
+    tstart = _time.perf_counter()
+    with _use_config(config):
+        data = load(fid, dset, slc=slc, workers=workers, cache=cache)
+    return data, _time.perf_counter() - tstart
+
+def _close_read_ahead(executor, pending, fof):
+    """ Cancel the reads not started, wait for running ones, and close the file """
+    for _, future in pending:
+        future.cancel()
+    pending.clear()
+    executor.shutdown(wait=True)
+    fof.close_if_file_not_fid()
+
+class ReadAhead:
+    """
+    Iterator over consecutive blocks of frames (index ranges along an axis)
+    of a dataset, reading the next blocks on a pool of background threads
+    while the consumer works on the current one. The file is opened once, for
+    the life of the iterator (closed by close, at the end of the iteration,
+    or when the iterator is garbage-collected, e.g., after breaking out of a
+    for loop). See iter_frames.
+
+    Each block is read with load (any complex layout; workers and cache as in
+    load), so the reads of blocks ahead overlap with the consumer and, where
+    chunks are decompressed outside of h5py's lock (workers > 1, or cache),
+    with each other.
+
+    With adaptive=True, the depth (blocks read ahead) follows the measured
+    read latency of a block relative to the consumer's time per block:
+    ceil(read / consume) + 1, within [1, max_depth]. A consumer faster than
+    the reads keeps many blocks in flight; a slower one keeps two.
+
+    Attributes
+    ----------
+    depth : int
+        Current read-ahead depth
+
+    stall_time : float
+        Total time (s) the consumer waited for a block not yet read
+    """
+    def __init__(self, file, dset, pth=None, step=None, axis=0, depth=2, max_depth=16,
+                 adaptive=True, workers=None, cache=None):
+        self._fof = _FidOrFile(_fullpath(file, pth))
+        try:
+            dset_id = self._fof.fid[dset]
+            if not isinstance(dset_id, _h5py.Dataset):
+                raise TypeError('{} is not a dataset'.format(dset))
+            if not 0 <= axis < dset_id.ndim:
+                raise ValueError('Axis {} out of range for {} dimensions'.format(axis,
+                                                                                  dset_id.ndim))
+            length = dset_id.shape[axis]
+            if step is None:
+                step = dset_id.chunks[axis] if dset_id.chunks is not None else 1
+            if step < 1:
+                raise ValueError('step must be >= 1')
+        except Exception:
+            self._fof.close_if_file_not_fid()
+            raise
+
+        self.dset = dset
+        self.axis = axis
+        self.step = step
+        self.starts = list(range(0, length, step))
+        self._length = length
+        self.max_depth = max(1, max_depth)
+        self.depth = max(1, min(depth, self.max_depth))
+        self.adaptive = adaptive
+        self.workers = workers
+        self.cache = cache
+        self._config = _get_config()
+
+        self._executor = _ThreadPoolExecutor(max_workers=self.max_depth)
+        self._pending = _deque()  # (start, future)
+        self._n_submitted = 0
+        self._last_return = None
+        # Reads do not reference self: an abandoned iterator is collected and closed
+        self._finalizer = _weakref.finalize(self, _close_read_ahead, self._executor,
+                                            self._pending, self._fof)
+
+        self.blocks = 0
+        self.peak_depth = self.depth
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.read_time = 0.0
+        self.consume_time = 0.0
+        self._read_avg = None  # Moving averages (s) per block
+        self._consume_avg = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _fill(self):
+        """ Submit reads until depth blocks are in flight or ready """
+        while (len(self._pending) < self.depth) and (self._n_submitted < len(self.starts)):
+            start = self.starts[self._n_submitted]
+            slc = (slice(None),) * self.axis + (slice(start, min(start + self.step,
+                                                                  self._length)),)
+            self._pending.append((start, self._executor.submit(_read_block, self._fof.fid,
+                                                               self.dset, slc, self.workers,
+                                                               self.cache, self._config)))
+            self._n_submitted += 1
+
+    def _adapt(self, read, consume):
+        """ Update moving averages and, if adaptive, the depth """
+        alpha = 0.3
+        self._read_avg = read if self._read_avg is None else (alpha * read +
+                                                              (1 - alpha) * self._read_avg)
+        if consume is not None:
+            self._consume_avg = consume if self._consume_avg is None else (
+                alpha * consume + (1 - alpha) * self._consume_avg)
+        if self.adaptive and self._consume_avg is not None:
+            ratio = self._read_avg / max(self._consume_avg, 1e-6)
+            self.depth = max(1, min(self.max_depth, int(_math.ceil(ratio)) + 1))
+            self.peak_depth = max(self.peak_depth, self.depth)
+
+    def __next__(self):
+        now = _time.perf_counter()
+        consume = None
+        if self._last_return is not None:
+            consume = now - self._last_return
+            self.consume_time += consume
+
+        self._fill()
+        if not self._pending:
+            self.close()
+            raise StopIteration
+
+        start, future = self._pending.popleft()
+        if not future.done():
+            self.stalls += 1
+        tstart = _time.perf_counter()
+        try:
+            data, read = future.result()
+        except Exception:
+            self.close()
+            raise
+        self.stall_time += _time.perf_counter() - tstart
+        self.read_time += read
+        self.blocks += 1
+
+        self._adapt(read, consume)
+        self._fill()
+        self._last_return = _time.perf_counter()
+        return start, data
+
+    def stats(self):
+        """ Blocks, depth, stalls, and times (s) as a dictionary """
+        return {'blocks': self.blocks, 'depth': self.depth, 'peak_depth': self.peak_depth,
+                'stalls': self.stalls, 'stall_time': self.stall_time,
+                'read_time': self.read_time, 'consume_time': self.consume_time,
+                'read_per_block': self._read_avg, 'consume_per_block': self._consume_avg}
+
+    def close(self):
+        """ Cancel reads not started, wait for running ones, and close the file """
+        if self._executor is None:
+            return
+        self._finalizer()
+        self._executor = None
+        self._n_submitted = len(self.starts)
+
+def iter_frames(file, dset, pth=None, step=None, axis=0, depth=2, max_depth=16,
+                adaptive=True, workers=None, cache=None):
+    """
+    Iterate over a dataset in order, a block of frames at a time, with the
+    next blocks read ahead on background threads (see ReadAhead)
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Full dataset name with preprended group names
+
+    pth : str
+        Path
+
+    step : int
+        Frames (indices along axis) per block. If None, the dataset's chunk
+        size along axis (1 if not chunked).
+
+    axis : int
+        Axis of the frames
+
+    depth : int
+        Blocks read ahead (initial depth if adaptive)
+
+    max_depth : int
+        Maximum depth (bounds memory use to max_depth + 1 blocks)
+
+    adaptive : bool
+        Adapt the depth to the measured read time vs the consumer's time per
+        block
+
+    workers, cache :
+        Passed to load for each block
+
+    Returns
+    -------
+    ReadAhead : yields (start index, block ndarray). stats() reports the
+    stall time, depth, and read and consumer times.
+
+    Examples
+    --------
+    >>> with iter_frames('movie.h5', '/frames', depth=4) as frames:
+    ...     for start, block in frames:
+    ...         process(block)
+    ...     print(frames.stats()['stall_time'])
+    """
+    return ReadAhead(file, dset, pth=pth, step=step, axis=axis, depth=depth,
+                     max_depth=max_depth, adaptive=adaptive, workers=workers, cache=cache)
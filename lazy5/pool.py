@@ -0,0 +1,348 @@
+"""
+Reader pool: concurrent reads served by a pool of worker processes, for
+services handling many simultaneous requests (h5py serializes all calls
+within a process behind a global lock).
+
+Each worker keeps its own cache of open files. Requests are routed by file
+(a stable hash of the path), so repeated reads of a file hit the same
+worker and its open handle, metadata cache, and chunk cache. Files modified
+since they were opened are re-opened. Open handles hold HDF5 file locks:
+call release(file) before writing to a file the pool has read. Large arrays
+are returned through shared memory rather than pickled through a pipe.
+
+The pool is thread-safe: any number of threads may submit requests. The
+configuration of the submitting context (see lazy5.config.use_config) is
+applied to each request in the worker.
+
+Examples
+--------
+>>> with ReaderPool(workers=8) as pool:
+...     data = pool.load('run.h5', '/Spectra/Raw', slc=np.s_[:100])
+...     future = pool.submit('get_attrs_dset', 'run.h5', '/Spectra/Raw')
+...     attrs = future.result()
+"""
+import itertools as _itertools
+import multiprocessing as _multiprocessing
+import os as _os
+import pickle as _pickle
+import queue as _queue
+import threading as _threading
+import zlib as _zlib
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import Future as _Future
+from multiprocessing.shared_memory import SharedMemory as _SharedMemory
+
+import numpy as _np
+
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath)
+from .config import (get_config as _get_config, use_config as _use_config)
+from .load import (load as _load, load_where as _load_where, load_level as _load_level)
+from .inspect import (get_groups as _get_groups, get_datasets as _get_datasets,
+                      get_hierarchy as _get_hierarchy, get_attrs_dset as _get_attrs_dset)
+from .table import read_table as _read_table
+
+__all__ = ['ReaderPool', 'MACROS']
+
+# Read macros served by the pool: name -> function(file, ...)
+MACROS = _OrderedDict([['load', _load], ['load_where', _load_where],
+                       ['load_level', _load_level], ['get_groups', _get_groups],
+                       ['get_datasets', _get_datasets], ['get_hierarchy', _get_hierarchy],
+                       ['get_attrs_dset', _get_attrs_dset], ['read_table', _read_table]])
+
+class _Shared:
+    """ Descriptor of an array returned in a shared memory block """
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+def _pack(obj, inline_nbytes):
+    """ Replace arrays of at least inline_nbytes in obj (nested) by _Shared blocks """
+    if isinstance(obj, _np.ndarray) and (obj.nbytes >= max(inline_nbytes, 1)) and \
+            not obj.dtype.hasobject:
+        shm = _SharedMemory(create=True, size=obj.nbytes)
+        try:
+            _np.ndarray(obj.shape, dtype=obj.dtype, buffer=shm.buf)[...] = obj
+        finally:
+            shm.close()
+        return _Shared(shm.name, obj.shape, obj.dtype)
+    if isinstance(obj, (tuple, list)):
+        return type(obj)([_pack(val, inline_nbytes) for val in obj])
+    if isinstance(obj, dict):
+        return type(obj)([[key, _pack(val, inline_nbytes)] for key, val in obj.items()])
+    return obj
+
+def _unpack(obj):
+    """ Replace _Shared blocks in obj (nested) by arrays, releasing the blocks """
+    if isinstance(obj, _Shared):
+        shm = _SharedMemory(name=obj.name)
+        try:
+            return _np.ndarray(obj.shape, dtype=obj.dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+    if isinstance(obj, (tuple, list)):
+        return type(obj)([_unpack(val) for val in obj])
+    if isinstance(obj, dict):
+        return type(obj)([[key, _unpack(val)] for key, val in obj.items()])
+    return obj
+
+def _release(obj):
+    """ Release the shared memory blocks of an undelivered result """
+    if isinstance(obj, _Shared):
+        try:
+            shm = _SharedMemory(name=obj.name)
+            shm.close()
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    elif isinstance(obj, (tuple, list)):
+        for val in obj:
+            _release(val)
+    elif isinstance(obj, dict):
+        for val in obj.values():
+            _release(val)
+
+def _picklable(err):
+    """ err, or a RuntimeError describing it if it cannot be pickled """
+    try:
+        _pickle.dumps(err)
+        return err
+    except Exception:  # pylint:disable=broad-except
+        return RuntimeError(repr(err))
+
+def _open_cached(handles, filename, max_open):
+    """
+    Open file from a worker's cache of handles (LRU), re-opening it if it
+    was modified since it was opened
+    """
+    stat = _os.stat(filename)
+    key = (stat.st_mtime_ns, stat.st_size)
+    if filename in handles:
+        fid_key, fid = handles.pop(filename)
+        if (fid_key == key) and fid.id.valid:
+            handles[filename] = (fid_key, fid)
+            return fid
+        fid.close()
+    while len(handles) >= max_open:
+        _, (_, old_fid) = handles.popitem(last=False)
+        old_fid.close()
+    fid = _FidOrFile(filename).fid
+    handles[filename] = (key, fid)
+    return fid
+
+def _worker_main(requests, results, max_open, inline_nbytes):
+    """ Worker process: serve requests until a None request """
+    handles = _OrderedDict()
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            req_id, macro, filename, args, kwargs, config = request
+            if macro is None:  # Release
+                if filename in handles:
+                    handles.pop(filename)[1].close()
+                results.put((req_id, True, None))
+                continue
+            try:
+                with _use_config(config):
+                    fid = _open_cached(handles, filename, max_open)
+                    out = _pack(MACROS[macro](fid, *args, **kwargs), inline_nbytes)
+                results.put((req_id, True, out))
+            except Exception as err:  # pylint:disable=broad-except
+                results.put((req_id, False, _picklable(err)))
+    finally:
+        for _, fid in handles.values():
+            fid.close()
+
+class ReaderPool:
+    """
+    Pool of reader processes serving read macros (see MACROS)
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes. If None, number of CPUs.
+
+    max_open : int
+        Maximum number of files each worker keeps open
+
+    inline_nbytes : int
+        Arrays smaller than this (bytes) are returned through the result
+        queue; larger ones through shared memory
+
+    start_method : str
+        multiprocessing start method of the workers. 'spawn' (default) is
+        safe with open HDF5 files and threads in the parent process.
+
+    Attributes
+    ----------
+    workers : int
+        Number of worker processes
+    """
+    def __init__(self, workers=None, max_open=64, inline_nbytes=2**16, start_method='spawn'):
+        self.workers = workers if workers is not None else (_os.cpu_count() or 1)
+        self.inline_nbytes = inline_nbytes
+        ctx = _multiprocessing.get_context(start_method)
+        self._results = ctx.Queue()
+        self._requests = [ctx.Queue() for _ in range(self.workers)]
+        self._procs = [ctx.Process(target=_worker_main,
+                                   args=(requests, self._results, max_open, inline_nbytes),
+                                   daemon=True)
+                       for requests in self._requests]
+        for proc in self._procs:
+            proc.start()
+
+        self._ids = _itertools.count()
+        self._pending = {}  # req_id: (worker, Future)
+        self._lock = _threading.Lock()
+        self._closed = False
+        self._dispatcher = _threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def route(self, filename):
+        """ Worker (index) serving filename """
+        path = _os.path.abspath(filename)
+        return _zlib.crc32(path.encode()) % self.workers
+
+    def submit(self, macro, file, *args, pth=None, **kwargs):
+        """
+        Submit a read macro (e.g., 'load') of a file
+
+        Parameters
+        ----------
+        macro : str
+            Name of the macro (see MACROS)
+
+        file : str
+            Filename
+
+        *args, **kwargs
+            Arguments of the macro, after the file
+
+        pth : str
+            Path
+
+        Returns
+        -------
+        concurrent.futures.Future : Result of the macro
+        """
+        if (macro not in MACROS) and (macro is not None):
+            raise ValueError('Unknown macro {!r}. Available: {}'.format(macro, list(MACROS)))
+        if not isinstance(file, str):
+            raise TypeError('file needs to be a str (filename)')
+        filename = _os.path.abspath(_fullpath(file, pth))
+        worker = self.route(filename)
+        future = _Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('ReaderPool is closed')
+            req_id = next(self._ids)
+            self._pending[req_id] = (worker, future)
+        self._requests[worker].put((req_id, macro, filename, args, kwargs, _get_config()))
+        return future
+
+    def _dispatch(self):
+        """ Deliver results to their futures; fail the requests of dead workers """
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except _queue.Empty:
+                dead = [num for num, proc in enumerate(self._procs) if not proc.is_alive()]
+                if dead:
+                    with self._lock:
+                        failed = [[req_id, future] for req_id, (worker, future)
+                                  in self._pending.items() if worker in dead]
+                        for req_id, _ in failed:
+                            del self._pending[req_id]
+                    for _, future in failed:
+                        future.set_exception(RuntimeError('Reader process exited'))
+                with self._lock:
+                    if self._closed and not self._pending:
+                        return
+                continue
+            if message is None:
+                return
+            req_id, success, out = message
+            with self._lock:
+                _, future = self._pending.pop(req_id, (None, None))
+            if future is None:
+                _release(out)
+            elif not success:
+                future.set_exception(out)
+            else:
+                try:
+                    future.set_result(_unpack(out))
+                except Exception as err:  # pylint:disable=broad-except
+                    future.set_exception(err)
+
+    def call(self, macro, file, *args, pth=None, **kwargs):
+        """ Run a read macro (see submit) and return its result """
+        return self.submit(macro, file, *args, pth=pth, **kwargs).result()
+
+    @_instrument.timed('pool.ReaderPool.load')
+    def load(self, file, dset, pth=None, slc=None, **kwargs):
+        """ See lazy5.load.load """
+        data = self.call('load', file, dset, pth=pth, slc=slc, **kwargs)
+        _instrument.record('bytes_read', 'pool.ReaderPool.load', data.nbytes)
+        return data
+
+    @_instrument.timed('pool.ReaderPool.load_where')
+    def load_where(self, file, dset, where, pth=None, **kwargs):
+        """ See lazy5.load.load_where """
+        return self.call('load_where', file, dset, where, pth=pth, **kwargs)
+
+    @_instrument.timed('pool.ReaderPool.load_level')
+    def load_level(self, file, dset, shape, pth=None, slc=None):
+        """ See lazy5.load.load_level """
+        return self.call('load_level', file, dset, shape, pth=pth, slc=slc)
+
+    @_instrument.timed('pool.ReaderPool.get_groups')
+    def get_groups(self, file, pth=None, **kwargs):
+        """ See lazy5.inspect.get_groups """
+        return self.call('get_groups', file, pth=pth, **kwargs)
+
+    @_instrument.timed('pool.ReaderPool.get_datasets')
+    def get_datasets(self, file, pth=None, **kwargs):
+        """ See lazy5.inspect.get_datasets """
+        return self.call('get_datasets', file, pth=pth, **kwargs)
+
+    @_instrument.timed('pool.ReaderPool.get_hierarchy')
+    def get_hierarchy(self, file, pth=None, **kwargs):
+        """ See lazy5.inspect.get_hierarchy """
+        return self.call('get_hierarchy', file, pth=pth, **kwargs)
+
+    @_instrument.timed('pool.ReaderPool.get_attrs_dset')
+    def get_attrs_dset(self, file, dset, pth=None, **kwargs):
+        """ See lazy5.inspect.get_attrs_dset """
+        return self.call('get_attrs_dset', file, dset, pth=pth, **kwargs)
+
+    @_instrument.timed('pool.ReaderPool.read_table')
+    def read_table(self, file, table, pth=None, **kwargs):
+        """ See lazy5.table.read_table """
+        return self.call('read_table', file, table, pth=pth, **kwargs)
+
+    def release(self, file, pth=None):
+        """ Close the worker's handle of a file (e.g., before writing to it) """
+        self.submit(None, file, pth=pth).result()
+
+    def close(self):
+        """ Finish pending requests and stop the workers """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for requests in self._requests:
+            requests.put(None)
+        for proc in self._procs:
+            proc.join()
+        self._results.put(None)
+        self._dispatcher.join()
@@ -0,0 +1,282 @@
+"""
+Attribute query index: which datasets (in which files) have attributes
+matching conditions, without reading every dataset's attributes per query.
+
+The index holds each dataset's attributes and an inverted index (attribute
+key -> value -> datasets). It is persisted to a JSON sidecar file and
+refreshed incrementally: only files whose modification time changed are
+re-read.
+
+Examples
+--------
+>>> index = AttrIndex('runs.lazy5.json')
+>>> index.refresh(glob.glob('run*.h5'), workers=8)
+>>> index.save()
+>>> index.query(('Memo', 'contains', 'dark'), ('Exposure', '>', 10))
+[('run01.h5', '/Spectra/Raw'), ...]
+>>> index.query(*parse_conditions('Memo ~ dark, Exposure > 10'))
+"""
+import bisect as _bisect
+import json as _json
+import os as _os
+import re as _re
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+
+from . import instrument as _instrument
+from .utils import FidOrFile as _FidOrFile
+from .inspect import (get_datasets as _get_datasets, get_attrs_dset as _get_attrs_dset)
+
+__all__ = ['AttrIndex', 'parse_conditions', 'OPERATORS']
+
+OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'contains', 'exists')
+
+# parse_conditions symbols -> OPERATORS
+_SYMBOLS = {'=': '==', '==': '==', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>=',
+            '~': 'contains'}
+_CONDITION_RE = _re.compile(r'^\s*@?(?P<key>[^<>=!~]+?)\s*'
+                            r'(?:(?P<op>==|!=|<=|>=|=|<|>|~)\s*(?P<value>.*?))?\s*$')
+
+def _to_json(val):
+    """ Attribute value as a JSON-serializable value """
+    if hasattr(val, 'tolist'):
+        val = val.tolist()
+    if isinstance(val, bytes):
+        return val.decode('utf-8', 'replace')
+    if isinstance(val, complex):
+        return str(val)
+    if isinstance(val, (list, tuple)):
+        return [_to_json(item) for item in val]
+    if (val is None) or isinstance(val, (bool, int, float, str)):
+        return val
+    return str(val)
+
+def _hashable(val):
+    """ Index key of a (JSON) value """
+    if isinstance(val, list):
+        return tuple([_hashable(item) for item in val])
+    return val
+
+def _is_number(val):
+    return isinstance(val, (int, float)) and not isinstance(val, bool)
+
+def _scan_file(filename):
+    """ {dataset: {attribute: value}} of all datasets in filename """
+    fof = _FidOrFile(filename)
+    try:
+        dsets = {}
+        for dset in _get_datasets(fof.fid, fulldsetpath=True):
+            attrs = _get_attrs_dset(fof.fid, dset, convert_to_str=True,
+                                    convert_sgl_np_to_num=True)
+            dsets[dset] = dict([[key, _to_json(val)] for key, val in attrs.items()])
+        return dsets
+    finally:
+        fof.close_if_file_not_fid()
+
+def parse_conditions(text):
+    """
+    Parse conditions from text, e.g., 'Memo ~ dark, Exposure > 10'.
+
+    Conditions are separated by commas (or ' and '). Each is 'KEY OP VALUE'
+    with OP one of =, ==, !=, <, <=, >, >=, or ~ (contains), or a lone KEY
+    (attribute exists). A leading '@' on KEY is ignored. VALUE is parsed as
+    JSON if possible, otherwise it is a string.
+
+    Returns
+    -------
+    list : (key, operator, value) conditions for AttrIndex.query
+    """
+    conditions = []
+    for token in _re.split(r',|\s+and\s+', text):
+        if not token.strip():
+            continue
+        match = _CONDITION_RE.match(token)
+        if match is None:
+            raise ValueError('Cannot parse condition {!r}'.format(token))
+        if match.group('op') is None:
+            conditions.append((match.group('key'), 'exists', None))
+            continue
+        value = match.group('value')
+        try:
+            value = _json.loads(value)
+        except ValueError:
+            pass
+        conditions.append((match.group('key'), _SYMBOLS[match.group('op')], value))
+    return conditions
+
+class AttrIndex:
+    """
+    Inverted index of dataset attributes across files
+
+    Parameters
+    ----------
+    sidecar : str
+        JSON file the index is loaded from (if it exists) and saved to
+
+    Attributes
+    ----------
+    files : dict
+        {filename: {'mtime': float, 'dsets': {dataset: {attribute: value}}}}
+    """
+    def __init__(self, sidecar=None):
+        self.sidecar = sidecar
+        self.files = {}
+        self._postings = {}
+        self._numeric = {}
+        if (sidecar is not None) and _os.path.isfile(sidecar):
+            with open(sidecar) as fid:
+                self.files = _json.load(fid)['files']
+            for filename in self.files:
+                self._add_postings(filename)
+
+    def __len__(self):
+        """ Number of indexed datasets """
+        return sum([len(entry['dsets']) for entry in self.files.values()])
+
+    def _add_postings(self, filename):
+        for dset, attrs in self.files[filename]['dsets'].items():
+            for key, val in attrs.items():
+                self._postings.setdefault(key, {}).setdefault(_hashable(val),
+                                                              set()).add((filename, dset))
+        self._numeric = {}
+
+    def _remove_postings(self, filename):
+        for dset, attrs in self.files[filename]['dsets'].items():
+            for key, val in attrs.items():
+                values = self._postings[key]
+                hval = _hashable(val)
+                values[hval].discard((filename, dset))
+                if not values[hval]:
+                    del values[hval]
+                if not values:
+                    del self._postings[key]
+        self._numeric = {}
+
+    @_instrument.timed('query.AttrIndex.refresh')
+    def refresh(self, files=None, workers=None):
+        """
+        (Re-)index files that are new or modified since they were indexed,
+        and drop indexed files that no longer exist.
+
+        Parameters
+        ----------
+        files : list of str
+            Files to add to (or update in) the index. If None, the files
+            already indexed.
+
+        workers : int
+            If > 1, read files in a pool of processes
+
+        Returns
+        -------
+        int : Number of files (re-)read
+        """
+        for filename in [fp for fp in self.files if not _os.path.isfile(fp)]:
+            self._remove_postings(filename)
+            del self.files[filename]
+
+        if files is None:
+            files = list(self.files)
+        stale = []
+        for filename in files:
+            mtime = _os.path.getmtime(filename)
+            if (filename not in self.files) or (self.files[filename]['mtime'] != mtime):
+                stale.append((filename, mtime))
+
+        if (workers is not None) and (workers > 1) and (len(stale) > 1):
+            with _ProcessPoolExecutor(max_workers=workers) as executor:
+                scans = list(executor.map(_scan_file, [filename for filename, _ in stale]))
+        else:
+            scans = [_scan_file(filename) for filename, _ in stale]
+
+        for (filename, mtime), dsets in zip(stale, scans):
+            if filename in self.files:
+                self._remove_postings(filename)
+            self.files[filename] = {'mtime': mtime, 'dsets': dsets}
+            self._add_postings(filename)
+        return len(stale)
+
+    def save(self, sidecar=None):
+        """ Write the index to the sidecar (JSON) file """
+        sidecar = self.sidecar if sidecar is None else sidecar
+        if sidecar is None:
+            raise ValueError('No sidecar filename given')
+        tmp = sidecar + '.tmp'
+        with open(tmp, 'w') as fid:
+            _json.dump({'version': 1, 'files': self.files}, fid)
+        _os.replace(tmp, sidecar)
+
+    def attrs(self, filename, dset):
+        """ Indexed attributes of a dataset """
+        return self.files[filename]['dsets'][dset]
+
+    def _numeric_values(self, key):
+        """ Sorted distinct numeric values of attribute key """
+        if key not in self._numeric:
+            self._numeric[key] = sorted([val for val in self._postings.get(key, {})
+                                         if _is_number(val)])
+        return self._numeric[key]
+
+    def _match(self, key, operator, value):
+        """ Set of (file, dset) satisfying one condition """
+        values = self._postings.get(key, {})
+        out = set()
+        if operator == 'exists':
+            for matches in values.values():
+                out |= matches
+        elif operator == '==':
+            out |= values.get(_hashable(_to_json(value)), set())
+        elif operator == '!=':
+            hval = _hashable(_to_json(value))
+            for val, matches in values.items():
+                if val != hval:
+                    out |= matches
+        elif operator in ('<', '<=', '>', '>='):
+            if not _is_number(value):
+                raise TypeError('Range condition on {} needs a number, not {!r}'.format(key,
+                                                                                   value))
+            numeric = self._numeric_values(key)
+            if operator == '<':
+                selected = numeric[:_bisect.bisect_left(numeric, value)]
+            elif operator == '<=':
+                selected = numeric[:_bisect.bisect_right(numeric, value)]
+            elif operator == '>':
+                selected = numeric[_bisect.bisect_right(numeric, value):]
+            else:
+                selected = numeric[_bisect.bisect_left(numeric, value):]
+            for val in selected:
+                out |= values[val]
+        elif operator == 'contains':
+            needle = str(value)
+            for val, matches in values.items():
+                if isinstance(val, str) and (needle in val):
+                    out |= matches
+        else:
+            raise ValueError('Unknown operator {!r}. Available: {}'.format(operator, OPERATORS))
+        return out
+
+    @_instrument.timed('query.AttrIndex.query')
+    def query(self, *conditions):
+        """
+        Datasets whose attributes satisfy all conditions
+
+        Parameters
+        ----------
+        *conditions : (key, operator, value)
+            operator is one of OPERATORS ('contains': substring of a string
+            attribute; 'exists': value is ignored). See also
+            parse_conditions.
+
+        Returns
+        -------
+        list : sorted (file, dataset) pairs
+        """
+        out = None
+        for key, operator, value in conditions:
+            matches = self._match(key, operator, value)
+            out = matches if out is None else (out & matches)
+            if not out:
+                break
+        if out is None:  # No conditions: everything
+            out = set([(filename, dset) for filename, entry in self.files.items()
+                       for dset in entry['dsets']])
+        return sorted(out)
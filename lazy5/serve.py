@@ -0,0 +1,610 @@
+"""
+HTTP server exposing the files of a directory (hierarchies, attributes,
+and hyperslab reads) to remote clients, and a matching client with the
+inspect and read API of lazy5, so that machines can browse a shared HDF5
+store without copying files.
+
+Arrays are transferred as raw bytes (dtype and shape in headers), gzipped
+when the client accepts it. The client caches chunk-aligned blocks of the
+datasets it reads (LRU, size-bounded), so overlapping or repeated reads
+(e.g., scrolling through an image stack) only transfer missing blocks.
+Cached blocks are invalidated when a file's modification time or size
+changes.
+
+The server listens on a TCP port or a Unix socket. It serves files under
+its root directory only, read-only.
+
+Examples
+--------
+>>> server = HdfServer('/data/store', port=8765).start()  # Or: lazy5 serve
+
+>>> client = HdfClient('http://analysis01:8765')
+>>> client.get_hierarchy('run01.h5')
+>>> data = client.load('run01.h5', '/Spectra/Raw', slc=np.s_[:, 100:200])
+
+>>> server = HdfServer('/data/store', unix_socket='/tmp/lazy5.sock').start()
+>>> client = HdfClient('unix:///tmp/lazy5.sock')
+"""
+import base64 as _base64
+import gzip as _gzip
+import http.client as _http_client
+import json as _json
+import os as _os
+import socket as _socket
+import socketserver as _socketserver
+import stat as _stat
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+from http.server import (BaseHTTPRequestHandler as _BaseHTTPRequestHandler,
+                         ThreadingHTTPServer as _ThreadingHTTPServer)
+from urllib.parse import (urlencode as _urlencode, urlsplit as _urlsplit,
+                          parse_qsl as _parse_qsl, quote as _quote, unquote as _unquote)
+
+import h5py as _h5py
+import numpy as _np
+
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    compound_to_complex as _compound_to_complex)
+from .load import (load as _load, _selection_bounds)
+from .inspect import (get_groups as _get_groups, get_datasets as _get_datasets,
+                      get_hierarchy as _get_hierarchy, get_attrs_dset as _get_attrs_dset)
+from .chunks import (chunk_offsets as _chunk_offsets, chunk_selection as _chunk_selection)
+from .create import DEDUP_ATTR as _DEDUP_ATTR, COMPLEX_ATTR as _COMPLEX_ATTR
+
+__all__ = ['HdfServer', 'HdfClient', 'format_selection', 'parse_selection']
+
+# Responses smaller than this (bytes) are not gzipped
+_GZIP_MIN_NBYTES = 1024
+
+# HDF5 file extensions listed by /files
+_EXTENSIONS = ('.h5', '.hdf5', '.hdf', '.he5', '.nxs')
+
+def format_selection(slc):
+    """ Selection (slice, int, Ellipsis, or tuple thereof) as text, e.g., '0:10,5,...' """
+    if slc is None:
+        return ''
+    if not isinstance(slc, tuple):
+        slc = (slc,)
+    out = []
+    for sl in slc:
+        if sl is Ellipsis:
+            out.append('...')
+        elif isinstance(sl, slice):
+            out.append(':'.join(['' if val is None else str(int(val))
+                                 for val in (sl.start, sl.stop, sl.step)]))
+        elif isinstance(sl, (int, _np.integer)):
+            out.append(str(int(sl)))
+        else:
+            raise TypeError('Only slices, integers, and Ellipsis can be served: {!r}'.format(sl))
+    return ','.join(out)
+
+def parse_selection(text):
+    """ Selection from format_selection text (None if empty) """
+    if not text:
+        return None
+    out = []
+    for item in text.split(','):
+        if item == '...':
+            out.append(Ellipsis)
+        elif ':' in item:
+            out.append(slice(*[int(val) if val else None for val in item.split(':')]))
+        else:
+            out.append(int(item))
+    return tuple(out)
+
+def _encode(val):
+    """ Attribute value as JSON, with arrays, bytes, and complex values tagged """
+    if isinstance(val, (_np.ndarray, _np.generic)) and not isinstance(val, (_np.str_,
+                                                                             _np.bytes_)):
+        arr = _np.asarray(val)
+        if arr.dtype.hasobject:
+            return {'__objects__': [_encode(item) for item in arr.ravel().tolist()],
+                    'shape': list(arr.shape)}
+        return {'__ndarray__': _base64.b64encode(_np.ascontiguousarray(arr).tobytes()).decode(),
+                'dtype': _np.lib.format.dtype_to_descr(arr.dtype), 'shape': list(arr.shape),
+                'scalar': isinstance(val, _np.generic)}
+    if isinstance(val, (bytes, _np.bytes_)):
+        return {'__bytes__': _base64.b64encode(bytes(val)).decode()}
+    if isinstance(val, complex):
+        return {'__complex__': [val.real, val.imag]}
+    if isinstance(val, (list, tuple)):
+        return [_encode(item) for item in val]
+    if isinstance(val, dict):
+        return _OrderedDict([[key, _encode(item)] for key, item in val.items()])
+    return val
+
+def _decode(obj):
+    """ Inverse of _encode (a json object_pairs_hook) """
+    obj = _OrderedDict(obj)
+    if '__ndarray__' in obj:
+        dtype = _np.lib.format.descr_to_dtype(_json_descr(obj['dtype']))
+        arr = _np.frombuffer(_base64.b64decode(obj['__ndarray__']),
+                             dtype=dtype).reshape(obj['shape']).copy()
+        return arr[()] if obj['scalar'] else arr
+    if '__objects__' in obj:
+        arr = _np.empty(len(obj['__objects__']), dtype=object)
+        arr[:] = obj['__objects__']
+        return arr.reshape(obj['shape'])
+    if '__bytes__' in obj:
+        return _base64.b64decode(obj['__bytes__'])
+    if '__complex__' in obj:
+        return complex(*obj['__complex__'])
+    return obj
+
+def _json_descr(descr):
+    """ numpy dtype descr from JSON (lists -> tuples for fields) """
+    if isinstance(descr, list):
+        return [tuple([_json_descr(item) if isinstance(item, list) else item
+                       for item in field]) for field in descr]
+    return descr
+
+def _file_version(filename):
+    """ Identity of a file's content: modification time and size """
+    stat = _os.stat(filename)
+    return '{}-{}'.format(stat.st_mtime_ns, stat.st_size)
+
+class _Handler(_BaseHTTPRequestHandler):
+    """ Request handler of HdfServer (self.server.root: served directory) """
+    protocol_version = 'HTTP/1.1'
+    timeout = 300  # Idle keep-alive connections (s)
+
+    def log_message(self, format, *args):  # pylint:disable=redefined-builtin
+        pass
+
+    def address_string(self):
+        return str(self.client_address)
+
+    def _resolve(self, params):
+        """ Full path of the file parameter, which must be under the server root """
+        if 'file' not in params:
+            raise ValueError('Missing parameter: file')
+        root = self.server.root
+        filename = _os.path.realpath(_os.path.join(root, params['file']))
+        if _os.path.commonpath([root, filename]) != root:
+            raise PermissionError('File {} is outside of the served directory'.format(
+                params['file']))
+        if not _os.path.isfile(filename):
+            raise FileNotFoundError('No file {}'.format(params['file']))
+        return filename
+
+    def _send(self, code, body, content_type, headers=None):
+        gzipped = ((len(body) >= _GZIP_MIN_NBYTES) and
+                   ('gzip' in self.headers.get('Accept-Encoding', '')))
+        if gzipped:
+            body = _gzip.compress(body, compresslevel=1)
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, obj, headers=None):
+        self._send(200, _json.dumps(_encode(obj)).encode(), 'application/json', headers)
+
+    def do_GET(self):  # pylint:disable=invalid-name
+        """ Serve /files, /groups, /datasets, /hierarchy, /attrs, /info, or /read """
+        url = _urlsplit(self.path)
+        params = dict(_parse_qsl(url.query))
+        flags = dict([[key, params.get(key) == '1']
+                      for key in ('fulldsetpath', 'grp_w_dset', 'convert_to_str',
+                                  'convert_sgl_np_to_num')])
+        try:
+            if url.path == '/files':
+                self._send_json(self.server.list_files())
+                return
+            filename = self._resolve(params)
+            version = {'X-Lazy5-Version': _file_version(filename)}
+            fof = _FidOrFile(filename)
+            try:
+                fid = fof.fid
+                if url.path == '/groups':
+                    self._send_json(_get_groups(fid), version)
+                elif url.path == '/datasets':
+                    self._send_json(_get_datasets(fid, fulldsetpath=flags['fulldsetpath']),
+                                    version)
+                elif url.path == '/hierarchy':
+                    self._send_json(_get_hierarchy(fid, fulldsetpath=flags['fulldsetpath'],
+                                                   grp_w_dset=flags['grp_w_dset']), version)
+                elif url.path == '/attrs':
+                    self._send_json(_get_attrs_dset(
+                        fid, params['dset'], convert_to_str=flags['convert_to_str'],
+                        convert_sgl_np_to_num=flags['convert_sgl_np_to_num']), version)
+                elif url.path == '/info':
+                    self._send_json(self.server.dset_info(fid, params['dset']), version)
+                elif url.path == '/read':
+                    data = _np.asarray(_load(fid, params['dset'],
+                                             slc=parse_selection(params.get('slc'))))
+                    if data.dtype.hasobject:
+                        raise TypeError('Dataset {} has variable-length data'.format(
+                            params['dset']))
+                    version['X-Lazy5-Dtype'] = _json.dumps(
+                        _np.lib.format.dtype_to_descr(data.dtype))
+                    version['X-Lazy5-Shape'] = _json.dumps(list(data.shape))
+                    self._send(200, _np.ascontiguousarray(data).tobytes(),
+                               'application/octet-stream', version)
+                    _instrument.record('bytes_read', 'serve.HdfServer', data.nbytes)
+                else:
+                    raise FileNotFoundError('Unknown request {}'.format(url.path))
+            finally:
+                fof.close_if_file_not_fid()
+        except Exception as err:  # pylint:disable=broad-except
+            if isinstance(err, (KeyError, FileNotFoundError)):
+                code = 404
+            elif isinstance(err, PermissionError):
+                code = 403
+            elif isinstance(err, (ValueError, TypeError, IndexError)):
+                code = 400
+            else:
+                code = 500
+            body = {'error': type(err).__name__, 'message': str(err)}
+            self._send(code, _json.dumps(body).encode(), 'application/json')
+
+class _TcpServer(_ThreadingHTTPServer):
+    daemon_threads = True
+
+class _UnixServer(_socketserver.ThreadingMixIn, _socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class HdfServer:
+    """
+    HTTP server of the HDF5 files under a directory
+
+    Parameters
+    ----------
+    root : str
+        Served directory. Files outside of it are not accessible.
+
+    host : str
+        Interface to listen on (TCP). Default: localhost only.
+
+    port : int
+        TCP port. If 0, any free port (see url).
+
+    unix_socket : str
+        Listen on this Unix socket instead of TCP. A stale socket at this
+        path is replaced; any other existing file raises FileExistsError.
+
+    Attributes
+    ----------
+    url : str
+        URL to give HdfClient, e.g., 'http://127.0.0.1:8765' or
+        'unix:///tmp/lazy5.sock'
+    """
+    def __init__(self, root, host='127.0.0.1', port=8765, unix_socket=None):
+        if unix_socket is not None:
+            if _os.path.exists(unix_socket):
+                if not _stat.S_ISSOCK(_os.stat(unix_socket).st_mode):
+                    raise FileExistsError('{} exists and is not a socket'.format(unix_socket))
+                _os.remove(unix_socket)
+            self._server = _UnixServer(unix_socket, _Handler)
+            self.url = 'unix://' + _quote(_os.path.abspath(unix_socket))
+        else:
+            self._server = _TcpServer((host, port), _Handler)
+            self.url = 'http://{}:{}'.format(*self._server.server_address[:2])
+        self.unix_socket = unix_socket
+        self._server.root = _os.path.realpath(root)
+        self._server.list_files = self.list_files
+        self._server.dset_info = self.dset_info
+        self._thread = None
+
+    def list_files(self):
+        """ Paths (relative to root) of the HDF5 files under root """
+        root = self._server.root
+        out = []
+        for dirpath, _, filenames in _os.walk(root):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(_EXTENSIONS):
+                    out.append(_os.path.relpath(_os.path.join(dirpath, filename), root))
+        return sorted(out)
+
+    @staticmethod
+    def dset_info(fid, dset):
+        """
+        Shape, dtype (as read), and chunks of a dataset. cacheable is False
+        for data stored in a layout that load transforms (e.g., split
+        complex, deduplicated), which clients read without block caching.
+        """
+        dset_id = fid[dset]
+        cacheable = (isinstance(dset_id, _h5py.Dataset) and
+                     (_COMPLEX_ATTR not in dset_id.attrs) and (_DEDUP_ATTR not in dset_id.attrs))
+        if not cacheable:
+            return {'cacheable': False}
+        dtype = _compound_to_complex(_np.zeros(0, dtype=dset_id.dtype)).dtype
+        return {'cacheable': not dtype.hasobject, 'shape': list(dset_id.shape),
+                'dtype': _np.lib.format.dtype_to_descr(dtype),
+                'chunks': None if dset_id.chunks is None else list(dset_id.chunks)}
+
+    def serve_forever(self):
+        """ Serve until close (blocking) """
+        self._server.serve_forever()
+
+    def start(self):
+        """ Serve in a background thread. Returns self. """
+        self._thread = _threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """ Stop serving """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        if (self.unix_socket is not None) and _os.path.exists(self.unix_socket):
+            _os.remove(self.unix_socket)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class _UnixConnection(_http_client.HTTPConnection):
+    """ HTTP connection over a Unix socket """
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+# Exceptions raised by HdfClient for server errors
+_ERRORS = {'KeyError': KeyError, 'FileNotFoundError': FileNotFoundError,
+           'PermissionError': PermissionError, 'ValueError': ValueError,
+           'TypeError': TypeError, 'IndexError': IndexError}
+
+def _block_shape(shape, itemsize, nbytes=2**20):
+    """ Cache block of a contiguous dataset: whole trailing axes, ~nbytes of rows """
+    if not shape:
+        return ()
+    row_nbytes = max(int(_np.prod(shape[1:])) * itemsize, 1)
+    return (max(min(nbytes // row_nbytes, shape[0]), 1),) + tuple(shape[1:])
+
+def _coalesce_blocks(missing, blocks, shape, gap_blocks):
+    """
+    Boxes of blocks covering the missing ones, each fetched by one request
+
+    Boxes of one block each are merged along each axis (last first) with the
+    boxes that span the same blocks along the other axes, across gaps of
+    blocks that are not missing when the gap holds at most gap_blocks
+    blocks (the over-transfer of the merge).
+
+    Returns
+    -------
+    list of tuple : ((start, stop), ...) per box, in elements
+    """
+    boxes = [tuple([(off // blk, off // blk + 1) for off, blk in zip(offset, blocks)])
+             for offset in missing]
+    for axis in reversed(range(len(shape))):
+        rows = _OrderedDict()
+        for box in sorted(boxes, key=lambda x: x[axis]):
+            rows.setdefault(box[:axis] + box[axis + 1:], []).append(box)
+        boxes = []
+        for row in rows.values():
+            other = int(_np.prod([stop - start for num, (start, stop) in enumerate(row[0])
+                                  if num != axis]))
+            merged = [row[0]]
+            for box in row[1:]:
+                last = merged[-1]
+                if (box[axis][0] - last[axis][1]) * other <= gap_blocks:
+                    merged[-1] = (last[:axis] + ((last[axis][0], box[axis][1]),) +
+                                  last[axis + 1:])
+                else:
+                    merged.append(box)
+            boxes.extend(merged)
+    return [tuple([(start * blk, min(stop * blk, dim))
+                   for (start, stop), blk, dim in zip(box, blocks, shape)])
+            for box in boxes]
+
+class HdfClient:
+    """
+    Client of an HdfServer, with the inspect and read macros of lazy5.
+    Files are named relative to the server's root. Thread-safe.
+
+    Parameters
+    ----------
+    url : str
+        Server URL, e.g., 'http://host:8765' or 'unix:///tmp/lazy5.sock'
+
+    cache_nbytes : int
+        Size (bytes) of the cache of chunk-aligned blocks. 0: no caching.
+
+    compress : bool
+        Request gzip-compressed responses (for slow networks). If None,
+        only for servers on other hosts (not Unix sockets or loopback).
+
+    timeout : float
+        Socket timeout (s)
+
+    gap_nbytes : int
+        Maximum size (bytes) of already-cached blocks re-transferred to merge
+        two requests of missing blocks into one. 0: only adjacent missing
+        blocks are requested together.
+    """
+    def __init__(self, url, cache_nbytes=2**28, compress=None, timeout=60,
+                 gap_nbytes=2**20):
+        parts = _urlsplit(url)
+        if compress is None:
+            compress = ((parts.scheme != 'unix') and
+                        (parts.hostname not in ('localhost', '127.0.0.1', '::1')))
+        if parts.scheme == 'unix':
+            self._connect = lambda: _UnixConnection(_unquote(parts.path), timeout=timeout)
+        elif parts.scheme == 'http':
+            self._connect = lambda: _http_client.HTTPConnection(parts.hostname, parts.port,
+                                                                timeout=timeout)
+        else:
+            raise ValueError('URL scheme must be http or unix, not {!r}'.format(parts.scheme))
+        self.url = url
+        self.cache_nbytes = cache_nbytes
+        self.compress = compress
+        self.gap_nbytes = gap_nbytes
+        self._local = _threading.local()
+        self._lock = _threading.Lock()
+        self._cache = _OrderedDict()  # (file, version, dset, offset): block
+        self._cached_nbytes = 0
+
+    def _request(self, path, **params):
+        """ (body, headers) of a GET request. Raises the server's error. """
+        query = _urlencode(dict([[key, val] for key, val in params.items() if val is not None]))
+        headers = {'Accept-Encoding': 'gzip'} if self.compress else {}
+        for attempt in range(2):  # Retry once on a stale keep-alive connection
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.request('GET', path + '?' + query, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                break
+            except (_http_client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        _instrument.record('bytes_read', 'serve.HdfClient', len(body))
+        if resp.getheader('Content-Encoding') == 'gzip':
+            body = _gzip.decompress(body)
+        if resp.status != 200:
+            err = _json.loads(body.decode())
+            raise _ERRORS.get(err['error'], IOError)(err['message'])
+        return body, resp
+
+    def _json(self, path, **params):
+        body, _ = self._request(path, **params)
+        return _json.loads(body.decode(), object_pairs_hook=_decode)
+
+    def list_files(self):
+        """ Files (relative to the server's root) """
+        return self._json('/files')
+
+    def get_groups(self, file, pth=None):
+        """ See lazy5.inspect.get_groups """
+        return self._json('/groups', file=_fullpath(file, pth))
+
+    def get_datasets(self, file, pth=None, fulldsetpath=True):
+        """ See lazy5.inspect.get_datasets """
+        return self._json('/datasets', file=_fullpath(file, pth),
+                          fulldsetpath=int(fulldsetpath))
+
+    def get_hierarchy(self, file, pth=None, fulldsetpath=False, grp_w_dset=False):
+        """ See lazy5.inspect.get_hierarchy """
+        return self._json('/hierarchy', file=_fullpath(file, pth),
+                          fulldsetpath=int(fulldsetpath), grp_w_dset=int(grp_w_dset))
+
+    def get_attrs_dset(self, file, dset, pth=None, convert_to_str=True,
+                       convert_sgl_np_to_num=False):
+        """ See lazy5.inspect.get_attrs_dset """
+        return self._json('/attrs', file=_fullpath(file, pth), dset=dset,
+                          convert_to_str=int(convert_to_str),
+                          convert_sgl_np_to_num=int(convert_sgl_np_to_num))
+
+    def _read(self, file, dset, slc):
+        """ Array read by the server and the file's version """
+        body, resp = self._request('/read', file=file, dset=dset, slc=format_selection(slc))
+        dtype = _np.lib.format.descr_to_dtype(_json_descr(_json.loads(
+            resp.getheader('X-Lazy5-Dtype'))))
+        shape = _json.loads(resp.getheader('X-Lazy5-Shape'))
+        data = _np.frombuffer(body, dtype=dtype).reshape(shape)
+        return data, resp.getheader('X-Lazy5-Version')
+
+    def _cache_get(self, key):
+        with self._lock:
+            block = self._cache.pop(key, None)
+            if block is not None:
+                self._cache[key] = block
+        _instrument.record('cache_hit' if block is not None else 'cache_miss',
+                           'serve.HdfClient', 1)
+        return block
+
+    def _cache_put(self, key, block):
+        if block.nbytes > self.cache_nbytes:
+            return
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cached_nbytes -= old.nbytes
+            self._cache[key] = block
+            self._cached_nbytes += block.nbytes
+            while self._cached_nbytes > self.cache_nbytes:
+                _, old = self._cache.popitem(last=False)
+                self._cached_nbytes -= old.nbytes
+
+    def clear_cache(self):
+        """ Drop all cached blocks """
+        with self._lock:
+            self._cache.clear()
+            self._cached_nbytes = 0
+
+    @_instrument.timed('serve.HdfClient.load')
+    def load(self, file, dset, pth=None, slc=None):
+        """
+        Load a dataset (or a selection of one). See lazy5.load.load.
+
+        Simple hyperslabs are assembled from cached chunk-aligned blocks;
+        only missing blocks are requested, in boxes of adjacent blocks (or
+        across gaps of cached blocks of at most gap_nbytes). Other selections
+        are read by the server directly.
+        """
+        file = _fullpath(file, pth)
+        if self.cache_nbytes <= 0:
+            return self._read(file, dset, slc)[0].copy()
+
+        body, resp = self._request('/info', file=file, dset=dset)
+        info = _json.loads(body.decode())
+        version = resp.getheader('X-Lazy5-Version')
+        shape = tuple(info.get('shape', ()))
+        bounds = _selection_bounds(slc, shape) if info['cacheable'] else None
+        if (bounds is None) or (not shape):
+            return self._read(file, dset, slc)[0].copy()
+
+        selection, drop_axes = bounds
+        dtype = _np.lib.format.descr_to_dtype(_json_descr(info['dtype']))
+        blocks = (tuple(info['chunks']) if info['chunks'] else
+                  _block_shape(shape, dtype.itemsize))
+        offsets = list(_chunk_offsets(shape, blocks, selection))
+        found = {}
+        for offset in offsets:
+            block = self._cache_get((file, version, dset, offset))
+            if block is not None:
+                found[offset] = block
+
+        missing = [offset for offset in offsets if offset not in found]
+        block_nbytes = max(int(_np.prod(blocks)) * dtype.itemsize, 1)
+        for box in _coalesce_blocks(missing, blocks, shape, self.gap_nbytes // block_nbytes):
+            data, box_version = self._read(file, dset, tuple([slice(start, stop)
+                                                              for start, stop in box]))
+            for offset in _chunk_offsets(shape, blocks, box):
+                block = data[tuple([slice(off - start, min(off + blk, dim) - start)
+                                    for off, (start, _), blk, dim in zip(offset, box, blocks,
+                                                                         shape)])]
+                block = block.copy()
+                if offset not in found:
+                    found[offset] = block
+                if box_version == version:
+                    self._cache_put((file, version, dset, offset), block)
+
+        out = _np.empty([stop - start for start, stop in selection], dtype=dtype)
+        for offset in offsets:
+            slc_block, slc_out = _chunk_selection(offset, blocks, selection)
+            out[slc_out] = found[offset][slc_block]
+        if drop_axes:
+            out = out.reshape([dim for axis, dim in enumerate(out.shape)
+                               if axis not in drop_axes])
+        return out
+
+    def close(self):
+        """ Close this thread's connection """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
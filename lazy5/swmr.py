@@ -0,0 +1,223 @@
+""" Macros for single-writer multiple-reader (SWMR) HDF5 files """
+import time as _time
+
+import h5py as _h5py
+import numpy as _np
+
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    complex_to_compound as _complex_to_compound,
+                    compound_to_complex as _compound_to_complex)
+from .alter import (write_attr_dict as _write_attr_dict)
+
+__all__ = ['SwmrWriter', 'read_new_rows', 'follow']
+
+class SwmrWriter:
+    """
+    Writer that appends rows to growing datasets of an HDF5 file while
+    readers (see lazy5.swmr.follow) watch it.
+
+    HDF5 does not allow new groups or datasets to be created once SWMR
+    writing is enabled; thus, all datasets must be added with
+    require_dataset prior to calling start.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for HDF5 file. If a File-object, it must have
+        been opened with libver='latest'.
+
+    pth : str
+        Path
+
+    mode : str
+        If opening a file, open with mode. Available: r+,w,w-,x,a
+
+    Attributes
+    ----------
+    fid : h5py.File object
+        File ID
+
+    started : bool
+        Has SWMR writing been enabled
+    """
+    def __init__(self, file, pth=None, mode='a'):
+        if mode == 'r':
+            raise ValueError('SwmrWriter cannot open a file in read-only mode')
+        fp = _fullpath(file, pth)
+        self._fof = _FidOrFile(fp, mode=mode, swmr=True)
+        self.fid = self._fof.fid
+        self.started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def require_dataset(self, dset, row_shape, dtype, chunk_rows=None, attr_dict=None):
+        """
+        Create (or return existing) resizable dataset that grows along the
+        first axis.
+
+        Parameters
+        ----------
+        dset : str
+            Dataset name (including groups if any)
+
+        row_shape : tuple
+            Shape of a single row (all axes except the first)
+
+        dtype : numpy.dtype
+            Data type
+
+        chunk_rows : int
+            Number of rows per chunk. If None, chunks of ~1 MiB.
+
+        attr_dict : dict
+            Attribute dictionary
+
+        Returns
+        -------
+        h5py.Dataset
+        """
+        if self.started:
+            raise IOError('Cannot create datasets after SWMR writing has started')
+
+        row_shape = tuple(row_shape)
+        dtype = _complex_to_compound(_np.zeros((), dtype=dtype)).dtype
+        if chunk_rows is None:
+            row_nbytes = max(int(_np.prod(row_shape)) * dtype.itemsize, 1)
+            chunk_rows = max(2**20 // row_nbytes, 1)
+
+        if dset in self.fid:
+            dset_id = self.fid[dset]
+            if dset_id.shape[1:] != row_shape:
+                err_str1 = 'Dataset {} exists with row shape {}, '.format(dset, dset_id.shape[1:])
+                raise TypeError(err_str1 + 'not {}'.format(row_shape))
+        else:
+            dset_id = self.fid.create_dataset(dset, shape=(0,) + row_shape, dtype=dtype,
+                                              maxshape=(None,) + row_shape,
+                                              chunks=(chunk_rows,) + row_shape)
+        if attr_dict:
+            _write_attr_dict(dset_id, attr_dict)
+        return dset_id
+
+    def start(self):
+        """ Enable SWMR writing. Readers may open the file hereafter """
+        if not self.started:
+            self.fid.swmr_mode = True
+            self.started = True
+
+    @_instrument.timed('swmr.SwmrWriter.append')
+    def append(self, dset, data, flush=True):
+        """
+        Append rows to a dataset. If SWMR writing has not been started, it
+        will be.
+
+        Parameters
+        ----------
+        dset : str
+            Dataset name (including groups if any)
+
+        data : ndarray
+            Rows to append. A single row (ndim one less than the dataset) is
+            also accepted.
+
+        flush : bool
+            Flush the dataset so readers see the new rows immediately
+
+        Returns
+        -------
+        int : Number of rows in the dataset after appending
+        """
+        self.start()
+        dset_id = self.fid[dset]
+        data = _complex_to_compound(_np.asarray(data))
+        if data.ndim == dset_id.ndim - 1:
+            data = data[None]
+
+        n_old = dset_id.shape[0]
+        n_new = n_old + data.shape[0]
+        dset_id.resize(n_new, axis=0)
+        dset_id[n_old:n_new] = data
+        if flush:
+            dset_id.flush()
+        _instrument.record('bytes_written', 'swmr.SwmrWriter.append', data.nbytes)
+        return n_new
+
+    def close(self):
+        """ Close the file if originally a filename (not a fid) was passed """
+        return self._fof.close_if_file_not_fid()
+
+@_instrument.timed('swmr.read_new_rows')
+def read_new_rows(dset, start=0):
+    """
+    Refresh a dataset opened by a SWMR reader and return the rows appended
+    since start.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        Dataset-object from a file opened for SWMR reading
+
+    start : int
+        Number of rows already consumed
+
+    Returns
+    -------
+    (ndarray, int) : New rows (possibly empty) and updated row count
+    """
+    dset.refresh()
+    n_rows = dset.shape[0]
+    if n_rows <= start:
+        return _compound_to_complex(dset[0:0]), start
+    rows = _compound_to_complex(dset[start:n_rows])
+    _instrument.record('bytes_read', 'swmr.read_new_rows', rows.nbytes)
+    return rows, n_rows
+
+def follow(file, dset, pth=None, start=0, interval=0.1, timeout=None):
+    """
+    Generator that tails a growing dataset, yielding only newly appended rows.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for an HDF5 file opened for SWMR reading
+
+    dset : str
+        Full dataset name with preprended group names. E.g., '/Group1/Dataset'
+
+    pth : str
+        Path
+
+    start : int
+        Row to start from. Rows prior to start are not yielded.
+
+    interval : float
+        Polling interval (seconds)
+
+    timeout : float
+        Stop when no new rows have appeared for timeout seconds. If None,
+        follow until the generator is closed.
+
+    Yields
+    ------
+    ndarray : Newly appended rows
+    """
+    fp = _fullpath(file, pth)
+    fof = _FidOrFile(fp, mode='r', swmr=True)
+    try:
+        dset_id = fof.fid[dset]
+        last_new = _time.time()
+        while True:
+            new_rows, start = read_new_rows(dset_id, start=start)
+            if new_rows.shape[0] > 0:
+                last_new = _time.time()
+                yield new_rows
+            elif (timeout is not None) and (_time.time() - last_new >= timeout):
+                return
+            else:
+                _time.sleep(interval)
+    finally:
+        fof.close_if_file_not_fid()
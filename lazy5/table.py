@@ -0,0 +1,339 @@
+"""
+Columnar tables: record-like data (e.g., event lists) stored as one chunked
+dataset per column inside a group, so that reading some columns does not
+read the others.
+
+Each numeric column also keeps per-chunk minimum, maximum and count
+statistics (lazy5.chunks.write_chunk_stats), used to skip chunks that cannot
+satisfy a condition (predicate pushdown) before any row is read.
+
+Layout
+------
+    /events                     Group, attribute lazy5_table (JSON: columns,
+                                n_rows, chunk_rows)
+    /events/<column>            Column dataset, chunked along rows, resizable
+    /lazy5_chunk_stats/events/<column>
+                                Per-chunk statistics (see
+                                lazy5.chunks.STATS_GROUP)
+
+Examples
+--------
+>>> write_table('run.h5', 'events', events)  # Structured array or dict
+>>> append_table('run.h5', 'events', more_events)
+>>> out = read_table('run.h5', 'events', columns=['t', 'energy'],
+...                  where=[('energy', '>', 5.0), ('detector', '==', 3)])
+>>> out['t']
+"""
+import json as _json
+from collections import OrderedDict as _OrderedDict
+
+import h5py as _h5py
+import numpy as _np
+
+from . import instrument as _instrument
+from .utils import (FidOrFile as _FidOrFile, fullpath as _fullpath,
+                    compound_to_complex as _compound_to_complex)
+from .inspect import get_hierarchy as _get_hierarchy
+from .create import save as _save
+from .chunks import (COMPARISONS as _COMPARE, candidate_chunks as _candidate_chunks,
+                     write_chunk_stats as _write_chunk_stats,
+                     delete_chunk_stats as _delete_chunk_stats)
+
+__all__ = ['write_table', 'append_table', 'read_table', 'table_info', 'list_tables',
+           'OPERATORS']
+
+# Attribute of a table group (JSON)
+TABLE_ATTR = 'lazy5_table'
+
+OPERATORS = tuple(_COMPARE)
+
+def _as_columns(data):
+    """ OrderedDict of (column, ndarray) from a structured array or dict of arrays """
+    if isinstance(data, _np.ndarray) and (data.dtype.names is not None):
+        cols = _OrderedDict([[name, data[name]] for name in data.dtype.names])
+    elif isinstance(data, dict):
+        cols = _OrderedDict([[name, _np.asarray(val)] for name, val in data.items()])
+    else:
+        raise TypeError('data needs to be a structured ndarray or a dict of arrays')
+    if not cols:
+        raise ValueError('A table needs at least one column')
+    for name, col in cols.items():
+        if '/' in name:
+            raise ValueError('Invalid column name {!r}'.format(name))
+        if col.ndim == 0:
+            raise ValueError('Column {} is a scalar'.format(name))
+    if len(set([col.shape[0] for col in cols.values()])) > 1:
+        raise ValueError('Columns have different numbers of rows')
+    return cols
+
+def _has_stats(col):
+    """ Are per-chunk statistics kept for a column (1D and numeric) """
+    return (len(col.shape) == 1) and (col.dtype.kind in 'biuf')
+
+def _table_group(fid, table):
+    """ Group and metadata of a table """
+    if (table not in fid) or (TABLE_ATTR not in fid[table].attrs):
+        raise KeyError('{} is not a table'.format(table))
+    grp = fid[table]
+    return grp, _json.loads(grp.attrs[TABLE_ATTR])
+
+@_instrument.timed('table.write_table')
+def write_table(file, table, data, pth=None, mode='a', chunk_rows=65536, overwrite=False,
+                compression=None, compression_opts=None, shuffle=None, workers=None):
+    """
+    Write a table, one dataset per column (see lazy5.create.save)
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    table : str
+        Table (group) name
+
+    data : structured ndarray or dict
+        Rows (e.g., a compound-dtype array) or columns (name: array). Each
+        column may have more than one dimension (rows along the first).
+
+    pth : str
+        Path
+
+    mode : str
+        h5py file mode
+
+    chunk_rows : int
+        Rows per chunk, the unit of reading and of the min/max statistics
+
+    overwrite : bool
+        If table already exists, overwrite or raise error?
+
+    compression, compression_opts, shuffle, workers :
+        See lazy5.create.save
+
+    Returns
+    -------
+    int : Number of rows
+    """
+    cols = _as_columns(data)
+    n_rows = list(cols.values())[0].shape[0]
+
+    fof = _FidOrFile(_fullpath(file, pth), mode=mode)
+    fid = fof.fid
+    try:
+        if table in fid:
+            if not overwrite:
+                raise IOError('Table {} exists. Param overwrite=False. '
+                              'Will not overwrite'.format(table))
+            del fid[table]
+            _delete_chunk_stats(fid, table)
+        grp = fid.create_group(table)
+        for name, col in cols.items():
+            _save(fid, grp.name + '/' + name, col, chunks=(chunk_rows,) + col.shape[1:],
+                  maxshape=(None,) + col.shape[1:], compression=compression,
+                  compression_opts=compression_opts, shuffle=shuffle, workers=workers,
+                  chunk_stats=_has_stats(col))
+        # Written last: a table is complete once it has its metadata
+        grp.attrs[TABLE_ATTR] = _json.dumps({'columns': list(cols), 'n_rows': n_rows,
+                                             'chunk_rows': chunk_rows})
+    finally:
+        fof.close_if_file_not_fid()
+    return n_rows
+
+@_instrument.timed('table.append_table')
+def append_table(file, table, data, pth=None):
+    """
+    Append rows to a table. Statistics of the last (partial) chunk and of
+    the new chunks are updated.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    table : str
+        Table (group) name
+
+    data : structured ndarray or dict
+        Rows or columns, with the same columns as the table
+
+    pth : str
+        Path
+
+    Returns
+    -------
+    int : Number of rows of the table
+    """
+    cols = _as_columns(data)
+    fof = _FidOrFile(_fullpath(file, pth), mode='r+')
+    fid = fof.fid
+    try:
+        grp, info = _table_group(fid, table)
+        if sorted(cols) != sorted(info['columns']):
+            raise ValueError('Columns {} do not match table columns {}'.format(list(cols),
+                                                                              info['columns']))
+        n_old = info['n_rows']
+        chunk_rows = info['chunk_rows']
+        n_new = list(cols.values())[0].shape[0]
+        first_row = (n_old // chunk_rows) * chunk_rows
+
+        nbytes = 0
+        for name in info['columns']:
+            dset = grp[name]
+            col = _np.asarray(cols[name], dtype=dset.dtype)
+            dset.resize(n_old + n_new, axis=0)
+            dset[n_old:] = col
+            nbytes += col.nbytes
+            if _has_stats(dset):
+                values = _np.concatenate([dset[first_row:n_old], col])
+                _write_chunk_stats(dset, data=values, start=n_old)
+
+        # Updated last: readers never see rows that are not fully written
+        info['n_rows'] = n_old + n_new
+        grp.attrs[TABLE_ATTR] = _json.dumps(info)
+    finally:
+        fof.close_if_file_not_fid()
+    _instrument.record('bytes_written', 'table.append_table', nbytes)
+    return n_old + n_new
+
+def _row_bounds(rows, n_rows):
+    """ (start, stop) of a row selection: None, (start, stop), or a slice """
+    if rows is None:
+        return 0, n_rows
+    if isinstance(rows, slice):
+        start, stop, step = rows.indices(n_rows)
+        if step != 1:
+            raise ValueError('Row slices must have a step of 1')
+        return start, max(start, stop)
+    start, stop = rows
+    return max(int(start), 0), min(int(stop), n_rows)
+
+@_instrument.timed('table.read_table')
+def read_table(file, table, columns=None, rows=None, where=None, pth=None):
+    """
+    Read (some columns and rows of) a table
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    table : str
+        Table (group) name
+
+    columns : list of str
+        Columns to read. If None, all.
+
+    rows : tuple or slice
+        (start, stop) rows to read. If None, all.
+
+    where : list of (column, operator, value)
+        Conditions that all returned rows satisfy. operator is one of
+        OPERATORS. Chunks whose min/max statistics rule out a condition are
+        not read.
+
+    pth : str
+        Path
+
+    Returns
+    -------
+    OrderedDict : (column, ndarray)
+    """
+    fof = _FidOrFile(_fullpath(file, pth))
+    fid = fof.fid
+    try:
+        grp, info = _table_group(fid, table)
+        columns = info['columns'] if columns is None else list(columns)
+        where = [] if where is None else list(where)
+        for name in columns + [cond[0] for cond in where]:
+            if name not in info['columns']:
+                raise KeyError('Table {} has no column {}'.format(table, name))
+        for _, operator, _ in where:
+            if operator not in _COMPARE:
+                raise ValueError('Unknown operator {!r}. Available: {}'.format(operator,
+                                                                              OPERATORS))
+        start, stop = _row_bounds(rows, info['n_rows'])
+        chunk_rows = info['chunk_rows']
+
+        # Row ranges to read: whole range, or runs of chunks not ruled out
+        if not where:
+            runs = [(start, stop)] if stop > start else []
+        else:
+            chunk_ids = range(start // chunk_rows, -(-stop // chunk_rows))
+            candidates = set(chunk_ids)
+            for name, operator, value in where:
+                if _has_stats(grp[name]):  # Without (current) statistics: all chunks
+                    _, offsets, _ = _candidate_chunks(grp[name], [(operator, value)])
+                    candidates &= set([offset[0] // chunk_rows for offset in offsets])
+            runs = []
+            for num in chunk_ids:
+                if num not in candidates:
+                    continue
+                run_start = max(num * chunk_rows, start)
+                run_stop = min((num + 1) * chunk_rows, stop)
+                if runs and (runs[-1][1] == run_start):
+                    runs[-1] = (runs[-1][0], run_stop)
+                else:
+                    runs.append((run_start, run_stop))
+
+        parts = _OrderedDict([[name, []] for name in columns])
+        nbytes = 0
+        for run_start, run_stop in runs:
+            values = {}
+            mask = None
+            for name, operator, value in where:
+                if name not in values:
+                    values[name] = grp[name][run_start:run_stop]
+                    nbytes += values[name].nbytes
+                cond = _COMPARE[operator](values[name], value)
+                mask = cond if mask is None else (mask & cond)
+            if (mask is not None) and not mask.any():
+                continue
+            for name in columns:
+                if name not in values:
+                    values[name] = grp[name][run_start:run_stop]
+                    nbytes += values[name].nbytes
+                parts[name].append(values[name] if mask is None else values[name][mask])
+
+        out = _OrderedDict()
+        for name in columns:
+            dset = grp[name]
+            if parts[name]:
+                out[name] = _compound_to_complex(_np.concatenate(parts[name]))
+            else:
+                out[name] = _compound_to_complex(_np.empty((0,) + dset.shape[1:],
+                                                           dtype=dset.dtype))
+    finally:
+        fof.close_if_file_not_fid()
+    _instrument.record('bytes_read', 'table.read_table', nbytes)
+    return out
+
+def table_info(file, table, pth=None):
+    """
+    Number of rows, rows per chunk, and columns of a table
+
+    Returns
+    -------
+    OrderedDict : n_rows, chunk_rows, and columns ((name, {'dtype', 'shape'})
+    with the shape of one row of the column)
+    """
+    fof = _FidOrFile(_fullpath(file, pth))
+    fid = fof.fid
+    try:
+        grp, info = _table_group(fid, table)
+        columns = _OrderedDict([[name, {'dtype': grp[name].dtype.str,
+                                        'shape': list(grp[name].shape[1:])}]
+                                for name in info['columns']])
+        return _OrderedDict([['n_rows', info['n_rows']], ['chunk_rows', info['chunk_rows']],
+                             ['columns', columns]])
+    finally:
+        fof.close_if_file_not_fid()
+
+def list_tables(file, pth=None):
+    """ Names of the tables (groups written by write_table) in a file """
+    fof = _FidOrFile(_fullpath(file, pth))
+    fid = fof.fid
+    try:
+        return [grp for grp in _get_hierarchy(fid, grp_w_dset=True)
+                if isinstance(fid[grp], _h5py.Group) and (TABLE_ATTR in fid[grp].attrs)]
+    finally:
+        fof.close_if_file_not_fid()
@@ -10,7 +10,11 @@ import pytest
 import numpy as np
 
 from lazy5.utils import hdf_is_open
-from lazy5.alter import alter_attr_same, alter_attr, write_attr_dict
+from lazy5.inspect import get_datasets
+from lazy5.load import load_where
+from lazy5.chunks import write_chunk_stats, read_chunk_stats
+from lazy5.alter import (alter_attr_same, alter_attr, write_attr_dict, repack,
+                         copy_dsets, copy_chunks_raw, copy_file, index_chunk_stats)
 
 @pytest.fixture(scope="function")
 def hdf_dataset():
@@ -344,4 +348,212 @@ def test_write_attr_dict(hdf_dataset):
     # Order should be sorted. WDA* are the last alphanumerically in this test file
     l_attr = list(dset_obj.attrs.keys())
     l_attr[-1] == 'WDA2'
-    l_attr[-2] == 'WDA1'
\ No newline at end of file
+    l_attr[-2] == 'WDA1'
+
+def test_repack(hdf_dataset):
+    """ Repack a file: hierarchy, attributes, and data preserved """
+
+    filename, fid = hdf_dataset
+    fid['Group1'].attrs['GroupAttr'] = 'Grp'
+    fid.attrs['RootAttr'] = 1
+    fid['Group1/resizable'] = np.arange(10)
+    fid.create_dataset('Group1/growing', shape=(0, 3), maxshape=(None, 3), chunks=(4, 3),
+                       dtype=np.float32)
+    fid['scalar'] = 3.0
+    fid['empty'] = h5py.Empty('f4')
+    fid['soft'] = h5py.SoftLink('/base')
+    fid['external'] = h5py.ExternalLink('other.h5', '/dset')
+    fid['Group1'].attrs['BaseRef'] = fid['base'].ref
+    fid['base'].attrs['Refs'] = np.array([fid['Group1'].ref, fid['scalar'].ref],
+                                         dtype=h5py.ref_dtype)
+    fid.create_dataset('lazy5_chunk_stats/base', data=np.zeros(3))
+
+    # Bloat the file: overwritten attributes leave unused space
+    for num in range(200):
+        fid['base'].attrs['Bloat'] = np.random.randn(100 + num)
+    fid.close()
+
+    for workers in [None, 2]:
+        dst = 'temp_test_repack.h5'
+        report = repack(filename, dst, chunks=(5, 11, 24), compression='gzip',
+                        compression_opts=4, shuffle=True, workers=workers)
+        assert report['n_dsets'] == 10
+        assert report['dst_size'] < report['src_size']
+        assert (report['tmp_size'] > 0) == (workers == 2)
+        assert not [fname for fname in os.listdir('.') if fname.startswith(dst + '.part')]
+
+        with h5py.File(filename, 'r') as src_fid, h5py.File(dst, 'r') as dst_fid:
+            assert dst_fid.attrs['RootAttr'] == 1
+            assert dst_fid['Group1'].attrs['GroupAttr'] == 'Grp'
+            assert dst_fid['base'].attrs['Attribute_str'] == 'Test'
+            assert np.allclose(dst_fid['base'], src_fid['base'])
+            assert np.allclose(dst_fid['Group4/Group5/Group6/ingroup6'], src_fid['base'])
+            assert dst_fid['base'].chunks == (5, 11, 24)
+            assert dst_fid['base'].compression == 'gzip'
+            assert dst_fid['base'].shuffle
+
+            # Datasets for which the chunk shape does not apply
+            assert np.array_equal(dst_fid['Group1/resizable'], np.arange(10))
+            assert dst_fid['Group1/growing'].maxshape == (None, 3)
+            assert dst_fid['scalar'][()] == 3.0
+            assert dst_fid['empty'].shape is None
+
+            assert dst_fid.get('soft', getlink=True).path == '/base'
+            assert dst_fid.get('external', getlink=True).filename == 'other.h5'
+
+            # References point at the repacked objects; lazy5 metadata is not copied
+            assert dst_fid[dst_fid['Group1'].attrs['BaseRef']].name == '/base'
+            assert [dst_fid[ref].name for ref in dst_fid['base'].attrs['Refs']] == \
+                ['/Group1', '/scalar']
+            assert 'lazy5_chunk_stats' not in dst_fid
+        os.remove(dst)
+
+    # Change dtype, remove compression; keep source chunking
+    report = repack(filename, 'temp_test_repack.h5', dtype=np.float32, compression=False,
+                    block_nbytes=1000)
+    with h5py.File(filename, 'r') as src_fid, h5py.File('temp_test_repack.h5', 'r') as dst_fid:
+        assert dst_fid['base'].dtype == np.float32
+        assert dst_fid['base'].compression is None
+        assert dst_fid['Group1/growing'].chunks == (4, 3)
+        assert np.allclose(dst_fid['base'], src_fid['base'], atol=1e-5)
+    os.remove('temp_test_repack.h5')
+
+def test_repack_cleanup(hdf_dataset):
+    """ Failed repacks leave no partial files; writable fids refused with workers """
+
+    filename, fid = hdf_dataset
+    fid['Group1/other'] = np.arange(10.)
+    dst = 'temp_test_repack_cleanup.h5'
+
+    # Workers re-open the source by name: it must be read-only
+    with pytest.raises(ValueError):
+        repack(fid, dst, workers=2)
+    assert fid.id.valid
+    assert not os.path.exists(dst)
+    fid.close()
+
+    for workers in [None, 2]:
+        with pytest.raises(Exception):
+            repack(filename, dst, compression='not_a_filter', workers=workers)
+        assert not os.path.exists(dst)
+        assert not [fname for fname in os.listdir('.') if fname.startswith(dst + '.part')]
+
+    with h5py.File(filename, 'r') as src_fid:
+        report = repack(src_fid, dst, workers=2)
+        assert src_fid.id.valid
+        assert report['n_dsets'] == len(get_datasets(src_fid))
+    os.remove(dst)
+
+def test_copy_dsets(hdf_dataset):
+    """ Copy datasets within and across files, with glob selection and dry-run """
+
+    filename, fid = hdf_dataset
+    fid.create_dataset('Group1/compressed', data=np.arange(1000).reshape(100, 10), chunks=(10, 10),
+                       compression='gzip', shuffle=True)
+    fid['Group1/compressed'].attrs['AT1'] = 1
+    fid.close()
+    index_chunk_stats(filename, dsets=['/Group1/compressed'])
+
+    dst = 'temp_test_copy.h5'
+
+    # lazy5's metadata groups are not matched, even by '*'
+    report = copy_dsets(filename, dst, dry_run=True)
+    assert '/Group1/compressed' in report
+    assert not [dset for dset in report if dset.startswith('/lazy5_')]
+
+    # Dry-run: nothing copied
+    report = copy_dsets(filename, dst, patterns='/Group1/*', dry_run=True)
+    assert list(report) == ['/Group1/compressed', '/Group1/ingroup1_1', '/Group1/ingroup1_2']
+    assert report['/Group1/ingroup1_1'] == 20 * 22 * 24 * 8
+    assert not os.path.exists(dst)
+
+    report = copy_dsets(filename, dst, patterns=['*ingroup1_1', '/Group1/comp*'])
+    assert list(report) == ['/Group1/compressed', '/Group1/ingroup1_1']
+    with h5py.File(filename, 'r') as src_fid, h5py.File(dst, 'r') as dst_fid:
+        assert np.array_equal(dst_fid['Group1/compressed'], src_fid['Group1/compressed'])
+        assert dst_fid['Group1/compressed'].compression == 'gzip'
+        assert dst_fid['Group1/compressed'].attrs['AT1'] == 1
+        assert np.array_equal(dst_fid['Group1/ingroup1_1'], src_fid['Group1/ingroup1_1'])
+        assert 'Group1/ingroup1_2' not in dst_fid
+
+    # Existing destination
+    with pytest.raises(IOError):
+        copy_dsets(filename, dst, patterns='/Group1/compressed')
+
+    # Overwrite: raw chunk transfer when layout and filters match
+    with h5py.File(dst, 'a') as dst_fid:
+        dst_fid['Group1/compressed'][:50] = -1
+        dst_fid['Group1/compressed'].attrs['AT2'] = 2
+    copy_dsets(filename, dst, patterns='/Group1/compressed', dset_overwrite=True)
+    with h5py.File(filename, 'r') as src_fid, h5py.File(dst, 'r') as dst_fid:
+        assert np.array_equal(dst_fid['Group1/compressed'], src_fid['Group1/compressed'])
+        assert dict(dst_fid['Group1/compressed'].attrs) == {'AT1': 1}
+
+    # Statistics of overwritten destinations are deleted (raw and H5Ocopy paths)
+    with h5py.File(dst, 'a') as dst_fid:
+        dst_fid['Group1/compressed'][...] = 0
+        dst_fid['Group1/ingroup1_1'][...] = 0
+    index_chunk_stats(dst, dsets=['/Group1/compressed', '/Group1/ingroup1_1'])
+    copy_dsets(filename, dst, patterns=['/Group1/compressed', '/Group1/ingroup1_1'],
+               dset_overwrite=True)
+    with h5py.File(dst, 'r') as dst_fid:
+        assert 'lazy5_chunk_stats/Group1/compressed' not in dst_fid
+        assert 'lazy5_chunk_stats/Group1/ingroup1_1' not in dst_fid
+    index, _ = load_where(dst, '/Group1/compressed', [('>', 900)])
+    assert index[0].size == 99
+
+    # Within a file under another group
+    report = copy_dsets(dst, patterns='/Group1/*', dst_grp='/Copy')
+    with h5py.File(dst, 'r') as dst_fid:
+        assert np.array_equal(dst_fid['Copy/Group1/compressed'], dst_fid['Group1/compressed'])
+    os.remove(dst)
+
+def test_copy_chunks_raw(hdf_dataset):
+    """ Raw chunk transfer resets chunks not stored in the source """
+
+    _, fid = hdf_dataset
+    src = fid.create_dataset('src', shape=(20, 20), chunks=(5, 5), dtype=np.int16,
+                             compression='gzip', fillvalue=7)
+    src[:5, :5] = 1
+    dst = fid.create_dataset('dst', shape=(20, 20), chunks=(5, 5), dtype=np.int16,
+                             compression='gzip', fillvalue=7)
+    dst[...] = 3
+    write_chunk_stats(dst)
+
+    assert copy_chunks_raw(src, dst) == 1
+    assert np.array_equal(dst[()], src[()])
+    assert read_chunk_stats(dst) is None
+    assert 'lazy5_chunk_stats/dst' not in fid
+
+    other = fid.create_dataset('other', shape=(20, 20), chunks=(4, 5), dtype=np.int16,
+                               compression='gzip')
+    with pytest.raises(ValueError):
+        copy_chunks_raw(src, other)
+
+def test_copy_file(hdf_dataset):
+    """ Copy an entire file """
+
+    filename, fid = hdf_dataset
+    fid.attrs['RootAttr'] = 1
+    fid['soft'] = h5py.SoftLink('/base')
+    fid.close()
+
+    dst = 'temp_test_copy_file.h5'
+    report = copy_file(filename, dst, dry_run=True)
+    assert len(report) == 6
+    assert not os.path.exists(dst)
+
+    report = copy_file(filename, dst)
+    with h5py.File(filename, 'r') as src_fid, h5py.File(dst, 'r') as dst_fid:
+        assert dst_fid.attrs['RootAttr'] == 1
+        assert np.array_equal(dst_fid['Group4/Group5/Group6/ingroup6'],
+                              src_fid['Group4/Group5/Group6/ingroup6'])
+        assert dst_fid['base'].attrs['Attribute_str'] == 'Test'
+        assert dst_fid.get('soft', getlink=True).path == '/base'
+    os.remove(dst)
+
+    # A failed copy does not leak the source file
+    n_open = len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE))
+    with pytest.raises(Exception):
+        copy_file(filename, 'temp_no_such_dir/copy.h5')
+    assert len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)) == n_open
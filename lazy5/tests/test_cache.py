@@ -0,0 +1,93 @@
+""" Test the decoded-chunk cache """
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.cache import ChunkCache, CHUNK_CACHE
+from lazy5.load import load
+from lazy5.config import use_config
+from lazy5.instrument import Collector
+
+@pytest.fixture(scope="module")
+def hdf_file():
+    """ Setups and tears down a sample HDF5 file """
+    filename = 'temp_test_cache.h5'
+    image = np.random.RandomState(0).rand(100, 90)
+    with h5py.File(filename, 'w') as fid:
+        fid.create_dataset('gzip', data=image, chunks=(25, 40), compression='gzip', shuffle=True)
+        fid.create_dataset('lzf', data=image, chunks=(25, 40), compression='lzf')
+        fid.create_dataset('sparse', shape=(50, 50), chunks=(10, 10), fillvalue=-1.0)
+        fid['sparse'][:10, :10] = 1.0
+        fid.create_dataset('contiguous', data=image)
+
+    yield filename, image
+
+    # Tear-down
+    time.sleep(1)
+    try:
+        os.remove(filename)
+    except:
+        print('Could not delete {}'.format(filename))
+
+def test_chunk_cache(hdf_file):  # pylint:disable=redefined-outer-name
+    """ Chunks survive re-opening the file; hits, misses and evictions """
+    filename, image = hdf_file
+    cache = ChunkCache()
+    for dset in ['gzip', 'lzf']:
+        with Collector() as stats:
+            np.testing.assert_array_equal(load(filename, dset, slc=np.s_[10:30, 50:],
+                                               cache=cache), image[10:30, 50:])
+            np.testing.assert_array_equal(load(filename, dset, slc=np.s_[20, 40:],
+                                               cache=cache), image[20, 40:])
+            np.testing.assert_array_equal(load(filename, dset, cache=cache, workers=2), image)
+        assert stats.cache_misses['cache.ChunkCache'] == 4 + 0 + 8
+        assert stats.cache_hits['cache.ChunkCache'] == 0 + 2 + 4
+    assert cache.stats()['entries'] == 24
+    assert load(filename, 'gzip', slc=np.s_[-1, -1], cache=cache) == image[-1, -1]
+
+    np.testing.assert_array_equal(load(filename, 'sparse', slc=np.s_[5:15, 5],
+                                       cache=cache), [1.0] * 5 + [-1.0] * 5)
+
+    # Not chunked: not cached
+    np.testing.assert_array_equal(load(filename, 'contiguous', cache=cache), image)
+    assert cache.stats()['entries'] == 26
+
+    # Bounded size: least-recently-used chunks are evicted
+    cache.resize(4 * 25 * 40 * 8)
+    assert cache.nbytes <= cache.max_nbytes
+    assert cache.stats()['evictions'] == 26 - len(cache)
+    np.testing.assert_array_equal(load(filename, 'gzip', slc=np.s_[:, :40], cache=cache),
+                                  image[:, :40])
+    assert cache.nbytes <= cache.max_nbytes
+
+    cache.invalidate(filename)
+    assert len(cache) == 0
+
+def test_chunk_cache_invalidation(hdf_file):  # pylint:disable=redefined-outer-name
+    """ Chunks of a modified file are dropped """
+    filename, image = hdf_file
+    with use_config(chunk_cache=True):
+        CHUNK_CACHE.invalidate()
+        assert load(filename, 'gzip', slc=np.s_[0, 0]) == image[0, 0]
+        assert len(CHUNK_CACHE) == 1
+
+        time.sleep(0.01)
+        with h5py.File(filename, 'a') as fid:
+            fid['gzip'][0, 0] = -1
+        assert load(filename, 'gzip', slc=np.s_[0, 0]) == -1
+        assert CHUNK_CACHE.stats()['invalidations'] >= 1
+
+        # Files open for writing are not cached
+        with h5py.File(filename, 'a') as fid:
+            assert load(fid, 'gzip', slc=np.s_[0, 0]) == -1
+            fid['gzip'][0, 0] = image[0, 0]
+            assert load(fid, 'gzip', slc=np.s_[0, 0]) == image[0, 0]
+        CHUNK_CACHE.invalidate()
+
+    with pytest.raises(TypeError):
+        with use_config(chunk_caches=True):
+            pass
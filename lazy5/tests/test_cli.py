@@ -0,0 +1,131 @@
+""" Test the command-line interface """
+import json
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.cli import main
+from lazy5.inspect import get_attrs_dset
+
+@pytest.fixture(scope="function")
+def hdf_files():
+    """ Setups and tears down two sample HDF5 files """
+    filenames = ['temp_test_cli_{}.h5'.format(num) for num in range(2)]
+    for num, filename in enumerate(filenames):
+        with h5py.File(filename, 'w') as fid:
+            dset = fid.create_dataset('/Spectra/Raw', data=np.arange(6.0).reshape(2, 3))
+            dset.attrs['Gain'] = num
+            dset.attrs['Memo'] = 'File {}'.format(num)
+            fid.create_dataset('/Spectra/Background', data=np.zeros(3)).attrs['Gain'] = 5
+            fid.create_group('Empty')
+
+    yield filenames
+
+    # Tear-down
+    time.sleep(1)
+    for filename in filenames + ['temp_test_cli_copy.h5', 'temp_test_cli_repack.h5']:
+        try:
+            os.remove(filename)
+        except:
+            pass
+
+def run(capsys, argv):
+    """ Run the CLI; return the exit code and the parsed NDJSON records """
+    code = main(argv + ['--format', 'ndjson'])
+    lines = capsys.readouterr().out.splitlines()
+    return code, [json.loads(line) for line in lines]
+
+def test_ls_and_tree(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ List datasets (metadata only unless --data) and hierarchies """
+    code, records = run(capsys, ['ls'] + hdf_files)
+    assert code == 0
+    assert [(rec['file'], rec['dset']) for rec in records] == \
+        [(fp, dset) for fp in hdf_files for dset in ['/Spectra/Background', '/Spectra/Raw']]
+    assert records[1]['shape'] == [2, 3]
+    assert records[1]['dtype'] == 'float64'
+    assert 'data' not in records[1]
+
+    code, records = run(capsys, ['ls', hdf_files[0], '-d', '*/Raw', '--data'])
+    assert len(records) == 1
+    assert records[0]['data'] == [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]]
+
+    code, records = run(capsys, ['tree', hdf_files[0], '--grp-w-dset'])
+    assert records == [{'file': hdf_files[0],
+                        'hierarchy': {'/Spectra': ['Background', 'Raw']}}]
+
+def test_json_output(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ Default output is a JSON array """
+    assert main(['attrs', hdf_files[0], '-d', '/Spectra/Raw']) == 0
+    records = json.loads(capsys.readouterr().out)
+    assert records == [{'file': hdf_files[0], 'dset': '/Spectra/Raw',
+                        'attrs': {'Gain': 0, 'Memo': 'File 0'}}]
+
+def test_set_attr_and_find(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ Bulk attribute edits (in parallel) and search """
+    code, records = run(capsys, ['set-attr'] + hdf_files + ['-d', '/Spectra/Raw', '-a', 'Gain=7',
+                                                           '-a', 'Operator=CHC', '-w', '2'])
+    assert code == 0
+    assert len(records) == 2
+    for filename in hdf_files:
+        attrs = get_attrs_dset(filename, '/Spectra/Raw', convert_sgl_np_to_num=True)
+        assert attrs['Gain'] == 7
+        assert attrs['Operator'] == 'CHC'
+
+    code, records = run(capsys, ['find'] + hdf_files + ['-a', 'Gain=7'])
+    assert [(rec['file'], rec['dset']) for rec in records] == \
+        [(fp, '/Spectra/Raw') for fp in hdf_files]
+
+    code, records = run(capsys, ['find', hdf_files[0], '-n', 'Spectra', '-x', 'Raw'])
+    assert [rec['dset'] for rec in records] == ['/Spectra/Background']
+
+    # Type check: a string cannot replace a number
+    code, records = run(capsys, ['set-attr', hdf_files[0], '-d', '/Spectra/Raw',
+                                 '-a', 'Gain=high', '--check-type'])
+    assert code == 1
+    assert records[0]['error'].startswith('TypeError')
+
+def test_errors_per_file(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ A failing file yields an error record; others are still processed """
+    code, records = run(capsys, ['ls', 'temp_test_cli_missing.h5', hdf_files[0]])
+    assert code == 1
+    assert 'error' in records[0]
+    assert len(records) == 3
+
+def test_copy_and_repack(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ Copy and repack subcommands """
+    code, records = run(capsys, ['copy', hdf_files[0], 'temp_test_cli_copy.h5',
+                                 '-p', '*/Raw'])
+    assert code == 0
+    assert [rec['dset'] for rec in records] == ['/Spectra/Raw']
+    with h5py.File('temp_test_cli_copy.h5', 'r') as fid:
+        assert list(fid['Spectra']) == ['Raw']
+
+    code, records = run(capsys, ['repack', hdf_files[0], 'temp_test_cli_repack.h5',
+                                 '--compression', 'gzip', '--dtype', 'float32'])
+    assert code == 0
+    assert records[0]['n_dsets'] == 2
+    with h5py.File('temp_test_cli_repack.h5', 'r') as fid:
+        assert fid['/Spectra/Raw'].dtype == np.float32
+        assert fid['/Spectra/Raw'].compression == 'gzip'
+
+def test_verify(hdf_files, capsys):  # pylint:disable=redefined-outer-name
+    """ Verify checksums of stored chunks across files """
+    from lazy5.create import save
+    save(hdf_files[0], 'Checked', np.arange(100.), chunks=(10,), checksums=True)
+
+    code, records = run(capsys, ['verify'] + hdf_files + ['-d', '/Checked', '-d', '/Spectra/Raw'])
+    assert code == 0
+    assert [(rec['file'], rec['dset'], rec['status']) for rec in records] == \
+        [(hdf_files[0], '/Checked', 'ok'), (hdf_files[0], '/Spectra/Raw', 'unchecked'),
+         (hdf_files[1], '/Spectra/Raw', 'unchecked')]
+
+    with h5py.File(hdf_files[0], 'r+') as fid:
+        fid['Checked'].id.write_direct_chunk((50,), np.zeros(10).tobytes())
+    code, records = run(capsys, ['verify', hdf_files[0]])
+    assert code == 1
+    assert records[0]['status'] == 'corrupt'
+    assert records[0]['chunks'] == ['50']
@@ -0,0 +1,117 @@
+""" Test configuration scoped to a context """
+import os
+import subprocess
+import sys
+import time
+import threading
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.config import DefaultConfig, get_config, use_config, setting, DEFAULT_CONFIG
+from lazy5.create import save
+from lazy5.load import load
+from lazy5.inspect import get_attrs_dset
+from lazy5.utils import FidOrFile
+
+@pytest.fixture(scope="function")
+def filenames():
+    """ Setups and tears down files """
+    names = ['temp_test_config_{}.h5'.format(num) for num in range(3)]
+
+    yield names
+
+    # Tear-down
+    time.sleep(1)
+    for fname in names:
+        try:
+            os.remove(fname)
+        except:
+            print('Could not delete {}'.format(fname))
+
+def test_import_leaves_h5py_config():
+    """ Importing lazy5 modules does not modify h5py's global configuration """
+    code = ('import h5py; names = h5py.get_config().complex_names; '
+            'import lazy5.utils, lazy5.inspect, lazy5.alter, lazy5.create, lazy5.load, '
+            'lazy5.swmr, lazy5.table; '
+            'assert h5py.get_config().complex_names == names')
+    subprocess.check_call([sys.executable, '-c', code])
+
+def test_use_config():
+    """ Settings apply within the block, nested blocks override, threads are isolated """
+    assert get_config() is DEFAULT_CONFIG
+    assert setting('workers') is None
+    assert setting('workers', 2) == 2
+
+    seen = {}
+    with use_config(workers=4, compression='gzip') as config:
+        assert get_config() is config
+        assert setting('workers') == 4
+        with use_config(workers=2):
+            assert setting('workers') == 2
+            assert setting('compression') == 'gzip'
+        assert setting('workers') == 4
+
+        thread = threading.Thread(target=lambda: seen.update(workers=setting('workers')))
+        thread.start()
+        thread.join()
+    assert seen['workers'] is None
+    assert get_config() is DEFAULT_CONFIG
+    assert DEFAULT_CONFIG.workers is None
+
+    with use_config(DefaultConfig(), rdcc_nbytes=2**23):
+        assert FidOrFile.file_kwargs('new_file.h5', mode='w') == {'rdcc_nbytes': 2**23}
+
+    with pytest.raises(TypeError):
+        with use_config(not_a_setting=1):
+            pass
+
+def test_complex_names_per_context(filenames):  # pylint:disable=redefined-outer-name
+    """ Threads save and load complex data with their own field names """
+    data = np.arange(12).reshape(3, 4) * (1 - 2j)
+    names = [('Re', 'Im'), ('real', 'imag'), ('r', 'i')]
+    errors = []
+
+    def worker(filename, complex_names):
+        try:
+            with use_config(complex_names=complex_names, compression='gzip'):
+                save(filename, 'data', data, mode='w', attr_dict={'Scale': 2 + 3j})
+                np.testing.assert_array_equal(load(filename, 'data'), data)
+                assert get_attrs_dset(filename, 'data')['Scale'] == 2 + 3j
+        except Exception as err:  # pylint:disable=broad-except
+            errors.append(err)
+
+    threads = [threading.Thread(target=worker, args=args) for args in zip(filenames, names)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    for filename, complex_names in zip(filenames, names):
+        with h5py.File(filename, 'r') as fid:
+            assert fid['data'].compression == 'gzip'
+            assert fid['data'].id.get_type().get_member_name(0).decode() == complex_names[0]
+            assert fid['data'].id.get_type().get_member_name(1).decode() == complex_names[1]
+
+    # Read with other names: the compound is returned as-is
+    assert load(filenames[1], 'data').dtype.names == ('real', 'imag')
+
+def test_filter_opt_out(filenames):  # pylint:disable=redefined-outer-name
+    """ compression=False and shuffle=False override the configuration """
+    filename = filenames[0]
+    data = np.arange(1000.).reshape(100, 10)
+    with use_config(compression='gzip', shuffle=True):
+        save(filename, 'configured', data, mode='w', chunks=(10, 10))
+        save(filename, 'plain', data, chunks=(10, 10), compression=False, shuffle=False)
+        save(filename, 'split', data * 1j, chunks=(10, 10), compression=False,
+             complex_layout='split')
+    with h5py.File(filename, 'r') as fid:
+        assert fid['configured'].compression == 'gzip'
+        assert fid['configured'].shuffle
+        assert fid['plain'].compression is None
+        assert not fid['plain'].shuffle
+        assert fid['split/imag'].compression is None
+        np.testing.assert_array_equal(fid['plain'][()], data)
@@ -7,7 +7,8 @@ import pytest
 import numpy as np
 import h5py
 
-from lazy5.create import save
+from lazy5.create import save, save_dedup, write_chunks_parallel, create_vds, build_pyramid
+from lazy5.load import load
 from lazy5.utils import FidOrFile
 
 
@@ -101,3 +102,209 @@ def test_save_to_open_wrong_type():
 
     with pytest.raises(TypeError):
         save(123, 'Name', np.random.rand(10,10), pth=None, mode='w')
+
+def test_save_compressed_parallel():
+    """ Save with compression, compressing chunks in parallel (raw-chunk writes) """
+    data = np.random.randn(45, 33, 5).astype(np.float32)
+    filename = 'temp_create_parallel.h5'
+
+    for workers in [None, 3]:
+        for shuffle in [False, True]:
+            save(filename, 'Dset', data, mode='w', chunks=(8, 16, 5), compression='gzip',
+                 compression_opts=6, shuffle=shuffle, workers=workers)
+
+            # Readable by libhdf5's own filter pipeline
+            with h5py.File(filename, 'r') as fid:
+                assert fid['Dset'].compression == 'gzip'
+                assert fid['Dset'].compression_opts == 6
+                assert fid['Dset'].shuffle == shuffle
+                assert np.array_equal(fid['Dset'][()], data)
+
+    # Unsupported filter falls back to a standard write
+    save(filename, 'Dset', data, mode='w', compression='lzf', workers=2)
+    with h5py.File(filename, 'r') as fid:
+        assert np.array_equal(fid['Dset'][()], data)
+
+    os.remove(filename)
+
+def test_save_chunk_stats_checked_first():
+    """ Statistics of non-numeric data are refused before anything is written """
+    filename = 'temp_create_stats.h5'
+    try:
+        save(filename, 'Other', np.arange(3), mode='w')
+        for data in [np.arange(6) * 1j, np.zeros(4, dtype=[('a', np.int8), ('b', np.int8)])]:
+            with pytest.raises(TypeError):
+                save(filename, 'Dset', data, mode='a', chunk_stats=True)
+            with h5py.File(filename, 'r') as fid:
+                assert 'Dset' not in fid
+    finally:
+        time.sleep(1)
+        os.remove(filename)
+
+def test_save_dedup():
+    """ Identical chunks (dark frames, zero padding) are stored once """
+    rng = np.random.RandomState(0)
+    dark = rng.randint(0, 100, size=(64, 64)).astype(np.uint16)
+    data = rng.randint(0, 4000, size=(100, 64, 64)).astype(np.uint16)
+    data[::2] = dark  # Every other frame is the same dark frame
+    data[90:] = 0
+    filename = 'temp_create_dedup.h5'
+
+    try:
+        for workers in [1, 3]:
+            stats = save_dedup(filename, 'Frames', data, mode='w', compression='gzip',
+                               workers=workers, attr_dict={'Memo': 'Dedup'})
+            assert stats['n_chunks'] == 100
+            assert stats['n_unique'] == 47  # 40 odd frames before 90, dark, zeros
+
+            np.testing.assert_array_equal(load(filename, 'Frames'), data)
+            np.testing.assert_array_equal(load(filename, 'Frames', slc=(slice(3, 95), 5)),
+                                          data[3:95, 5])
+            np.testing.assert_array_equal(load(filename, 'Frames', slc=(7, Ellipsis)), data[7])
+            np.testing.assert_array_equal(load(filename, 'Frames', slc=(slice(0, 10, 3),)),
+                                          data[0:10:3])
+            with h5py.File(filename, 'r') as fid:
+                assert fid['Frames'].attrs['Memo'] == 'Dedup'
+                assert fid['Frames/store'].shape == (47, 1, 64, 64)
+
+        save_dedup(filename, 'Frames', data, mode='w')
+        save(filename, 'Plain', data, chunks=(1, 64, 64))
+        with h5py.File(filename, 'r') as fid:
+            assert (fid['Frames/store'].id.get_storage_size() <
+                    0.6 * fid['Plain'].id.get_storage_size())
+
+        # Edge chunks (zero-padded) and overwriting
+        save_dedup(filename, 'Edges', data[:, :50, :50], chunks=(7, 16, 16))
+        with pytest.raises(IOError):
+            save_dedup(filename, 'Edges', data[:, :50, :50], chunks=(7, 16, 16))
+        save_dedup(filename, 'Edges', data[:, :50, :50], chunks=(7, 16, 16),
+                   dset_overwrite=True)
+        np.testing.assert_array_equal(load(filename, 'Edges', slc=(slice(5, 20), 49)),
+                                      data[5:20, 49, :50])
+
+        # A failed write leaves no partial array
+        with pytest.raises(ValueError):
+            save_dedup(filename, 'Bad', data, compression='not_a_filter')
+        with h5py.File(filename, 'r') as fid:
+            assert 'Bad' not in fid
+    finally:
+        time.sleep(1)
+        os.remove(filename)
+
+def test_write_chunks_parallel():
+    """ Raw-chunk writes match libhdf5-written chunks """
+    data = np.arange(30 * 7, dtype=np.int32).reshape(30, 7)
+    filename = 'temp_create_parallel2.h5'
+
+    with h5py.File(filename, 'w') as fid:
+        ref = fid.create_dataset('ref', data=data, chunks=(8, 4), compression='gzip',
+                                 shuffle=True)
+        dset_id = fid.create_dataset('par', shape=data.shape, dtype=data.dtype, chunks=(8, 4),
+                                     compression='gzip', shuffle=True)
+        assert write_chunks_parallel(dset_id, data, workers=2) == 8
+        assert np.array_equal(dset_id[()], data)
+        assert np.array_equal(ref[()], dset_id[()])
+
+        # Process pool
+        assert write_chunks_parallel(dset_id, data[::-1], workers=2, use_processes=True) == 8
+        assert np.array_equal(dset_id[()], data[::-1])
+
+        with pytest.raises(ValueError):
+            write_chunks_parallel(dset_id, data[:10], workers=2)
+
+        contiguous = fid.create_dataset('contiguous', data=data)
+        with pytest.raises(ValueError):
+            write_chunks_parallel(contiguous, data)
+
+    os.remove(filename)
+
+def test_create_vds():
+    """ Virtual dataset stitching tiles from many files, with incremental rebuilds """
+    tiles = [np.random.randn(n_rows, 6) for n_rows in [3, 5, 4]]
+    filenames = ['temp_create_vds_tile{}.h5'.format(num) for num in range(4)]
+    master = 'temp_create_vds.h5'
+    for filename, tile in zip(filenames, tiles):
+        save(filename, '/Tile', tile, mode='w')
+    save(filenames[3], '/Tile', np.random.randn(4, 7), mode='w')  # Incompatible
+
+    try:
+        report = create_vds(master, '/Stitched', filenames[:2], src_dset='/Tile', mode='w')
+        assert report['shape'] == (8, 6)
+        assert report['n_scanned'] == 2
+        with h5py.File(master, 'r') as fid:
+            assert fid['/Stitched'].is_virtual
+            assert np.array_equal(fid['/Stitched'][()], np.concatenate(tiles[:2]))
+
+        # Only the new file is opened
+        report = create_vds(master, '/Stitched', filenames[:3], src_dset='/Tile')
+        assert report['shape'] == (12, 6)
+        assert report['n_scanned'] == 1
+        with h5py.File(master, 'r') as fid:
+            assert np.array_equal(fid['/Stitched'][()], np.concatenate(tiles))
+
+        # Along axis 1; the single dataset of each file is found
+        report = create_vds(master, '/Side', filenames[:1] * 2, axis=1)
+        assert report['shape'] == (3, 12)
+        with h5py.File(master, 'r') as fid:
+            assert np.array_equal(fid['/Side'][()], np.concatenate(tiles[:1] * 2, axis=1))
+
+        with pytest.raises(ValueError):
+            create_vds(master, '/Stitched', filenames, src_dset='/Tile')
+        with pytest.raises(KeyError):
+            create_vds(master, '/Stitched', filenames[:2], src_dset='/Missing')
+
+        save(master, '/Real', tiles[0])
+        with pytest.raises(IOError):
+            create_vds(master, '/Real', filenames[:2], src_dset='/Tile')
+    finally:
+        for filename in filenames + [master]:
+            os.remove(filename)
+
+def _reference_downsample(data, method):
+    """ 2x downsampling of the last two axes (edge-replicated), in memory """
+    pad = [(0, 0)] * (data.ndim - 2) + [(0, data.shape[-2] % 2), (0, data.shape[-1] % 2)]
+    data = np.pad(data, pad, mode='edge')
+    blocks = data.reshape(data.shape[:-2] + (data.shape[-2] // 2, 2, data.shape[-1] // 2, 2))
+    if method == 'max':
+        return blocks.max(axis=(-3, -1))
+    return blocks.mean(axis=(-3, -1))
+
+def test_build_pyramid():
+    """ Levels downsampled 2x from the previous, stored next to the base """
+    filename = 'temp_create_pyramid.h5'
+    rng = np.random.RandomState(0)
+    image = rng.randint(0, 1000, size=(1001, 700)).astype(np.float32)
+    cube = rng.rand(3, 301, 150)
+
+    try:
+        save(filename, 'Mosaic/image', image, mode='w', chunks=(128, 128))
+        save(filename, 'cube', cube, chunks=None)
+
+        levels = build_pyramid(filename, 'Mosaic/image', workers=3)
+        assert levels == [('/Mosaic/image_level1', (501, 350)),
+                          ('/Mosaic/image_level2', (251, 175))]
+        with h5py.File(filename, 'r') as fid:
+            level1 = fid['Mosaic/image_level1'][()]
+            np.testing.assert_allclose(level1, _reference_downsample(image, 'mean'))
+            np.testing.assert_allclose(fid['Mosaic/image_level2'][()],
+                                       _reference_downsample(level1, 'mean'))
+            assert fid['Mosaic/image_level1'].chunks == (128, 128)
+            assert '"factor": 4' in fid['Mosaic/image_level2'].attrs['lazy5_pyramid_level']
+
+        # Rebuild (replacing levels), with max, a level limit, and a cube
+        levels = build_pyramid(filename, 'Mosaic/image', method='max', levels=1, min_size=10)
+        assert [name for name, _ in levels] == ['/Mosaic/image_level1']
+        levels = build_pyramid(filename, 'cube', method='max', min_size=40, tile=64)
+        assert [shape for _, shape in levels] == [(3, 151, 75), (3, 76, 38), (3, 38, 19)]
+        with h5py.File(filename, 'r') as fid:
+            assert 'Mosaic/image_level2' not in fid
+            np.testing.assert_array_equal(fid['Mosaic/image_level1'][()],
+                                          _reference_downsample(image, 'max'))
+            np.testing.assert_array_equal(fid['cube_level1'][()],
+                                          _reference_downsample(cube, 'max'))
+
+        with pytest.raises(ValueError):
+            build_pyramid(filename, 'cube', method='median')
+    finally:
+        time.sleep(1)
+        os.remove(filename)
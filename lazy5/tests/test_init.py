@@ -0,0 +1,24 @@
+""" Test lazy loading of submodules """
+import subprocess
+import sys
+
+import pytest
+
+import lazy5
+
+def test_import_does_not_load_h5py():
+    """ import lazy5 imports neither h5py nor submodules """
+    code = ('import sys, lazy5; '
+            'print("h5py" in sys.modules, "lazy5.utils" in sys.modules, lazy5.__version__)')
+    out = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+    assert out.split() == ['False', 'False', lazy5.__version__]
+
+def test_lazy_submodules():
+    """ Submodules load on attribute access """
+    from lazy5 import inspect
+    assert lazy5.inspect is inspect
+    assert lazy5.load.load is sys.modules['lazy5.load'].load
+    assert 'create' in dir(lazy5)
+
+    with pytest.raises(AttributeError):
+        lazy5.not_a_module  # pylint: disable=pointless-statement
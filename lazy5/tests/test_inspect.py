@@ -1,4 +1,5 @@
 """ Test inspection of HDF5 files """
+import json
 import os
 import time
 
@@ -8,8 +9,11 @@ import pytest
 import numpy as np
 from numpy.testing import assert_array_almost_equal
 
-from lazy5.inspect import (get_groups, get_datasets, get_hierarchy,
-                           get_attrs_dset, valid_dsets, valid_file)
+from lazy5.inspect import (get_groups, get_datasets, get_hierarchy, walk_hierarchy,
+                           get_attrs_dset, valid_dsets, valid_file, snapshot, diff, verify)
+from lazy5.create import save
+from lazy5.load import load
+from lazy5.alter import copy_file, repack
 
 from lazy5.utils import hdf_is_open
 
@@ -345,4 +349,255 @@ def test_get_dset_attrs(hdf_dataset):  # pylint:disable=redefined-outer-name
     assert not isinstance(dset_attrs['Attribute_np_sgl_complex'], complex)
     assert isinstance(dset_attrs['Attribute_np_sgl_complex'], np.ndarray)
     assert_array_almost_equal(dset_attrs['Attribute_np_array_float'], np.array([1.0, 2.0]))
-    assert isinstance(dset_attrs['Attribute_np_array_float'], np.ndarray)
\ No newline at end of file
+    assert isinstance(dset_attrs['Attribute_np_array_float'], np.ndarray)
+
+@pytest.fixture(scope="module")
+def hdf_federation():
+    """ Setups and tears down a master file linking to two other files """
+    master, tile1, tile2 = ['temp_test_master.h5', 'temp_test_tile1.h5', 'temp_test_tile2.h5']
+    with h5py.File(tile2, 'w') as fid:
+        fid.create_dataset('deep/d2', data=np.arange(3))
+        fid['back'] = h5py.ExternalLink(master, '/')  # Cycle
+    with h5py.File(tile1, 'w') as fid:
+        fid.create_dataset('g/d1', data=np.arange(3))
+        fid['g/alias'] = h5py.SoftLink('/g/d1')
+        fid['g/more'] = h5py.ExternalLink(tile2, '/deep')
+    with h5py.File(master, 'w') as fid:
+        fid.create_dataset('local', data=np.arange(3))
+        fid['tiles/t1'] = h5py.ExternalLink(tile1, '/g')
+        fid['tiles/t2'] = h5py.ExternalLink(tile2, '/')
+        fid['tiles/missing'] = h5py.ExternalLink('temp_test_nofile.h5', '/')
+        fid['dangling'] = h5py.SoftLink('/nope')
+
+    yield master, tile1, tile2
+
+    # Tear-down
+    time.sleep(1)
+    for filename in [master, tile1, tile2]:
+        try:
+            os.remove(filename)
+        except:
+            print('Could not delete {}'.format(filename))
+
+def test_walk_hierarchy(hdf_federation):  # pylint:disable=redefined-outer-name
+    """ Unified hierarchy across external and soft links, tagged by source file """
+    master, tile1, tile2 = hdf_federation
+
+    for workers in [None, 2]:
+        nodes = walk_hierarchy(master, workers=workers)
+        assert list(nodes) == ['/', '/dangling', '/local', '/tiles', '/tiles/missing',
+                               '/tiles/t1', '/tiles/t1/alias', '/tiles/t1/d1',
+                               '/tiles/t1/more', '/tiles/t1/more/d2', '/tiles/t2',
+                               '/tiles/t2/back', '/tiles/t2/deep', '/tiles/t2/deep/d2']
+        assert nodes['/local'] == {'type': 'dataset', 'file': master, 'name': '/local',
+                                   'link': 'hard'}
+        assert nodes['/tiles/t1'] == {'type': 'group', 'file': tile1, 'name': '/g',
+                                      'link': 'external'}
+        assert nodes['/tiles/t1/alias']['name'] == '/g/d1'
+        assert nodes['/tiles/t1/alias']['link'] == 'soft'
+        assert nodes['/tiles/t1/more/d2']['file'] == tile2
+        assert nodes['/tiles/t2/back']['reason'] == 'cycle'
+        assert nodes['/tiles/missing']['reason'] == 'missing_file'
+        assert nodes['/dangling']['reason'] == 'dangling'
+
+    # Depth limit: only one link followed
+    nodes = walk_hierarchy(master, max_depth=1)
+    assert nodes['/tiles/t1/d1']['type'] == 'dataset'
+    assert nodes['/tiles/t1/more']['reason'] == 'max_depth'
+    assert '/tiles/t1/more/d2' not in nodes
+
+def test_get_hierarchy_follow_links(hdf_federation):  # pylint:disable=redefined-outer-name
+    """ Groups, datasets, and hierarchy following links (opt-in) """
+    master, _, _ = hdf_federation
+
+    assert get_groups(master) == ['/', '/tiles']
+    assert get_datasets(master) == ['/local']
+
+    assert get_groups(master, follow_links=True) == ['/', '/tiles', '/tiles/t1', '/tiles/t1/more',
+                                                     '/tiles/t2', '/tiles/t2/deep']
+    assert get_datasets(master, follow_links=True) == ['/local', '/tiles/t1/alias',
+                                                       '/tiles/t1/d1', '/tiles/t1/more/d2',
+                                                       '/tiles/t2/deep/d2']
+
+    hierarchy = get_hierarchy(master, follow_links=True, grp_w_dset=True)
+    assert hierarchy == {'/': ['local'], '/tiles/t1': ['alias', 'd1'],
+                         '/tiles/t1/more': ['d2'], '/tiles/t2/deep': ['d2']}
+
+    # Depth limit passed through
+    assert get_groups(master, follow_links=True, max_depth=1) == ['/', '/tiles', '/tiles/t1',
+                                                                  '/tiles/t2', '/tiles/t2/deep']
+    assert get_datasets(master, follow_links=True, max_depth=1,
+                        workers=2) == ['/local', '/tiles/t1/d1', '/tiles/t2/deep/d2']
+
+def test_walk_hierarchy_relative_soft_link():
+    """ Relative soft links resolve from the group holding the link """
+    filename = 'temp_test_relative_link.h5'
+    try:
+        with h5py.File(filename, 'w') as fid:
+            fid.create_dataset('g/d', data=np.arange(3))
+            fid['g/alias'] = h5py.SoftLink('d')
+            fid.create_dataset('top', data=np.arange(2))
+            fid['g/nope'] = h5py.SoftLink('missing')
+            np.testing.assert_array_equal(fid['g/alias'][()], np.arange(3))
+
+        nodes = walk_hierarchy(filename)
+        assert nodes['/g/alias'] == {'type': 'dataset', 'file': filename, 'name': '/g/d',
+                                     'link': 'soft'}
+        assert nodes['/g/nope'] == {'type': 'unresolved', 'file': filename, 'name': '/g/missing',
+                                    'link': 'soft', 'reason': 'dangling'}
+        assert get_datasets(filename, follow_links=True) == ['/g/alias', '/g/d', '/top']
+    finally:
+        time.sleep(1)
+        try:
+            os.remove(filename)
+        except:
+            print('Could not delete {}'.format(filename))
+
+@pytest.fixture(scope="module")
+def hdf_pair():
+    """ Setups and tears down two versions of a file """
+    old, new = ['temp_test_diff_old.h5', 'temp_test_diff_new.h5']
+    data = np.arange(400.).reshape(40, 10)
+    for filename in [old, new]:
+        with h5py.File(filename, 'w') as fid:
+            fid.create_dataset('grp/chunked', data=data, chunks=(10, 10))
+            fid.create_dataset('grp/plain', data=data)
+            fid.create_dataset('gone', data=np.arange(3))
+            fid.create_dataset('reshaped', data=np.arange(6))
+            fid.create_dataset('retyped', data=np.arange(6))
+            fid.create_dataset('grp/relaid', data=data, chunks=(10, 10))
+            fid['grp/plain'].attrs['Kept'] = 1
+            fid['grp/plain'].attrs['Changed'] = 'a'
+            fid['grp/plain'].attrs['Removed'] = 2.0
+    with h5py.File(new, 'r+') as fid:
+        fid['grp/chunked'][25, 5] = -1
+        fid['grp/plain'][0, 0] = -1
+        del fid['gone']
+        fid.create_dataset('grp/new', data=np.arange(3))
+        del fid['reshaped']
+        fid.create_dataset('reshaped', data=np.arange(5))
+        del fid['retyped']
+        fid.create_dataset('retyped', data=np.arange(6, dtype=np.float32))
+        del fid['grp/relaid']
+        fid.create_dataset('grp/relaid', data=data, chunks=(20, 10))
+        fid['grp/plain'].attrs['Changed'] = 'b'
+        fid['grp/plain'].attrs['Added'] = 3
+        del fid['grp/plain'].attrs['Removed']
+
+    yield old, new
+
+    # Tear-down
+    time.sleep(1)
+    for filename in [old, new]:
+        try:
+            os.remove(filename)
+        except:
+            print('Could not delete {}'.format(filename))
+
+def test_diff(hdf_pair):  # pylint:disable=redefined-outer-name
+    """ Structure, shape, dtype, and attribute differences """
+    old, new = hdf_pair
+
+    assert list(diff(old, old, data=True)) == []
+
+    changes = dict([[(change['name'], change['change']), change] for change in diff(old, new)])
+    assert sorted(changes) == [('/gone', 'removed'), ('/grp/new', 'added'),
+                               ('/grp/plain', 'attrs'), ('/reshaped', 'shape'),
+                               ('/retyped', 'dtype')]
+    assert changes[('/reshaped', 'shape')]['a'] == [6]
+    assert changes[('/reshaped', 'shape')]['b'] == [5]
+    assert changes[('/grp/plain', 'attrs')]['b'] == {'added': ['Added'], 'removed': ['Removed'],
+                                                    'changed': ['Changed']}
+
+    # Streamed, in order of name
+    names = [change['name'] for change in diff(old, new)]
+    assert names == sorted(names)
+
+def test_diff_data(hdf_pair):  # pylint:disable=redefined-outer-name
+    """ Per-chunk data differences, between files and snapshots """
+    old, new = hdf_pair
+
+    changes = [change for change in diff(old, new, data=True) if change['change'] == 'data']
+    assert [change['name'] for change in changes] == ['/grp/chunked', '/grp/plain']
+    assert changes[0]['b'] == ['20,0']  # The one raw chunk holding [25, 5]
+    assert len(changes[1]['b']) == 1
+
+    # Different chunking, same values: compared by blocks of values
+    assert [change for change in diff(old, new, data=True)
+            if change['name'] == '/grp/relaid'] == []
+
+    # Snapshot (e.g., at the last sync) vs. the current file
+    snap = json.loads(json.dumps(snapshot(old, data=True)))
+    assert list(diff(snap, old, data=True)) == []
+    assert ([change['name'] for change in diff(snap, new, data=True)
+             if change['change'] == 'data'] == ['/grp/chunked', '/grp/plain', '/grp/relaid'])
+
+    with pytest.raises(ValueError):
+        list(diff(snapshot(old), new, data=True))
+
+def _flip_byte(filename, dset, offset):
+    """ Corrupt one byte of a stored chunk, behind libhdf5's back """
+    with h5py.File(filename, 'r') as fid:
+        info = fid[dset].id.get_chunk_info_by_coord(offset)
+    with open(filename, 'r+b') as fid:
+        fid.seek(info.byte_offset + info.size // 2)
+        byte = fid.read(1)
+        fid.seek(-1, 1)
+        fid.write(bytes([byte[0] ^ 0xff]))
+
+def test_verify():
+    """ Per-chunk checksums written by save, verified by verify and load """
+    filename = 'temp_test_verify.h5'
+    data = np.random.randn(100, 50)
+    try:
+        save(filename, 'small', data, mode='w', chunks=(10, 50), compression='gzip',
+             checksums=True)
+        save(filename, 'many', np.arange(10000.), chunks=(2,), checksums=True)
+        save(filename, 'fletcher', data, chunks=(10, 50), fletcher32=True)
+        save(filename, 'plain', data, chunks=None)
+
+        report = verify(filename)
+        assert list(report) == ['/fletcher', '/many', '/plain', '/small']
+        assert [report[dset]['status'] for dset in report] == ['ok', 'ok', 'unchecked', 'ok']
+        with h5py.File(filename, 'r') as fid:
+            assert 'lazy5_checksums' in fid  # Companion dataset of '/many'
+            assert fid['many'].attrs['lazy5_checksums'] == '/lazy5_checksums/many'
+
+        # The companion is found by name in a copy of the file
+        copy_file(filename, 'temp_test_verify_copy.h5')
+        assert verify('temp_test_verify_copy.h5', dsets=['/many'])['/many']['status'] == 'ok'
+        with h5py.File('temp_test_verify_copy.h5', 'r+') as fid:
+            del fid['lazy5_checksums/many']
+        assert verify('temp_test_verify_copy.h5', dsets=['/many'])['/many']['status'] == 'stale'
+
+        # Repacked: checksums of the old chunks (companion not copied) are stale
+        repack(filename, 'temp_test_verify_copy.h5')
+        report = verify('temp_test_verify_copy.h5')
+        assert report['/many']['status'] == 'stale'
+        assert report['/plain']['status'] == 'unchecked'
+
+        _flip_byte(filename, '/small', (30, 0))
+        _flip_byte(filename, '/many', (4000,))
+        _flip_byte(filename, '/fletcher', (60, 0))
+        report = verify(filename, workers=2)
+        assert report['/small'] == {'status': 'corrupt', 'chunks': ['30,0']}
+        assert report['/many'] == {'status': 'corrupt', 'chunks': ['4000']}
+        assert report['/fletcher']['status'] == 'corrupt'
+
+        with pytest.raises(IOError):
+            load(filename, 'small', verify=True)
+        assert_array_almost_equal(load(filename, 'plain', verify=True), data)
+
+        # Checksums of an unfiltered layout: the dataset was re-filtered since
+        with h5py.File(filename, 'r+') as fid:
+            fid['small'].attrs['lazy5_checksums'] = np.zeros((10, 16), dtype=np.uint8)
+            fid['small'].attrs['lazy5_checksum_layout'] = \
+                '{"layout": ["raw", [10, 50], []], "shape": [100, 50]}'
+        assert verify(filename, dsets=['/small'])['/small']['status'] == 'stale'
+    finally:
+        time.sleep(1)
+        for fname in [filename, 'temp_test_verify_copy.h5']:
+            try:
+                os.remove(fname)
+            except:
+                print('Could not delete {}'.format(fname))
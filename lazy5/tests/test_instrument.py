@@ -0,0 +1,104 @@
+""" Test instrumentation (call counts, latencies, bytes, opens) """
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5 import instrument
+from lazy5.instrument import Collector, Histogram
+from lazy5.inspect import get_groups
+from lazy5.load import load
+from lazy5.create import save
+
+@pytest.fixture(scope="module")
+def hdf_dataset():
+    """ Setups and tears down a sample HDF5 file """
+    filename = 'temp_test_instrument.h5'
+    data = np.random.randn(20, 30)
+    with h5py.File(filename, 'w') as fid:
+        fid.create_dataset('Group1/data', data=data)
+
+    yield filename, data
+
+    # Tear-down
+    time.sleep(1)
+    for fname in [filename, 'temp_test_instrument_save.h5']:
+        try:
+            os.remove(fname)
+        except:
+            print('Could not delete {}'.format(fname))
+
+def test_histogram():
+    """ Log-binned histogram statistics """
+    hist = Histogram(min_value=1e-3, n_bins=8)
+    for value in [1e-4, 1.5e-3, 3e-3, 3e-3, 1e3]:
+        hist.add(value)
+
+    assert hist.n == 5
+    assert hist.counts[0] == 1  # < 1 ms
+    assert hist.counts[1] == 1  # [1, 2) ms
+    assert hist.counts[2] == 2  # [2, 4) ms
+    assert hist.counts[-1] == 1  # Overflow
+    assert hist.min == 1e-4
+    assert hist.max == 1e3
+    assert hist.quantile(0.5) == 4e-3
+    assert hist.quantile(1.0) == 1e3
+    assert Histogram().quantile(0.5) is None
+
+def test_collector(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Collect calls, latencies, bytes, and opens/closes of macros """
+    filename, data = hdf_dataset
+
+    assert not instrument.enabled()
+    with Collector() as stats:
+        assert instrument.enabled()
+        assert get_groups(filename) == ['/', '/Group1']
+        out = load(filename, '/Group1/data')
+        save('temp_test_instrument_save.h5', 'data', data, mode='w')
+        with pytest.raises(KeyError):
+            load(filename, '/missing')
+    assert not instrument.enabled()
+
+    np.testing.assert_array_equal(out, data)
+    assert stats.calls['inspect.get_groups'] == 1
+    assert stats.calls['load.load'] == 2
+    assert stats.errors['load.load'] == 1
+    assert stats.latency['load.load'].n == 2
+    assert stats.bytes_read['load.load'] == data.nbytes
+    assert stats.bytes_written['create.save'] == data.nbytes
+    assert stats.opens == 4
+    assert stats.closes == 4  # Including the failing load's
+    assert 0 <= stats.mdc_hit_rate[filename] <= 1
+
+    summary = stats.summary()
+    assert summary['calls']['load.load'] == 2
+    assert summary['latency']['load.load']['n'] == 2
+
+    # Not active: nothing recorded
+    get_groups(filename)
+    assert stats.calls['inspect.get_groups'] == 1
+
+def test_sink(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Callback sinks see every event; cache hit rates """
+    filename, _ = hdf_dataset
+
+    events = []
+    sink = lambda kind, name, value: events.append((kind, name, value))
+    instrument.add_sink(sink)
+    try:
+        get_groups(filename)
+    finally:
+        instrument.remove_sink(sink)
+    kinds = [event[0] for event in events]
+    assert kinds == ['open', 'mdc_hit_rate', 'close', 'call', 'latency']
+    assert events[3] == ('call', 'inspect.get_groups', 1)
+
+    with Collector() as stats:
+        instrument.record('cache_hit', 'chunks')
+        instrument.record('cache_hit', 'chunks')
+        instrument.record('cache_miss', 'chunks')
+    assert stats.hit_rate('chunks') == pytest.approx(2 / 3)
+    assert stats.hit_rate('other') is None
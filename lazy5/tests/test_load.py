@@ -0,0 +1,316 @@
+""" Test loading of HDF5 datasets """
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.load import (load, read_chunks_parallel, load_where, pick_level, load_level,
+                        iter_frames)
+from lazy5.create import save, build_pyramid
+from lazy5.alter import index_chunk_stats
+from lazy5.chunks import candidate_chunks
+from lazy5.instrument import Collector
+from lazy5.chunks import (has_supported_filters, chunk_offsets, chunk_selection,
+                          read_chunk_stats)
+from lazy5.utils import hdf_is_open
+from lazy5.config import use_config
+
+@pytest.fixture(scope="module")
+def hdf_dataset():
+    """ Setups and tears down a sample HDF5 file """
+    filename = 'temp_test_load.h5'
+    fid = h5py.File(filename, 'w')
+    data = np.random.randn(50, 37, 6)
+
+    fid.create_dataset('contiguous', data=data)
+    fid.create_dataset('chunked', data=data, chunks=(8, 8, 6))
+    fid.create_dataset('gzip', data=data, chunks=(8, 8, 3), compression='gzip')
+    fid.create_dataset('gzip_shuffle', data=data, chunks=(7, 9, 6), compression='gzip',
+                       shuffle=True)
+    fid.create_dataset('int_shuffle', data=(data * 100).astype(np.int16), chunks=(16, 16, 2),
+                       compression='gzip', shuffle=True)
+    fid.create_dataset('lzf', data=data, chunks=(8, 8, 6), compression='lzf')
+
+    # Partially written: unallocated chunks are the fill value
+    dset = fid.create_dataset('sparse', shape=(40, 40), chunks=(10, 10), dtype=np.float32,
+                              compression='gzip', fillvalue=-1)
+    dset[12:18, 5:25] = 2.0
+
+    yield filename, fid, data
+
+    # Tear-down
+    if hdf_is_open(fid):
+        fid.close()
+
+    time.sleep(1)
+    try:
+        os.remove(filename)
+    except:
+        print('Could not delete {}'.format(filename))
+
+def test_has_supported_filters(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Only chunked datasets with deflate and shuffle filters are supported """
+    _, fid, _ = hdf_dataset
+
+    assert not has_supported_filters(fid['contiguous'])
+    assert has_supported_filters(fid['chunked'])
+    assert has_supported_filters(fid['gzip'])
+    assert has_supported_filters(fid['gzip_shuffle'])
+    assert not has_supported_filters(fid['lzf'])
+
+def test_chunk_offsets_and_selection():
+    """ Chunk grid iteration and chunk/output overlap """
+    offsets = list(chunk_offsets((10, 5), (4, 5)))
+    assert offsets == [(0, 0), (4, 0), (8, 0)]
+
+    offsets = list(chunk_offsets((10, 5), (4, 5), selection=((5, 9), (0, 5))))
+    assert offsets == [(4, 0), (8, 0)]
+
+    slc_chunk, slc_out = chunk_selection((4, 0), (4, 5), ((5, 9), (0, 5)))
+    assert slc_chunk == (slice(1, 4), slice(0, 5))
+    assert slc_out == (slice(0, 3), slice(0, 5))
+
+def test_read_chunks_parallel(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Parallel raw-chunk reads match standard reads """
+    _, fid, data = hdf_dataset
+
+    for dset in ['chunked', 'gzip', 'gzip_shuffle', 'int_shuffle', 'sparse']:
+        expected = fid[dset][()]
+        assert np.array_equal(read_chunks_parallel(fid[dset], workers=3), expected)
+
+        for slc in [(slice(3, 17), 2), np.s_[5:6, ...], 4, np.s_[::1, 30:]]:
+            assert np.array_equal(read_chunks_parallel(fid[dset], slc=slc, workers=2),
+                                  expected[slc])
+
+    # Unsupported filter or selection
+    with pytest.raises(ValueError):
+        read_chunks_parallel(fid['lzf'])
+    with pytest.raises(ValueError):
+        read_chunks_parallel(fid['gzip'], slc=np.s_[::2])
+    with pytest.raises(IndexError):
+        read_chunks_parallel(fid['gzip'], slc=100)
+
+def test_load(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Load via filename and fid, with and without workers """
+    filename, fid, data = hdf_dataset
+
+    for dset in ['contiguous', 'gzip_shuffle', 'lzf']:
+        assert np.allclose(load(filename, dset), data)
+        assert np.allclose(load(fid, dset, workers=4), data)
+        assert np.allclose(load(filename, dset, slc=np.s_[::2, 3], workers=4), data[::2, 3])
+        assert np.allclose(load(fid, dset, slc=np.s_[10:20], workers=4), data[10:20])
+
+    assert hdf_is_open(fid)
+
+    # A missing dataset does not leak the file opened by name
+    n_open = len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE))
+    with pytest.raises(KeyError):
+        load(filename, 'not_a_dataset')
+    assert len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)) == n_open
+
+def test_load_where():
+    """ Filtered reads skipping chunks ruled out by per-chunk statistics """
+    filename = 'temp_test_load_where.h5'
+    rng = np.random.RandomState(0)
+    signal = rng.rand(10000).astype(np.float32)
+    signal[[1234, 1250, 7777]] = [5.0, 7.0, 6.0]  # Sparse events
+    signal[3000:3500] = 0.5
+    signal[3000:3100] = np.nan
+    signal[5000:5500] = 0.5
+    image = rng.rand(60, 50)
+    image[[5, 41], [7, 33]] = 3.0
+
+    try:
+        save(filename, 'signal', signal, mode='w', chunks=(500,), compression='gzip',
+             chunk_stats=True)
+        save(filename, 'image', image, chunks=None)
+        save(filename, 'nostats', signal, chunks=(500,))
+
+        with Collector() as stats:
+            index, values = load_where(filename, 'signal', [('>', 1.0)], workers=2)
+        np.testing.assert_array_equal(index[0], [1234, 1250, 7777])
+        np.testing.assert_array_equal(values, [5.0, 7.0, 6.0])
+        assert stats.bytes_read['load.load_where'] == 2 * 500 * 4  # 2 of 20 chunks read
+
+        with h5py.File(filename, 'r') as fid:
+            _, offsets, n_skipped = candidate_chunks(fid['signal'], [('>', 1.0), ('<', 6.5)])
+            assert (offsets, n_skipped) == ([(1000,), (7500,)], 18)
+            # NaN != 0.5 holds: only the chunk of 0.5 without NaNs is ruled out
+            _, offsets, n_skipped = candidate_chunks(fid['signal'], [('!=', 0.5)])
+            assert ((3000,) in offsets) and ((5000,) not in offsets) and (n_skipped == 1)
+
+        # Same result without statistics (every chunk read)
+        index_ns, values_ns = load_where(filename, 'nostats', [('>', 1.0)])
+        np.testing.assert_array_equal(index_ns[0], index[0])
+        np.testing.assert_array_equal(values_ns, values)
+
+        # Sweep (contiguous datasets: blocks of rows); indices in C order
+        assert index_chunk_stats(filename, workers=2) == {'/image': 1, '/nostats': 20,
+                                                          '/signal': 20}
+        index, values = load_where(filename, 'image', [('>=', 3.0)])
+        np.testing.assert_array_equal(index[0], [5, 41])
+        np.testing.assert_array_equal(index[1], [7, 33])
+        expected = np.nonzero((image > 0.2) & (image < 0.3))
+        index, values = load_where(filename, 'image', [('>', 0.2), ('<', 0.3)])
+        np.testing.assert_array_equal(index[0], expected[0])
+        np.testing.assert_array_equal(index[1], expected[1])
+        np.testing.assert_array_equal(values, image[expected])
+
+        with pytest.raises(ValueError):
+            load_where(filename, 'signal', [('~', 1.0)])
+
+        # In-place overwrite (same shape) with h5py: the statistics are stale
+        with h5py.File(filename, 'a') as fid:
+            fid['signal'][5000] = 9.0
+        with h5py.File(filename, 'r') as fid:
+            assert read_chunk_stats(fid['signal']) is None
+        index, values = load_where(filename, 'signal', [('>', 8.0)])
+        np.testing.assert_array_equal(index[0], [5000])
+
+        # Re-written by lazy5 without statistics: deleted
+        save(filename, 'signal', signal * 2, dset_overwrite=True)
+        with h5py.File(filename, 'r') as fid:
+            assert 'lazy5_chunk_stats/signal' not in fid
+    finally:
+        time.sleep(1)
+        os.remove(filename)
+
+def test_load_level():
+    """ The coarsest pyramid level fitting an output size """
+    filename = 'temp_test_load_level.h5'
+    image = np.arange(2000 * 1600, dtype=np.float32).reshape(2000, 1600)
+    try:
+        save(filename, 'image', image, mode='w', chunks=(256, 256))
+        build_pyramid(filename, 'image', min_size=100)  # 2, 4, 8, 16, 32x
+
+        assert pick_level(filename, 'image', 2000) == ('/image', 1)
+        assert pick_level(filename, 'image', (400, 300)) == ('/image_level2', 4)
+        assert pick_level(filename, 'image', 64) == ('/image_level4', 16)
+        assert pick_level(filename, 'image', 10) == ('/image_level5', 32)
+        # Zoomed in: region of interest in base coordinates
+        assert pick_level(filename, 'image', 256, slc=np.s_[:1024, 512:1536]) == \
+            ('/image_level2', 4)
+
+        out = load_level(filename, 'image', (400, 300))
+        assert out.shape == (500, 400)
+        out = load_level(filename, 'image', 256, slc=np.s_[:1024, 512:1536])
+        assert out.shape == (256, 256)
+        with h5py.File(filename, 'r') as fid:
+            np.testing.assert_array_equal(out, fid['image_level2'][:256, 128:384])
+        assert load_level(filename, 'image', 100, slc=np.s_[1000, :]).shape == (100,)
+
+        with pytest.raises(KeyError):
+            pick_level(filename, 'image_level1', 100)
+    finally:
+        time.sleep(1)
+        os.remove(filename)
+
+def test_load_complex_layouts():
+    """ Complex data round-trips with each storage layout """
+    filename = 'temp_test_load_complex.h5'
+    rng = np.random.RandomState(0)
+    data = (rng.randn(40, 30) + 1j * rng.randn(40, 30)).astype(np.complex64)
+    try:
+        for num, layout in enumerate(['compound', 'interleaved', 'split']):
+            save(filename, layout, data, mode='w' if num == 0 else 'a', chunks=(10, 10),
+                 complex_layout=layout, attr_dict={'Layout': layout})
+            out = load(filename, layout)
+            assert out.dtype == np.complex64
+            np.testing.assert_array_equal(out, data)
+            np.testing.assert_array_equal(load(filename, layout, slc=np.s_[5:25, 3]),
+                                          data[5:25, 3])
+            np.testing.assert_array_equal(load(filename, layout, slc=np.s_[..., 7]),
+                                          data[..., 7])
+            np.testing.assert_array_equal(load(filename, layout, slc=np.s_[2:30],
+                                               workers=4), data[2:30])
+
+        with h5py.File(filename, 'r') as fid:
+            assert fid['interleaved'].shape == (40, 30, 2)
+            assert fid['interleaved'].chunks == (10, 10, 2)
+            assert fid['split/real'].dtype == np.float32
+            assert fid['split'].attrs['Layout'] == 'split'
+
+        # Compounds of two floats named complex_names: zero-copy view
+        pairs = np.zeros(5, dtype=[('x', np.float64), ('y', np.float64)])
+        pairs['x'] = np.arange(5)
+        pairs['y'] = -np.arange(5)
+        save(filename, 'pairs', pairs)
+        assert load(filename, 'pairs').dtype.names == ('x', 'y')
+        with use_config(complex_names=('x', 'y')):
+            np.testing.assert_array_equal(load(filename, 'pairs'), np.arange(5) * (1 - 1j))
+
+        with pytest.raises(ValueError):
+            save(filename, 'bad', data, complex_layout='planar')
+    finally:
+        time.sleep(1)
+        os.remove(filename)
+
+def test_iter_frames(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Blocks in order, read ahead with an adaptive depth """
+    _, fid, data = hdf_dataset
+    for dset in ['gzip', 'lzf', 'contiguous']:
+        with iter_frames(fid, dset, depth=3) as frames:
+            blocks = list(frames)
+        assert [start for start, _ in blocks] == list(range(0, 50, fid[dset].chunks[0]
+                                                            if fid[dset].chunks else 1))
+        np.testing.assert_array_equal(np.concatenate([block for _, block in blocks]), data)
+        assert frames.stats()['blocks'] == len(frames)
+    assert hdf_is_open(fid)
+
+    # Along another axis, with a given step
+    frames = iter_frames(fid, 'gzip', step=10, axis=1, adaptive=False, depth=4)
+    blocks = [block for _, block in frames]
+    assert [block.shape for block in blocks] == [(50, 10, 6)] * 3 + [(50, 7, 6)]
+    np.testing.assert_array_equal(np.concatenate(blocks, axis=1), data)
+    assert frames.depth == 4
+
+    # A consumer faster than the reads: deeper read-ahead, stalls recorded
+    frames = iter_frames(fid, 'gzip_shuffle', step=1, depth=1, max_depth=8)
+    for _ in frames:
+        pass
+    stats = frames.stats()
+    assert stats['peak_depth'] > 2
+    assert stats['stall_time'] >= 0
+    assert stats['blocks'] == 50
+
+    # A slow consumer: reads are hidden, the depth stays low
+    frames = iter_frames(fid, 'gzip', step=10, depth=8)
+    for _ in frames:
+        time.sleep(0.05)
+    assert frames.depth == 2
+
+    # Stopping early releases the reads in flight
+    frames = iter_frames(fid, 'gzip', step=1, depth=8)
+    next(frames)
+    frames.close()
+    with pytest.raises(StopIteration):
+        next(frames)
+
+    with pytest.raises(KeyError):
+        iter_frames(fid, 'not_a_dataset')
+    with pytest.raises(ValueError):
+        iter_frames(fid, 'gzip', axis=3)
+
+def test_iter_frames_break(hdf_dataset):  # pylint:disable=redefined-outer-name
+    """ Breaking out of the iteration early releases the file """
+    filename, fid, data = hdf_dataset
+    fid.flush()
+    n_open = len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE))
+    for start, block in iter_frames(filename, 'gzip', step=1, depth=8):
+        np.testing.assert_array_equal(block, data[start:start + 1])
+        if start == 3:
+            break
+
+    # Closed when collected (the for loop drops the iterator)
+    assert len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)) == n_open
+
+    frames = iter_frames(filename, 'gzip', step=1, depth=8)
+    next(frames)
+    finalizer = frames._finalizer  # pylint:disable=protected-access
+    assert finalizer.alive
+    del frames
+    assert not finalizer.alive
+    assert len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)) == n_open
@@ -0,0 +1,117 @@
+""" Test the reader pool """
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.pool import ReaderPool
+from lazy5.config import use_config
+
+@pytest.fixture(scope="module")
+def hdf_files():
+    """ Setups and tears down sample HDF5 files """
+    filenames = ['temp_test_pool_{}.h5'.format(num) for num in range(3)]
+    images = []
+    for num, filename in enumerate(filenames):
+        image = np.random.RandomState(num).rand(300, 400)
+        with h5py.File(filename, 'w') as fid:
+            fid.create_dataset('Group1/image', data=image, chunks=(50, 100))
+            fid.create_dataset('small', data=np.arange(10))
+            fid['Group1/image'].attrs['Num'] = num
+        images.append(image)
+
+    yield filenames, images
+
+    # Tear-down
+    time.sleep(1)
+    for filename in filenames:
+        try:
+            os.remove(filename)
+        except:
+            print('Could not delete {}'.format(filename))
+
+def test_reader_pool_load(hdf_files):  # pylint:disable=redefined-outer-name
+    """ Concurrent loads from many threads, routed by file, match h5py """
+    filenames, _ = hdf_files
+    with ReaderPool(workers=2) as pool:
+        assert pool.route(filenames[0]) == pool.route(os.path.abspath(filenames[0]))
+
+        def read(num):
+            filename = filenames[num % 3]
+            slc = np.s_[num:num + 100, ::3]
+            return num, pool.load(filename, '/Group1/image', slc=slc)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(read, range(30)))
+        for num, data in results:
+            with h5py.File(filenames[num % 3], 'r') as fid:
+                np.testing.assert_array_equal(data, fid['Group1/image'][num:num + 100, ::3])
+
+        # Small arrays are returned inline
+        with h5py.File(filenames[0], 'r') as fid:
+            np.testing.assert_array_equal(pool.load(filenames[0], 'small'), fid['small'][:])
+            np.testing.assert_array_equal(pool.load(filenames[0], 'Group1/image',
+                                                    slc=np.s_[7, 20:30]),
+                                          fid['Group1/image'][7, 20:30])
+
+def test_reader_pool_macros(hdf_files):  # pylint:disable=redefined-outer-name
+    """ Other macros and nested results """
+    filenames, images = hdf_files
+    with ReaderPool(workers=2) as pool:
+        assert pool.get_attrs_dset(filenames[2], '/Group1/image') == {'Num': 2}
+        assert pool.get_datasets(filenames[1]) == ['/Group1/image', '/small']
+        index, values = pool.load_where(filenames[0], '/Group1/image', [('>', 0.999)])
+        expected = np.nonzero(images[0] > 0.999)
+        np.testing.assert_array_equal(index[0], expected[0])
+        np.testing.assert_array_equal(values, images[0][expected])
+        future = pool.submit('load', os.path.basename(filenames[1]), 'small',
+                             pth=os.path.dirname(os.path.abspath(filenames[1])))
+        np.testing.assert_array_equal(future.result(), np.arange(10))
+
+def test_reader_pool_errors(hdf_files):  # pylint:disable=redefined-outer-name
+    """ Errors in a worker are raised in the caller; the worker stays usable """
+    filenames, _ = hdf_files
+    with ReaderPool(workers=2) as pool:
+        with pytest.raises(KeyError):
+            pool.load(filenames[0], 'not_a_dataset')
+        with pytest.raises(KeyError):
+            pool.submit('load', filenames[1], 'not_a_dataset').result()
+        with pytest.raises(ValueError):
+            pool.submit('save', filenames[0], 'x', 1)
+        np.testing.assert_array_equal(pool.load(filenames[0], 'small'), np.arange(10))
+
+def test_reader_pool_close(hdf_files):  # pylint:disable=redefined-outer-name
+    """ A closed pool refuses work; closing twice is harmless """
+    filenames, _ = hdf_files
+    pool = ReaderPool(workers=2)
+    np.testing.assert_array_equal(pool.load(filenames[0], 'small'), np.arange(10))
+    pool.close()
+    pool.close()
+    with pytest.raises(RuntimeError):
+        pool.load(filenames[0], 'small')
+    with pytest.raises(RuntimeError):
+        pool.submit('load', filenames[0], 'small')
+
+    with ReaderPool(workers=2) as pool:
+        pool.load(filenames[1], 'small')
+    with pytest.raises(RuntimeError):
+        pool.load(filenames[1], 'small')
+
+def test_reader_pool_config(hdf_files):  # pylint:disable=redefined-outer-name
+    """ The submitting context's configuration applies in the worker """
+    filenames, _ = hdf_files
+    with ReaderPool(workers=2) as pool:
+        pool.load(filenames[2], 'small')
+        with use_config(complex_names=('x', 'y')):
+            pool.release(filenames[2])
+            with h5py.File(filenames[2], 'a') as fid:
+                pairs = np.zeros(3, dtype=[('x', np.float64), ('y', np.float64)])
+                pairs['x'] = 1
+                fid.create_dataset('pairs', data=pairs)
+            # Released and modified: the worker re-opens it
+            np.testing.assert_array_equal(pool.load(filenames[2], 'pairs'), np.ones(3))
+        assert pool.load(filenames[2], 'pairs').dtype.names == ('x', 'y')
@@ -0,0 +1,95 @@
+""" Test the attribute query index """
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.query import AttrIndex, parse_conditions
+
+@pytest.fixture(scope="function")
+def hdf_files():
+    """ Setups and tears down sample HDF5 files and a sidecar """
+    filenames = ['temp_test_query_{}.h5'.format(num) for num in range(3)]
+    for num, filename in enumerate(filenames):
+        with h5py.File(filename, 'w') as fid:
+            dset = fid.create_dataset('/Spectra/Raw', data=np.arange(3))
+            dset.attrs['Exposure'] = 5 * num + 1  # 1, 6, 11
+            dset.attrs['Memo'] = 'Run {} dark'.format(num) if num else 'Run 0 bright'
+            dset.attrs['Shape'] = np.array([3, num])
+            fid.create_dataset('/Spectra/Background', data=np.arange(3)).attrs['Exposure'] = 0.5
+
+    sidecar = 'temp_test_query.json'
+    yield filenames, sidecar
+
+    # Tear-down
+    time.sleep(1)
+    for filename in filenames + [sidecar]:
+        try:
+            os.remove(filename)
+        except:
+            pass
+
+def test_query(hdf_files):  # pylint:disable=redefined-outer-name
+    """ Equality, range, substring, and existence conditions """
+    filenames, _ = hdf_files
+    index = AttrIndex()
+    assert index.refresh(filenames) == 3
+    assert len(index) == 6
+
+    raw = [(filename, '/Spectra/Raw') for filename in filenames]
+    assert index.query(('Memo', 'contains', 'dark')) == raw[1:]
+    assert index.query(('Exposure', '>', 5)) == raw[1:]
+    assert index.query(('Exposure', '>=', 6), ('Exposure', '<', 11)) == raw[1:2]
+    assert index.query(('Exposure', '<=', 1)) == sorted(raw[:1] + [(filename, '/Spectra/Background')
+                                                                for filename in filenames])
+    assert index.query(('Exposure', '==', 11)) == raw[2:]
+    assert index.query(('Memo', '!=', 'Run 0 bright')) == raw[1:]
+    assert index.query(('Memo', 'exists', None)) == raw
+    assert index.query(('Shape', '==', [3, 2])) == raw[2:]
+    assert index.query(('Missing', '==', 1)) == []
+    assert len(index.query()) == 6
+    assert index.attrs(filenames[1], '/Spectra/Raw')['Exposure'] == 6
+
+    with pytest.raises(TypeError):
+        index.query(('Exposure', '>', 'high'))
+    with pytest.raises(ValueError):
+        index.query(('Exposure', 'like', 1))
+
+def test_parse_conditions():
+    """ Conditions from text """
+    assert parse_conditions('Memo ~ dark, Exposure > 10') == [('Memo', 'contains', 'dark'),
+                                                              ('Exposure', '>', 10)]
+    assert parse_conditions('@Gain=2 and Name == "a b" and @Flag') == [('Gain', '==', 2),
+                                                                        ('Name', '==', 'a b'),
+                                                                        ('Flag', 'exists', None)]
+    assert parse_conditions('Exposure<=1.5,Exposure!=1') == [('Exposure', '<=', 1.5),
+                                                             ('Exposure', '!=', 1)]
+    assert parse_conditions('') == []
+
+def test_sidecar_and_refresh(hdf_files):  # pylint:disable=redefined-outer-name
+    """ Persisted index; only modified files are re-read """
+    filenames, sidecar = hdf_files
+    index = AttrIndex(sidecar)
+    assert index.refresh(filenames, workers=2) == 3
+    index.save()
+
+    index = AttrIndex(sidecar)
+    assert len(index) == 6
+    assert index.query(('Exposure', '>', 5)) == [(filename, '/Spectra/Raw')
+                                                 for filename in filenames[1:]]
+    assert index.refresh() == 0
+
+    # Modify one file (ensure a new mtime), delete another
+    time.sleep(0.05)
+    with h5py.File(filenames[0], 'a') as fid:
+        fid['/Spectra/Raw'].attrs['Exposure'] = 100
+    os.utime(filenames[0], (time.time() + 10, time.time() + 10))
+    os.remove(filenames[2])
+
+    assert index.refresh() == 1
+    assert len(index) == 4
+    assert index.query(('Exposure', '>', 5)) == [(filenames[0], '/Spectra/Raw'),
+                                                 (filenames[1], '/Spectra/Raw')]
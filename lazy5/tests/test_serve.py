@@ -0,0 +1,193 @@
+""" Test the HTTP server and client """
+import os
+import time
+import threading
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.serve import HdfServer, HdfClient, format_selection, parse_selection
+from lazy5.create import save
+from lazy5.inspect import get_hierarchy, get_attrs_dset
+from lazy5.instrument import Collector
+
+@pytest.fixture(scope="module")
+def store():
+    """ Setups and tears down a served directory and a server """
+    root = 'temp_test_serve'
+    os.makedirs(root, exist_ok=True)
+    filename = os.path.join(root, 'run.h5')
+    image = np.random.RandomState(0).rand(200, 300)
+    with h5py.File(filename, 'w') as fid:
+        fid.create_dataset('Group1/image', data=image, chunks=(50, 64))
+        fid.create_dataset('Group1/contiguous', data=np.arange(1000).reshape(100, 10))
+        dset = fid.create_dataset('Group2/scalar', data=3.5)
+        dset.attrs['Memo'] = 'Some memo'
+        dset.attrs['Array'] = np.arange(4, dtype=np.int16)
+        dset.attrs['Scale'] = 2.5
+        dset.attrs['Names'] = np.array([b'a', b'bc'])
+    save(filename, 'split', np.arange(6) * (1 + 1j), complex_layout='split')
+
+    server = HdfServer(root, port=0).start()
+
+    yield server, filename, image
+
+    # Tear-down
+    server.close()
+    time.sleep(1)
+    try:
+        os.remove(filename)
+        os.rmdir(root)
+    except:
+        print('Could not delete {}'.format(root))
+
+def test_selection_text():
+    """ Selections round-trip through text """
+    for slc in [None, np.s_[1:5], np.s_[3, ::2, ...], np.s_[-5:, 2]]:
+        assert parse_selection(format_selection(slc)) == (slc if not isinstance(slc, slice)
+                                                          else (slc,))
+    with pytest.raises(TypeError):
+        format_selection([1, 2])
+
+def test_client_inspect(store):  # pylint:disable=redefined-outer-name
+    """ Hierarchy and attributes match the local macros """
+    server, filename, _ = store
+    client = HdfClient(server.url)
+    assert client.list_files() == ['run.h5']
+    assert client.get_hierarchy('run.h5') == get_hierarchy(filename)
+    assert client.get_datasets('run.h5') == ['/Group1/contiguous', '/Group1/image',
+                                             '/Group2/scalar', '/split/imag', '/split/real']
+    attrs = client.get_attrs_dset('run.h5', 'Group2/scalar')
+    local = get_attrs_dset(filename, 'Group2/scalar')
+    assert list(attrs) == list(local)
+    assert attrs['Memo'] == 'Some memo'
+    assert attrs['Array'].dtype == np.int16
+    np.testing.assert_array_equal(attrs['Array'], local['Array'])
+    np.testing.assert_array_equal(attrs['Names'], local['Names'])
+    assert client.get_attrs_dset('run.h5', 'Group2/scalar',
+                                 convert_sgl_np_to_num=True)['Scale'] == 2.5
+
+    with pytest.raises(KeyError):
+        client.get_attrs_dset('run.h5', 'nope')
+    with pytest.raises(FileNotFoundError):
+        client.get_hierarchy('nope.h5')
+    with pytest.raises(PermissionError):
+        client.get_hierarchy('../setup.py')
+    client.close()
+
+def test_client_load(store):  # pylint:disable=redefined-outer-name
+    """ Hyperslabs assembled from cached chunk-aligned blocks """
+    server, _, image = store
+    client = HdfClient(server.url)
+    with Collector() as stats:
+        np.testing.assert_array_equal(client.load('run.h5', 'Group1/image',
+                                                  slc=np.s_[10:60, 100:200]),
+                                      image[10:60, 100:200])
+        # Blocks (0:100, 64:256) were fetched: the overlapping read hits the cache
+        np.testing.assert_array_equal(client.load('run.h5', 'Group1/image',
+                                                  slc=np.s_[70, 64:250]), image[70, 64:250])
+    assert stats.cache_misses['serve.HdfClient'] == 6
+    assert stats.cache_hits['serve.HdfClient'] == 3
+
+    np.testing.assert_array_equal(client.load('run.h5', 'Group1/image'), image)
+    np.testing.assert_array_equal(client.load('run.h5', 'Group1/image', slc=np.s_[::7, 5]),
+                                  image[::7, 5])
+    np.testing.assert_array_equal(client.load('run.h5', 'Group1/contiguous',
+                                              slc=np.s_[..., 3]),
+                                  np.arange(1000).reshape(100, 10)[:, 3])
+    assert client.load('run.h5', 'Group2/scalar') == 3.5
+    np.testing.assert_array_equal(client.load('run.h5', 'split', slc=np.s_[2:4]),
+                                  np.arange(2, 4) * (1 + 1j))
+
+    # gzip transfer: fewer bytes for compressible data
+    nbytes = []
+    for compress in (True, False):
+        with Collector() as stats:
+            HdfClient(server.url, cache_nbytes=0, compress=compress).load('run.h5',
+                                                                          'Group1/contiguous')
+        nbytes.append(stats.bytes_read['serve.HdfClient'])
+    assert nbytes[0] < nbytes[1]
+
+    # Concurrent reads from threads
+    errors = []
+
+    def read(num):
+        try:
+            np.testing.assert_array_equal(client.load('run.h5', 'Group1/image',
+                                                      slc=np.s_[num:num + 20]),
+                                          image[num:num + 20])
+        except Exception as err:  # pylint:disable=broad-except
+            errors.append(err)
+
+    threads = [threading.Thread(target=read, args=(num,)) for num in range(0, 160, 10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+def test_client_load_requests(store):  # pylint:disable=redefined-outer-name
+    """ Missing blocks are requested in boxes, not one bounding box """
+    server, _, image = store
+    block_nbytes = 50 * 64 * 8
+
+    def count_reads(client):
+        boxes = []
+        read = client._read  # pylint:disable=protected-access
+
+        def counted(file, dset, slc):
+            boxes.append(slc)
+            return read(file, dset, slc)
+        client._read = counted  # pylint:disable=protected-access
+        return boxes
+
+    for gap_nbytes, n_requests in [(0, 2), (block_nbytes, 1)]:
+        client = HdfClient(server.url, gap_nbytes=gap_nbytes)
+        boxes = count_reads(client)
+        client.load('run.h5', 'Group1/image', slc=np.s_[0, 64:128])
+        np.testing.assert_array_equal(client.load('run.h5', 'Group1/image', slc=np.s_[:50]),
+                                      image[:50])
+        assert len(boxes) == 1 + n_requests
+
+    # No gaps allowed: only the missing blocks are transferred
+    client = HdfClient(server.url, gap_nbytes=0)
+    boxes = count_reads(client)
+    client.load('run.h5', 'Group1/image', slc=np.s_[60, 70])
+    client.load('run.h5', 'Group1/image', slc=np.s_[110, 200])
+    np.testing.assert_array_equal(client.load('run.h5', 'Group1/image'), image)
+    assert sum([(row.stop - row.start) * (col.stop - col.start)
+                for row, col in boxes[2:]]) == image.size - 2 * 50 * 64
+    assert 1 < len(boxes[2:]) < 18
+
+def test_cache_invalidation(store):  # pylint:disable=redefined-outer-name
+    """ Cached blocks of a modified file are not used """
+    server, filename, _ = store
+    client = HdfClient(server.url)
+    assert client.load('run.h5', 'Group1/contiguous', slc=np.s_[0, 0]) == 0
+    time.sleep(0.01)
+    with h5py.File(filename, 'a') as fid:
+        fid['Group1/contiguous'][0, 0] = -1
+    assert client.load('run.h5', 'Group1/contiguous', slc=np.s_[0, 0]) == -1
+
+def test_unix_socket(store):  # pylint:disable=redefined-outer-name
+    """ Serving over a Unix socket """
+    _, filename, image = store
+    with HdfServer(os.path.dirname(filename), unix_socket='temp_test_serve.sock') as server:
+        client = HdfClient(server.url)
+        np.testing.assert_array_equal(client.load('run.h5', 'Group1/image', slc=np.s_[5]),
+                                      image[5])
+        client.close()
+    assert not os.path.exists('temp_test_serve.sock')
+
+    # A path that is not a socket is not deleted
+    with open('temp_test_serve.sock', 'w') as fid:
+        fid.write('keep')
+    try:
+        with pytest.raises(FileExistsError):
+            HdfServer(os.path.dirname(filename), unix_socket='temp_test_serve.sock')
+        with open('temp_test_serve.sock') as fid:
+            assert fid.read() == 'keep'
+    finally:
+        os.remove('temp_test_serve.sock')
@@ -0,0 +1,91 @@
+""" Test single-writer multiple-reader (SWMR) macros """
+import os
+import time
+
+import pytest
+
+import numpy as np
+import h5py
+
+from lazy5.swmr import SwmrWriter, read_new_rows, follow
+from lazy5.utils import FidOrFile
+
+
+@pytest.fixture(scope="function")
+def swmr_filename():
+    """ Sets up and tears down a filename for SWMR tests """
+    filename = 'temp_test_swmr.h5'
+
+    yield filename
+
+    time.sleep(1)
+    try:
+        os.remove(filename)
+    except:
+        print('Could not delete {}'.format(filename))
+
+def test_swmr_writer_append(swmr_filename):  # pylint:disable=redefined-outer-name
+    """ Append rows and read them back """
+    with SwmrWriter(swmr_filename, mode='w') as writer:
+        writer.require_dataset('/Group1/Dset', (4,), np.float64, attr_dict={'AT1': 1})
+        assert writer.append('/Group1/Dset', np.ones((3, 4))) == 3
+        assert writer.append('/Group1/Dset', np.zeros(4)) == 4
+        assert writer.fid.swmr_mode
+
+        # No new datasets once SWMR writing has started
+        with pytest.raises(IOError):
+            writer.require_dataset('/Group1/Dset2', (4,), np.float64)
+
+    with h5py.File(swmr_filename, 'r') as fid:
+        assert fid['/Group1/Dset'].shape == (4, 4)
+        assert fid['/Group1/Dset'].attrs['AT1'] == 1
+        assert np.allclose(fid['/Group1/Dset'][:3], 1)
+        assert np.allclose(fid['/Group1/Dset'][3], 0)
+
+    # Wrong mode and wrong row shape
+    with pytest.raises(ValueError):
+        SwmrWriter(swmr_filename, mode='r')
+
+    with SwmrWriter(swmr_filename, mode='a') as writer:
+        with pytest.raises(TypeError):
+            writer.require_dataset('/Group1/Dset', (5,), np.float64)
+
+def test_swmr_read_new_rows(swmr_filename):  # pylint:disable=redefined-outer-name
+    """ A SWMR reader sees only newly appended rows while the writer is open """
+    writer = SwmrWriter(swmr_filename, mode='w')
+    writer.require_dataset('Dset', (), np.int64, chunk_rows=2)
+    writer.append('Dset', np.arange(5))
+
+    fof = FidOrFile(swmr_filename, mode='r', swmr=True)
+    dset_id = fof.fid['Dset']
+
+    new_rows, n_rows = read_new_rows(dset_id)
+    assert n_rows == 5
+    assert np.allclose(new_rows, np.arange(5))
+
+    new_rows, n_rows = read_new_rows(dset_id, start=n_rows)
+    assert n_rows == 5
+    assert new_rows.size == 0
+
+    writer.append('Dset', np.arange(5, 8))
+    new_rows, n_rows = read_new_rows(dset_id, start=n_rows)
+    assert n_rows == 8
+    assert np.allclose(new_rows, np.arange(5, 8))
+
+    fof.close_if_file_not_fid()
+    writer.close()
+
+def test_swmr_follow(swmr_filename):  # pylint:disable=redefined-outer-name
+    """ Follow a dataset until it stops growing """
+    writer = SwmrWriter(swmr_filename, mode='w')
+    writer.require_dataset('Dset', (2,), np.float32)
+    writer.append('Dset', np.ones((3, 2)))
+
+    gen = follow(swmr_filename, 'Dset', start=1, interval=0.01, timeout=0.1)
+    first = next(gen)
+    assert first.shape == (2, 2)
+
+    writer.append('Dset', np.zeros((4, 2)))
+    rest = list(gen)
+    assert sum([blk.shape[0] for blk in rest]) == 4
+    writer.close()
@@ -0,0 +1,105 @@
+""" Test columnar tables """
+import os
+import time
+
+import pytest
+
+import h5py
+import numpy as np
+
+from lazy5.table import write_table, append_table, read_table, table_info, list_tables
+from lazy5.instrument import Collector
+from lazy5.chunks import read_chunk_stats
+
+@pytest.fixture(scope="function")
+def events():
+    """ Setups and tears down a file for an event list """
+    filename = 'temp_test_table.h5'
+    rng = np.random.RandomState(0)
+    data = np.zeros(1000, dtype=[('t', np.float64), ('energy', np.float32),
+                                 ('detector', np.int16), ('pos', np.float32, (2,))])
+    data['t'] = np.arange(1000) * 0.5  # Sorted: pushdown skips most chunks
+    data['energy'] = rng.rand(1000)
+    data['detector'] = rng.randint(0, 4, size=1000)
+    data['pos'] = rng.randn(1000, 2)
+
+    yield filename, data
+
+    # Tear-down
+    time.sleep(1)
+    try:
+        os.remove(filename)
+    except:
+        print('Could not delete {}'.format(filename))
+
+def test_write_and_read(events):  # pylint:disable=redefined-outer-name
+    """ Column projection and row ranges """
+    filename, data = events
+    assert write_table(filename, 'Run/events', data, mode='w', chunk_rows=100) == 1000
+
+    with h5py.File(filename, 'r') as fid:
+        assert fid['Run/events/t'].chunks == (100,)
+        assert fid['Run/events/pos'].shape == (1000, 2)
+    assert list_tables(filename) == ['/Run/events']
+    info = table_info(filename, 'Run/events')
+    assert info['n_rows'] == 1000
+    assert list(info['columns']) == ['t', 'energy', 'detector', 'pos']
+    assert info['columns']['pos'] == {'dtype': '<f4', 'shape': [2]}
+
+    out = read_table(filename, 'Run/events', columns=['energy', 'pos'], rows=(250, 420))
+    assert list(out) == ['energy', 'pos']
+    np.testing.assert_array_equal(out['energy'], data['energy'][250:420])
+    np.testing.assert_array_equal(out['pos'], data['pos'][250:420])
+    np.testing.assert_array_equal(read_table(filename, 'Run/events', rows=slice(-5, None))['t'],
+                                  data['t'][-5:])
+
+    with pytest.raises(IOError):
+        write_table(filename, 'Run/events', data)
+    with pytest.raises(KeyError):
+        read_table(filename, 'Run/events', columns=['nope'])
+    with pytest.raises(KeyError):
+        read_table(filename, 'Run')
+
+def test_where(events):  # pylint:disable=redefined-outer-name
+    """ Conditions, with chunks ruled out by min/max statistics skipped """
+    filename, data = events
+    write_table(filename, 'events', data, mode='w', chunk_rows=100)
+
+    where = [('t', '>=', 120.0), ('t', '<', 180.0), ('detector', '==', 2)]
+    expected = data[(data['t'] >= 120) & (data['t'] < 180) & (data['detector'] == 2)]
+    with Collector() as stats:
+        out = read_table(filename, 'events', columns=['t', 'energy'], where=where)
+    np.testing.assert_array_equal(out['t'], expected['t'])
+    np.testing.assert_array_equal(out['energy'], expected['energy'])
+    # Only chunks 2 and 3 (rows 200-400) are read: t, detector, and energy
+    assert stats.bytes_read['table.read_table'] == 200 * (8 + 2 + 4)
+
+    out = read_table(filename, 'events', where=[('t', '>', 1e6)])
+    assert out['pos'].shape == (0, 2)
+    out = read_table(filename, 'events', rows=(0, 150), where=[('detector', '!=', 0)])
+    np.testing.assert_array_equal(out['t'], data['t'][:150][data['detector'][:150] != 0])
+    with pytest.raises(ValueError):
+        read_table(filename, 'events', where=[('t', '~', 1)])
+
+def test_append(events):  # pylint:disable=redefined-outer-name
+    """ Appends update the statistics of partial and new chunks """
+    filename, data = events
+    write_table(filename, 'events', data[:150], mode='w', chunk_rows=100)
+    assert append_table(filename, 'events', data[150:420]) == 420
+    assert append_table(filename, 'events', dict([[name, data[name][420:]]
+                                                  for name in data.dtype.names])) == 1000
+
+    out = read_table(filename, 'events')
+    for name in data.dtype.names:
+        np.testing.assert_array_equal(out[name], data[name])
+    with h5py.File(filename, 'r') as fid:
+        chunks, stats = read_chunk_stats(fid['events/t'])
+    assert chunks == (100,)
+    assert stats.shape == (10,)
+    assert tuple(stats[1]) == (50.0, 99.5, 100)
+
+    out = read_table(filename, 'events', where=[('t', '>=', 70.0), ('t', '<', 80.0)])
+    np.testing.assert_array_equal(out['t'], np.arange(140, 160) * 0.5)
+
+    with pytest.raises(ValueError):
+        append_table(filename, 'events', {'t': np.zeros(3)})
@@ -133,6 +133,24 @@ class TestUI:
                       range(dialog.ui.listDataSet.count())]
         assert list_dsets == ['ingroup1_2']
 
+    def test_ui_filter_attrs(self, hdf_dataset):
+        """ Filter datasets by attribute conditions (@key op value) """
+        self.filename = hdf_dataset
+        dialog = HdfLoad()
+        _ = dialog.fileOpen(self.filename)
+        dialog.ui.comboBoxGroupSelect.setCurrentIndex(0)
+        assert dialog.ui.comboBoxGroupSelect.currentText() == '/'
+
+        for incl_str, expected in [('@Attribute_int>0', ['base']),
+                                   ('@Attribute_str~es, base', ['base']),
+                                   ('@Attribute_int>1', [])]:
+            dialog.ui.filterIncludeString.setText(incl_str)
+            QTest.mouseClick(dialog.ui.pushButtonResetFilter, Qt.LeftButton)
+            QTest.mouseClick(dialog.ui.pushButtonFilter, Qt.LeftButton)
+            list_dsets = [dialog.ui.listDataSet.item(num).text() for num in
+                          range(dialog.ui.listDataSet.count())]
+            assert list_dsets == expected
+
     def test_ui_attrs(self, hdf_dataset):
         """ Load test file, change to base group (/), check attributes """
         self.filename = hdf_dataset
@@ -154,6 +172,32 @@ class TestUI:
                 'Attribute_str')
         assert not dialog.ui.tableAttributes.findItems('fake', Qt.MatchExactly)  # Empty
 
+    def test_ui_follow(self, hdf_dataset):
+        """ Load test file, select base dataset, follow it """
+        self.filename = hdf_dataset
+        dialog = HdfLoad()
+        _ = dialog.fileOpen(self.filename)
+
+        # Following with nothing selected does nothing
+        dialog.ui.checkBoxFollow.setChecked(True)
+        assert dialog.follow_dset is None
+        dialog.ui.checkBoxFollow.setChecked(False)
+
+        dialog.ui.comboBoxGroupSelect.setCurrentIndex(0)
+        dialog.ui.listDataSet.item(0).setSelected(True)
+        QTest.mouseClick(dialog.ui.listDataSet.viewport(), Qt.LeftButton)
+
+        dialog.ui.checkBoxFollow.setChecked(True)
+        assert dialog.follow_dset.name == '/base'
+        assert dialog.follow_timer.isActive()
+        assert dialog.followUpdate() == 0
+        assert '/base' in dialog.ui.textCurrentDataset.toPlainText()
+
+        dialog.ui.checkBoxFollow.setChecked(False)
+        assert dialog.follow_dset is None
+        assert dialog.follow_fof is None
+        assert not dialog.follow_timer.isActive()
+
     def test_ui_wrongfile(self, hdf_dataset):
         """ Load test file, change to base group (/), check attributes """
         self.filename = hdf_dataset
@@ -6,7 +6,8 @@ import pytest
 import h5py
 import numpy as np
 
-from lazy5.utils import (FidOrFile, hdf_is_open, fullpath)
+from lazy5.utils import (FidOrFile, hdf_is_open, fullpath, chunk_cache_settings)
+from lazy5.config import DefaultConfig
 
 @pytest.fixture(scope="module")
 def hdf_dataset():
@@ -102,4 +103,90 @@ def test_fullpath():
     assert fp == fn
 
     fp = fullpath(filename=fn, pth=p)
-    assert fp == os.path.join(p, fn)
\ No newline at end of file
+    assert fp == os.path.join(p, fn)
+
+def test_fid_or_file_swmr(hdf_dataset):
+    """ Test FidOrFile Class opening for SWMR reading and writing """
+    filename, _ = hdf_dataset
+
+    fof = FidOrFile(filename, mode='r', swmr=True)
+    assert fof.fid.swmr_mode
+    fof.close_if_file_not_fid()
+
+    filename_w = 'temp_test_utils_swmr.h5'
+    fof = FidOrFile(filename_w, mode='w', swmr=True)
+    assert fof.fid.libver[0] != 'earliest'
+    assert not fof.fid.swmr_mode
+    fof.fid.swmr_mode = True
+    assert fof.fid.swmr_mode
+    fof.close_if_file_not_fid()
+    os.remove(filename_w)
+
+def test_fid_or_file_config(hdf_dataset):
+    """ Test FidOrFile applying cache settings from config and per-call overrides """
+    filename, _ = hdf_dataset
+
+    orig_config = FidOrFile.config
+    try:
+        FidOrFile.config = DefaultConfig()
+        FidOrFile.config.rdcc_nbytes = 2**24
+        FidOrFile.config.rdcc_nslots = 10007
+        FidOrFile.config.mdc_max_size = 2**25
+        FidOrFile.config.fs_strategy = 'page'
+
+        # File-space strategy dropped for existing files
+        kwargs = FidOrFile.file_kwargs(filename, mode='r')
+        assert kwargs == {'rdcc_nbytes': 2**24, 'rdcc_nslots': 10007, 'mdc_max_size': 2**25}
+
+        fof = FidOrFile(filename, rdcc_nbytes=2**23, rdcc_w0=0.5)
+        assert fof.fid.id.get_access_plist().get_cache()[1:] == (10007, 2**23, 0.5)
+        assert fof.fid.id.get_mdc_config().max_size == 2**25
+        fof.close_if_file_not_fid()
+
+        with pytest.raises(TypeError):
+            FidOrFile(filename, not_a_setting=1)
+
+        # File-space strategy and page buffering for created files
+        filename_w = 'temp_test_utils_page.h5'
+        fof = FidOrFile(filename_w, mode='w', fs_page_size=4096, mdc_initial_size=2**22)
+        fof.fid.create_dataset('base', data=np.arange(10))
+        fof.close_if_file_not_fid()
+
+        fof = FidOrFile(filename_w, page_buf_size=2**16)
+        assert np.allclose(fof.fid['base'], np.arange(10))
+        fof.close_if_file_not_fid()
+        os.remove(filename_w)
+    finally:
+        FidOrFile.config = orig_config
+
+def test_chunk_cache_settings(hdf_dataset):
+    """ Test sizing the chunk cache from a dataset's chunk shape """
+    filename = 'temp_test_utils_chunks.h5'
+    with h5py.File(filename, 'w') as fid:
+        fid.create_dataset('chunked', shape=(100, 64, 48), chunks=(10, 16, 16), dtype=np.float32)
+        fid.create_dataset('contiguous', shape=(10, 10), dtype=np.float32)
+
+        assert chunk_cache_settings(fid, 'contiguous') == {}
+
+        settings = chunk_cache_settings(fid, 'chunked')
+        chunk_nbytes = 10 * 16 * 16 * 4
+        assert settings['rdcc_nbytes'] == 4 * 3 * chunk_nbytes
+        assert settings['rdcc_nslots'] >= 1200
+        assert settings['rdcc_w0'] == 1.0
+
+        settings = chunk_cache_settings(fid, 'chunked', axis=None, max_nbytes=5*chunk_nbytes)
+        assert settings['rdcc_nbytes'] == 5 * chunk_nbytes
+
+    settings = chunk_cache_settings(filename, 'chunked', axis=2)
+    assert settings['rdcc_nbytes'] == 10 * 4 * chunk_nbytes
+
+    fof = FidOrFile(filename, **settings)
+    assert fof.fid.id.get_access_plist().get_cache()[2] == settings['rdcc_nbytes']
+    fof.close_if_file_not_fid()
+
+    # A missing dataset does not leak the file opened by name
+    n_open = len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE))
+    with pytest.raises(KeyError):
+        chunk_cache_settings(filename, 'not_a_dataset')
+    assert len(h5py.h5f.get_obj_ids(types=h5py.h5f.OBJ_FILE)) == n_open
+    os.remove(filename)
@@ -24,6 +24,7 @@ try:
     from PyQt5.QtWidgets import (QApplication as _QApplication, \
     QDialog as _QDialog, QFileDialog as _QFileDialog, \
     QTableWidgetItem as _QTableWidgetItem)
+    from PyQt5.QtCore import QTimer as _QTimer
 except:
     HAS_PYQT5 = False
 else:
@@ -32,6 +33,8 @@ from lazy5.ui.qt_HdfLoad import Ui_Dialog
 
 from lazy5.inspect import get_hierarchy, get_attrs_dset
 from lazy5.nonh5utils import filterlist
+from lazy5.utils import FidOrFile
+from lazy5.query import AttrIndex, parse_conditions
 
 class HdfLoad(_QDialog): ### EDIT ###
     """ GUI Loader Class for H5 Files """
@@ -39,7 +42,8 @@ class HdfLoad(_QDialog): ### EDIT ###
     # Default configuration
     config = {'only_show_grp_w_dset': True,  # Only show groups with datasets
               'attr_description': 'Memo',  # Description attribute key (optional)
-              'excl_filtering' : True  # Filtering is exclusive (filters are AND'd)
+              'excl_filtering' : True,  # Filtering is exclusive (filters are AND'd)
+              'follow_interval_ms' : 500  # Polling interval when following a dataset
              }
 
     def __init__(self, title=None, parent=None):
@@ -54,6 +58,16 @@ class HdfLoad(_QDialog): ### EDIT ###
         self.all_selected = None
         self.group_dset_dict = None
 
+        # Follow (tail) mode: SWMR-reader fid kept open while following
+        self.follow_fof = None
+        self.follow_dset = None
+        self.follow_n_rows = 0
+        self.follow_timer = _QTimer(self)
+        self.follow_timer.timeout.connect(self.followUpdate)
+
+        # Attribute index for include filters such as @Exposure>10
+        self.attr_index = AttrIndex()
+
         if title:
             self.setWindowTitle('{}: Select a dataset...'.format(title))
         else:
@@ -65,6 +79,8 @@ class HdfLoad(_QDialog): ### EDIT ###
         self.ui.listDataSet.itemClicked.connect(self.datasetSelected)
         self.ui.pushButtonFilter.clicked.connect(self.filterDatasets)
         self.ui.pushButtonResetFilter.clicked.connect(self.dataGroupChange)
+        self.ui.checkBoxFollow.toggled.connect(self.followToggled)
+        self.finished.connect(self.followStop)
 
 
     @staticmethod
@@ -208,18 +224,88 @@ class HdfLoad(_QDialog): ### EDIT ###
         # Fill-in attribute table
         self.populate_attrs(attr_dict=attrs)
 
+        if self.ui.checkBoxFollow.isChecked():
+            self.followStart()
+
+    def followToggled(self, checked):  # Qt-related pylint: disable=C0103
+        """ Action : Follow checkbox was toggled """
+        if checked:
+            self.followStart()
+        else:
+            self.followStop()
+
+    def followStart(self):  # Qt-related pylint: disable=C0103
+        """
+        Tail the currently selected dataset. The file is opened once as a SWMR
+        reader and polled (refreshed) without re-opening.
+        """
+        self.followStop()
+        if not self.all_selected:
+            return None
+
+        self.follow_fof = FidOrFile(_os.path.join(self.path, self.filename), mode='r',
+                                    swmr=True)
+        self.follow_dset = self.follow_fof.fid[self.all_selected[-1]]
+        self.follow_n_rows = 0
+        if self.follow_dset.shape:
+            self.follow_n_rows = self.follow_dset.shape[0]
+        self.followUpdate()
+        self.follow_timer.start(HdfLoad.config['follow_interval_ms'])
+        return self.follow_dset.name
+
+    def followUpdate(self):  # Qt-related pylint: disable=C0103
+        """ Poll the followed dataset for newly appended rows """
+        if self.follow_dset is None:
+            return 0
+        n_old = self.follow_n_rows
+        if self.follow_dset.shape:  # Scalar datasets cannot grow
+            # Only the new shape is needed: the appended rows are not read
+            self.follow_dset.refresh()
+            self.follow_n_rows = self.follow_dset.shape[0]
+        n_new = self.follow_n_rows - n_old
+        self.ui.textCurrentDataset.setText('{} : shape {} (+{} new rows)'.format(
+            self.follow_dset.name, self.follow_dset.shape, n_new))
+        return n_new
+
+    def followStop(self):  # Qt-related pylint: disable=C0103
+        """ Stop tailing and close the SWMR-reader fid """
+        self.follow_timer.stop()
+        self.follow_dset = None
+        if self.follow_fof is not None:
+            self.follow_fof.close_if_file_not_fid()
+            self.follow_fof = None
+
     def filterDatasets(self):  # Qt-related pylint: disable=C0103
-        """ Filter list of datasets based on include and exclude strings """
+        """
+        Filter list of datasets based on include and exclude strings.
+        Include entries starting with @ are attribute conditions (e.g.,
+        @Exposure>10, @Memo~dark; see lazy5.query.parse_conditions).
+        """
         incl_str = self.ui.filterIncludeString.text()
         excl_str = self.ui.filterExcludeString.text()
 
         # From string with comma separation to list-of-strings
         incl_list = [q.strip() for q in incl_str.split(',') if q.strip()]
         excl_list = [q.strip() for q in excl_str.split(',') if q.strip()]
+        attr_list = [q for q in incl_list if q.startswith('@')]
+        incl_list = [q for q in incl_list if not q.startswith('@')]
 
         dset_list = [self.ui.listDataSet.item(num).text() for num in
                      range(self.ui.listDataSet.count())]
 
+        if attr_list:
+            filename = _os.path.join(self.path, self.filename)
+            current_grp = self.ui.comboBoxGroupSelect.currentText()
+            try:
+                self.attr_index.refresh([filename])
+                matches = self.attr_index.query(*parse_conditions(','.join(attr_list)))
+            except (ValueError, TypeError) as error_msg:
+                print('Attribute filter error: {}'.format(error_msg))
+            else:
+                dset_list = [dset for dset in dset_list
+                             if (filename, '{}/{}'.format(current_grp, dset).replace('//', '/'))
+                             in matches]
+
         if incl_list:  # Include list is not empty
             dset_list = filterlist(dset_list, incl_list,
                                    keep_filtered_items=True,
@@ -73,6 +73,9 @@ class Ui_Dialog(object):
         self.textCurrentDataset.setMaximumSize(QtCore.QSize(16777215, 100))
         self.textCurrentDataset.setObjectName("textCurrentDataset")
         self.attribVL.addWidget(self.textCurrentDataset)
+        self.checkBoxFollow = QtWidgets.QCheckBox(Dialog)
+        self.checkBoxFollow.setObjectName("checkBoxFollow")
+        self.attribVL.addWidget(self.checkBoxFollow)
         self.label_6 = QtWidgets.QLabel(Dialog)
         self.label_6.setObjectName("label_6")
         self.attribVL.addWidget(self.label_6)
@@ -145,6 +148,8 @@ class Ui_Dialog(object):
         self.pushButtonFilter.setText(_translate("Dialog", "Filter List"))
         self.pushButtonResetFilter.setText(_translate("Dialog", "Reset List"))
         self.label_5.setText(_translate("Dialog", "Current Selection"))
+        self.checkBoxFollow.setToolTip(_translate("Dialog", "Tail the selected dataset as it grows (SWMR)"))
+        self.checkBoxFollow.setText(_translate("Dialog", "Follow (tail growing dataset)"))
         self.label_6.setText(_translate("Dialog", "Atrribute Table"))
         self.tableAttributes.setSortingEnabled(True)
         item = self.tableAttributes.horizontalHeaderItem(0)
@@ -4,10 +4,20 @@ import os as _os
 import h5py as _h5py
 import numpy as _np
 
-from .config import DefaultConfig
-_h5py.get_config().complex_names = DefaultConfig().complex_names
+from .config import (DEFAULT_CONFIG as _DEFAULT_CONFIG, get_config as _get_config)
+from . import instrument as _instrument
 
-__all__ = ['FidOrFile', 'hdf_is_open', 'fullpath']
+__all__ = ['FidOrFile', 'hdf_is_open', 'fullpath', 'chunk_cache_settings',
+           'complex_to_compound', 'compound_to_complex']
+
+# DefaultConfig settings passed to h5py.File when opening
+_FILE_ACCESS_KEYS = ('rdcc_nbytes', 'rdcc_nslots', 'rdcc_w0', 'page_buf_size', 'libver')
+
+# DefaultConfig settings passed to h5py.File only when creating a file
+_FILE_CREATE_KEYS = ('fs_strategy', 'fs_page_size')
+
+# DefaultConfig settings applied to an open file's metadata cache
+_MDC_KEYS = ('mdc_initial_size', 'mdc_max_size')
 
 class FidOrFile:
     """
@@ -23,6 +33,17 @@ class FidOrFile:
     mode : str
         If opening a file, open with mode. Available: r,r+,w,w-,x,a
 
+    swmr : bool
+        If opening a file, open for single-writer multiple-reader (SWMR) use.
+        In read mode ('r'), the file is opened as a SWMR reader. In write
+        modes, the file is opened with libver='latest' so that SWMR writing
+        can be enabled (fid.swmr_mode = True) once all objects are created.
+
+    **kwargs
+        If opening a file, per-call overrides of the cache and file-space
+        settings of the current configuration (see lazy5.config.use_config)
+        or FidOrFile.config, e.g., rdcc_nbytes=2**26.
+
     Attributes
     ----------
     is_fid : bool
@@ -30,14 +51,20 @@ class FidOrFile:
 
     fid : h5py.File object
         File ID
+
+    config : lazy5.config.DefaultConfig
+        (Class attribute) Settings applied when opening files outside of a
+        lazy5.config.use_config block. Process-wide default.
     """
-    def __init__(self, file=None, mode='r'):
+    config = _DEFAULT_CONFIG
+
+    def __init__(self, file=None, mode='r', swmr=False, **kwargs):
         self.is_fid = None
         self.fid = None
         if file is not None:
-            self.return_fid_from_file(file, mode=mode)
+            self.return_fid_from_file(file, mode=mode, swmr=swmr, **kwargs)
 
-    def return_fid_from_file(self, file, mode='r'):
+    def return_fid_from_file(self, file, mode='r', swmr=False, **kwargs):
         """
         Return an open fid (h5py.File). If provided a string, open file, else
         pass-thru given fid.
@@ -50,6 +77,13 @@ class FidOrFile:
         mode : str
             If opening a file, open with mode. Available: r,r+,w,w-,x,a
 
+        swmr : bool
+            If opening a file, open for SWMR reading (mode='r') or writing
+            (other modes).
+
+        **kwargs
+            If opening a file, overrides of FidOrFile.config settings
+
         Returns
         -------
         fid : h5py.File object
@@ -58,14 +92,52 @@ class FidOrFile:
         """
         self.is_fid = isinstance(file, _h5py.File)
         if not self.is_fid:
-            self.fid = _h5py.File(file, mode=mode)
+            file_kwargs = self.file_kwargs(file, mode=mode, swmr=swmr, **kwargs)
+            mdc_kwargs = dict([[k, file_kwargs.pop(k)] for k in _MDC_KEYS if k in file_kwargs])
+            self.fid = _h5py.File(file, mode=mode, **file_kwargs)
+            if mdc_kwargs:
+                _set_mdc_config(self.fid, **mdc_kwargs)
+            _instrument.record('open', file)
         else:
             self.fid = file
         return self.fid
 
+    @classmethod
+    def file_kwargs(cls, file, mode='r', swmr=False, **kwargs):
+        """
+        Return the (non-default) settings that are applied when opening file:
+        the current configuration (or FidOrFile.config) updated by kwargs,
+        with file-space settings dropped unless the file is being created.
+        """
+        all_keys = _FILE_ACCESS_KEYS + _FILE_CREATE_KEYS + _MDC_KEYS
+        unknown = [k for k in kwargs if k not in all_keys]
+        if unknown:
+            raise TypeError('Unknown file setting(s): {}'.format(unknown))
+
+        config = _get_config(cls.config)
+        settings = dict([[k, getattr(config, k, None)] for k in all_keys])
+        settings.update(kwargs)
+
+        creating = (mode in ('w', 'w-', 'x')) or ((mode == 'a') and not _os.path.exists(file))
+        if not creating:
+            for k in _FILE_CREATE_KEYS:
+                settings.pop(k)
+
+        if swmr:
+            settings['libver'] = 'latest'
+            if mode == 'r':
+                settings['swmr'] = True
+
+        return dict([[k, v] for k, v in settings.items() if v is not None])
+
     def close_if_file_not_fid(self):
         """ Close the file if originally a filename (not a fid) was passed """
         if not self.is_fid:
+            if _instrument.enabled():
+                if hdf_is_open(self.fid):
+                    _instrument.record('mdc_hit_rate', self.fid.filename,
+                                       self.fid.id.get_mdc_hit_rate())
+                _instrument.record('close', self.fid.filename)
             return self.fid.close()
         else:
             return None
@@ -90,4 +162,151 @@ def fullpath(filename, pth=None):
     if not pth:
         return filename
     else:
-        return _os.path.join(pth, filename)
\ No newline at end of file
+        return _os.path.join(pth, filename)
+
+def _complex_dtype(float_dtype):
+    """ Complex dtype of (real, imag) pairs of float_dtype """
+    return _np.dtype('{}c{}'.format(float_dtype.byteorder.replace('|', '='),
+                                    2 * float_dtype.itemsize))
+
+def _as_contiguous(data):
+    """ C-contiguous ndarray of data (0-d for scalars, unlike np.ascontiguousarray) """
+    arr = _np.asarray(data)
+    return arr if arr.flags.c_contiguous else arr.copy()
+
+def complex_to_compound(data, names=None):
+    """
+    Zero-copy compound view of complex data: fields (real, imaginary) named
+    names. Other data are returned as-is. Written with h5py, this stores
+    complex data independently of h5py's global complex_names.
+
+    Parameters
+    ----------
+    data : array-like
+        Data (e.g., ndarray, complex scalar)
+
+    names : tuple of str
+        Field names. If None, complex_names of the current configuration
+        (see lazy5.config.use_config).
+
+    Returns
+    -------
+    ndarray or data
+    """
+    if not _np.iscomplexobj(data):
+        return data
+    names = tuple(_get_config().complex_names if names is None else names)
+    arr = _as_contiguous(data)
+    float_dtype = arr.real.dtype
+    return arr.view(_np.dtype([(names[0], float_dtype), (names[1], float_dtype)]))
+
+def compound_to_complex(data, names=None):
+    """
+    Zero-copy complex view of compound data of two fields named names (real,
+    imaginary) of the same float type. Other data are returned as-is.
+
+    Parameters
+    ----------
+    data : ndarray or numpy.void
+        Data (e.g., read from a dataset or attribute)
+
+    names : tuple of str
+        Field names. If None, complex_names of the current configuration
+        (see lazy5.config.use_config).
+
+    Returns
+    -------
+    ndarray (complex scalar if data is a numpy.void) or data
+    """
+    dtype = getattr(data, 'dtype', None)
+    if (dtype is None) or (dtype.names is None):
+        return data
+    names = tuple(_get_config().complex_names if names is None else names)
+    if dtype.names != names:
+        return data
+    float_dtype = dtype.fields[names[0]][0]
+    if ((float_dtype.kind != 'f') or (dtype.fields[names[1]][0] != float_dtype) or
+            (dtype.fields[names[1]][1] != float_dtype.itemsize) or
+            (dtype.itemsize != 2 * float_dtype.itemsize)):
+        return data
+    out = _as_contiguous(data).view(_complex_dtype(float_dtype))
+    if isinstance(data, _np.void):
+        return out[()]
+    return out
+
+def _set_mdc_config(fid, mdc_initial_size=None, mdc_max_size=None):
+    """ Set the metadata cache initial and/or maximum size of an open file """
+    mdc = fid.id.get_mdc_config()
+    if mdc_max_size is not None:
+        mdc.max_size = mdc_max_size
+    if mdc_initial_size is not None:
+        mdc.set_initial_size = True
+        mdc.initial_size = mdc_initial_size
+        mdc.max_size = max(mdc.max_size, mdc_initial_size)
+    mdc.min_size = min(mdc.min_size, mdc.max_size)
+    fid.id.set_mdc_config(mdc)
+
+def _next_prime(num):
+    """ Smallest prime >= num """
+    num = max(int(num), 2)
+    while True:
+        if all([num % div for div in range(2, int(num**0.5) + 1)]):
+            return num
+        num += 1
+
+def chunk_cache_settings(file, dset, pth=None, axis=0, max_nbytes=2**30):
+    """
+    Return chunk cache settings (rdcc_*) sized from a dataset's chunk shape
+    such that all of the chunks spanning a hyperplane perpendicular to axis
+    fit in the cache, i.e., iterating along axis never reads (and
+    decompresses) a chunk more than once.
+
+    Parameters
+    ----------
+    file : str or h5py.File
+        Filename or File-object for open HDF5 file
+
+    dset : str
+        Full dataset name with preprended group names. E.g., '/Group1/Dataset'
+
+    pth : str
+        Path
+
+    axis : int
+        Axis of iteration. If None, size the cache for the entire dataset.
+
+    max_nbytes : int
+        Upper bound of the cache size (bytes)
+
+    Returns
+    -------
+    dict : rdcc_nbytes, rdcc_nslots, rdcc_w0. Pass to FidOrFile (or the
+    h5py.File constructor) as keyword arguments.
+
+    Examples
+    --------
+    >>> fof = FidOrFile(fp, **chunk_cache_settings(fp, '/Group1/Dataset'))
+    """
+    fp = fullpath(file, pth)
+    fof = FidOrFile(fp)
+    try:
+        dset_id = fof.fid[dset]
+        shape = dset_id.shape
+        chunks = dset_id.chunks
+        itemsize = dset_id.dtype.itemsize
+    finally:
+        fof.close_if_file_not_fid()
+
+    if chunks is None:  # Contiguous: cache is not used
+        return {}
+
+    n_per_axis = [-(-dim // chk) for dim, chk in zip(shape, chunks)]
+    if axis is not None:
+        n_per_axis[axis] = 1
+    n_chunks = max(int(_np.prod(n_per_axis)), 1)
+    chunk_nbytes = int(_np.prod(chunks)) * itemsize
+
+    n_chunks = max(min(n_chunks, max_nbytes // max(chunk_nbytes, 1)), 1)
+    return {'rdcc_nbytes': n_chunks * chunk_nbytes,
+            'rdcc_nslots': _next_prime(100 * n_chunks),
+            'rdcc_w0': 1.0}
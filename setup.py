@@ -22,6 +22,7 @@ setup(name='LazyHDF5',
       zip_safe = False,
       include_package_data = True,
       install_requires=['numpy', 'h5py>= 2.6.0'],
+      entry_points={'console_scripts': ['lazy5 = lazy5.cli:main']},
       setup_requires=['pytest-runner'],
       tests_require=['pytest'],
       classifiers=['Development Status :: 3 - Alpha',